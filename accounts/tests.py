@@ -1,3 +1,41 @@
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
 
-# Create your tests here.
+from cart.checkout import checkout
+from cart.models import OrderSummary
+from cart.summaries import recompute
+from cart.tests import create_movies
+
+
+class OrderHistoryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.client.force_login(self.user)
+        movies = create_movies()
+        self.orders = [checkout(self.user, {movie.id: 1 for movie in movies[:n % 3 + 1]},
+                                'Atlanta', 'GA', 'USA')[0] for n in range(12)]
+
+    def test_summary_is_kept_at_checkout(self):
+        summary = OrderSummary.objects.get(user=self.user)
+        self.assertEqual(summary.order_count, 12)
+        self.assertEqual(summary.lifetime_spend, sum(order.total for order in self.orders))
+        self.assertEqual(summary.last_order_date, self.orders[-1].date)
+        recompute()
+        self.assertEqual(OrderSummary.objects.get(user=self.user).lifetime_spend, summary.lifetime_spend)
+
+    def test_pages_use_a_constant_number_of_queries(self):
+        seen = []
+        url = reverse('accounts.orders')
+        # session, user, summary, orders, items with their movies
+        with self.assertNumQueries(5):
+            response = self.client.get(url, {'size': 5})
+        while True:
+            template_data = response.context['template_data']
+            seen += [order.id for order in template_data['orders']]
+            if not template_data['next_cursor']:
+                break
+            with self.assertNumQueries(5):
+                response = self.client.get(url, {'size': 5, 'after': template_data['next_cursor']})
+        self.assertEqual(seen, sorted((order.id for order in self.orders), reverse=True))
+        self.assertContains(response, '12 orders')
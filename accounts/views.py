@@ -4,6 +4,12 @@ from .forms import CustomUserCreationForm, CustomErrorList
 from django.shortcuts import redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
+from django.db.models import Prefetch
+from cart.models import Item
+from cart.summaries import summary_for
+from movies.pagination import decode_cursor, encode_cursor, page_size
+
+ORDERS_PAGE_SIZE = 10
 
 @login_required
 def logout(request):
@@ -44,5 +50,24 @@ def signup(request):
 def orders(request):
     template_data = {}
     template_data['title'] = 'Orders'
-    template_data['orders'] = request.user.order_set.all()
-    return render(request, 'accounts/orders.html', {'template_data': template_data})
\ No newline at end of file
+    # newest first, keyset-paginated on id; the user_id index covers the
+    # (user_id, id) seek. Items and their movies come in one extra query.
+    size = page_size(request, ORDERS_PAGE_SIZE)
+    after = decode_cursor(request.GET.get('after'))
+    orders = request.user.order_set.order_by('-id').prefetch_related(
+        Prefetch('item_set', queryset=Item.objects.select_related('movie')
+                 .only('id', 'price', 'quantity', 'order_id', 'movie__id', 'movie__name')
+                 .order_by('id')))
+    if after:
+        orders = orders.filter(id__lt=after[-1])
+    orders = list(orders[:size + 1])
+    next_cursor = None
+    if len(orders) > size:
+        orders = orders[:size]
+        next_cursor = encode_cursor((orders[-1].id,))
+
+    template_data['orders'] = orders
+    template_data['summary'] = summary_for(request.user)
+    template_data['next_cursor'] = next_cursor
+    template_data['is_first_page'] = after is None
+    return render(request, 'accounts/orders.html', {'template_data': template_data})
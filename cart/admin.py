@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Order, Item
+from .models import Order, Item, Country, CountryAlias, OrderSummary
 
 admin.site.register(Order)
-admin.site.register(Item)
\ No newline at end of file
+admin.site.register(Item)
+admin.site.register(Country)
+admin.site.register(CountryAlias)
+admin.site.register(OrderSummary)
@@ -0,0 +1,86 @@
+"""Checkout: turn a cart into an Order in one transaction.
+
+``checkout`` resolves the location, snapshots prices from a single Movie
+query, creates the order, inserts its items with one ``bulk_create`` and
+updates the derived tables (map rollups, co-purchase counts, popularity,
+the buyer's order summary), all or nothing.
+
+An idempotency key makes repeated submissions safe. The key is generated
+when the confirmation form is rendered and stored on the order, unique
+per user, so a double-clicked or retried POST finds the existing order
+instead of creating a second one.
+"""
+from django.db import IntegrityError, transaction
+
+from mapview.rollups import record_order
+from movies.models import Movie
+from movies.popularity import record_purchases
+from movies.recommendations import record_basket
+from .countries import normalize_location
+from .models import Item, Order, PurchaseLocation
+from .summaries import record_order as record_summary
+
+
+def existing_order(user, idempotency_key):
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def _location(city, state, country):
+    # new locations are queued as pending and geocoded by the
+    # geocode_locations worker
+    city, state, country = normalize_location(city, state, country)
+    location, _ = PurchaseLocation.objects.get_or_create(
+        city=city,
+        state=state,
+        country=country.name,
+        defaults={'canonical_country': country},
+    )
+    return location
+
+
+def checkout(user, cart, city, state, country, idempotency_key=None):
+    """Place an order for ``cart`` ({movie id: quantity}).
+
+    Returns ``(order, created)``. ``created`` is False when
+    ``idempotency_key`` matches an earlier order, or when none of the
+    cart's movies exist any more (then ``order`` is None). Raises
+    ValueError, without placing an order, when the city or country is blank.
+    """
+    with transaction.atomic():
+        order = existing_order(user, idempotency_key)
+        if order is not None:
+            return order, False
+
+        quantities = {int(movie_id): int(quantity) for movie_id, quantity in cart.items()}
+        movies = list(Movie.objects.filter(id__in=quantities).only('id', 'price'))
+        if not movies:
+            return None, False
+
+        try:
+            with transaction.atomic():
+                order = Order.objects.create(
+                    user=user,
+                    total=sum(movie.price * quantities[movie.id] for movie in movies),
+                    location=_location(city, state, country),
+                    idempotency_key=idempotency_key or None,
+                )
+        except IntegrityError:
+            # a concurrent submission with the same key won the race
+            order = existing_order(user, idempotency_key)
+            if order is None:
+                raise
+            return order, False
+
+        # bulk_create sends no signals for the items; the Order's post_save
+        # has already scheduled the map data version bump for this commit
+        items = Item.objects.bulk_create([
+            Item(order=order, movie_id=movie.id, price=movie.price, quantity=quantities[movie.id])
+            for movie in movies
+        ])
+        record_order(order, items)
+        record_basket([item.movie_id for item in items])
+        record_purchases(items)
+        record_summary(order)
+    return order, True
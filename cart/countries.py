@@ -0,0 +1,145 @@
+"""Canonical country dimension for purchase locations.
+
+``COUNTRIES`` seeds the Country/CountryAlias tables. Checkout resolves the
+free-text country a customer typed to one of these rows, so analytics can
+group by ``PurchaseLocation.canonical_country`` in SQL instead of
+re-normalizing strings on every request.
+"""
+OTHER = 'Other'
+
+COUNTRIES = [
+    # (canonical name, continent, aliases)
+    ('United States of America', 'North America',
+     ['us', 'u.s.', 'usa', 'u.s.a.', 'united states', 'america']),
+    ('Canada', 'North America', ['ca']),
+    ('Mexico', 'North America', ['mx', 'méxico']),
+    ('Brazil', 'South America', ['brasil']),
+    ('Argentina', 'South America', []),
+    ('Chile', 'South America', []),
+    ('Peru', 'South America', []),
+    ('Colombia', 'South America', []),
+    ('Venezuela', 'South America', []),
+    ('United Kingdom', 'Europe',
+     ['uk', 'u.k.', 'england', 'great britain', 'britain', 'scotland', 'wales']),
+    ('Ireland', 'Europe', []),
+    ('France', 'Europe', []),
+    ('Germany', 'Europe', ['deutschland']),
+    ('Italy', 'Europe', ['italia']),
+    ('Spain', 'Europe', ['españa', 'espana']),
+    ('Portugal', 'Europe', []),
+    ('Netherlands', 'Europe', ['the netherlands', 'holland']),
+    ('Belgium', 'Europe', []),
+    ('Switzerland', 'Europe', []),
+    ('Austria', 'Europe', []),
+    ('Sweden', 'Europe', []),
+    ('Norway', 'Europe', []),
+    ('Denmark', 'Europe', []),
+    ('Finland', 'Europe', []),
+    ('Poland', 'Europe', []),
+    ('Greece', 'Europe', []),
+    ('Turkey', 'Asia', ['türkiye', 'turkiye']),
+    ('Russia', 'Europe', ['russian federation']),
+    ('Ukraine', 'Europe', []),
+    ('China', 'Asia', ['prc', "people's republic of china"]),
+    ('Japan', 'Asia', []),
+    ('South Korea', 'Asia', ['korea', 'republic of korea']),
+    ('India', 'Asia', []),
+    ('Pakistan', 'Asia', []),
+    ('Bangladesh', 'Asia', []),
+    ('Indonesia', 'Asia', []),
+    ('Thailand', 'Asia', []),
+    ('Vietnam', 'Asia', ['viet nam']),
+    ('Singapore', 'Asia', []),
+    ('Malaysia', 'Asia', []),
+    ('Philippines', 'Asia', ['the philippines']),
+    ('Saudi Arabia', 'Asia', ['ksa']),
+    ('United Arab Emirates', 'Asia', ['uae']),
+    ('Israel', 'Asia', []),
+    ('Lebanon', 'Asia', []),
+    ('Egypt', 'Africa', []),
+    ('South Africa', 'Africa', []),
+    ('Nigeria', 'Africa', []),
+    ('Kenya', 'Africa', []),
+    ('Morocco', 'Africa', []),
+    ('Ghana', 'Africa', []),
+    ('Ethiopia', 'Africa', []),
+    ('Australia', 'Oceania', []),
+    ('New Zealand', 'Oceania', ['nz']),
+]
+
+
+def alias_key(value):
+    return ' '.join((value or '').lower().split())
+
+
+# alias -> canonical name, including each canonical name itself
+ALIASES = {}
+for _name, _continent, _aliases in COUNTRIES:
+    ALIASES[alias_key(_name)] = _name
+    for _alias in _aliases:
+        ALIASES[alias_key(_alias)] = _name
+
+
+def canonical_name(country):
+    """Canonical country name for free text, without touching the database."""
+    key = alias_key(country)
+    if not key:
+        return ''
+    return ALIASES.get(key, ' '.join(country.split()).title())
+
+
+def normalize_state(state):
+    state = ' '.join((state or '').split())
+    return state.upper() if len(state) <= 3 else state.title()
+
+
+def normalize_city(city):
+    return ' '.join((city or '').split()).title()
+
+
+def resolve_country(country, country_model=None, alias_model=None):
+    """Return the Country row for free text, adding unknown countries as 'Other'."""
+    if country_model is None:
+        from .models import Country as country_model, CountryAlias as alias_model
+
+    key = alias_key(country)
+    alias = alias_model.objects.select_related('country').filter(alias=key).first()
+    if alias:
+        return alias.country
+    name = canonical_name(country)
+    obj, _ = country_model.objects.get_or_create(name=name, defaults={'continent': OTHER})
+    alias_model.objects.get_or_create(alias=key, defaults={'country': obj})
+    return obj
+
+
+def normalize_location(city, state, country):
+    """Normalize checkout input to (city, state, Country).
+
+    Raises ValueError when the city or country is blank.
+    """
+    city = normalize_city(city)
+    if not city or not alias_key(country):
+        raise ValueError('Enter a city and a country.')
+    return city, normalize_state(state), resolve_country(country)
+
+
+def assign_countries(location_model, country_model, alias_model):
+    """Give locations saved before the country dimension their canonical
+    country, leaving the text as is; ``normalize_locations`` also cleans the
+    text and merges duplicates. Used by the sales rollups' data migration."""
+    for location in location_model.objects.filter(canonical_country__isnull=True):
+        if alias_key(location.country):
+            location.canonical_country = resolve_country(location.country, country_model,
+                                                         alias_model)
+            location.save(update_fields=['canonical_country'])
+
+
+def sync_countries(country_model, alias_model):
+    """Insert any missing rows from ``COUNTRIES``; used by the data migration
+    and the ``normalize_locations`` command."""
+    for name, continent, aliases in COUNTRIES:
+        country, _ = country_model.objects.update_or_create(
+            name=name, defaults={'continent': continent})
+        for alias in [name] + aliases:
+            alias_model.objects.update_or_create(alias=alias_key(alias),
+                                                 defaults={'country': country})
@@ -0,0 +1,81 @@
+"""Stream order items, joined with their order, movie and location, for
+the warehouse export (the ``export_orders`` command).
+
+Rows come from a single ``values_list`` query read with ``.iterator()``,
+so memory stays flat however many orders there are. They are walked in
+``(order_id, id)`` order over the ``order_id`` index, so an export covers
+a range of order ids and the next run starts after the last one. Order
+ids grow with their dates, so a start date is turned into the first id
+on or after it and exported the same way.
+
+Ids are handed out when an order is inserted, not when it commits. On
+SQLite writers are serialized, so orders become visible in id order, but
+on a database with concurrent writers an order can commit after one with
+a higher id has been exported. Incremental runs therefore rescan the last
+``OVERLAP`` ids below the mark and skip the orders they already wrote.
+An order that commits more than ``OVERLAP`` ids late is still missed.
+"""
+import csv
+import json
+
+from .models import Item, Order
+
+FIELDS = (
+    ('order_id', 'order_id'),
+    ('order_date', 'order__date'),
+    ('user_id', 'order__user_id'),
+    ('order_total', 'order__total'),
+    ('item_id', 'id'),
+    ('movie_id', 'movie_id'),
+    ('movie_name', 'movie__name'),
+    ('price', 'price'),
+    ('quantity', 'quantity'),
+    ('city', 'order__location__city'),
+    ('state', 'order__location__state'),
+    ('country', 'order__location__country'),
+)
+COLUMNS = [column for column, _ in FIELDS]
+FORMATS = ('csv', 'jsonl')
+OVERLAP = 1000
+
+
+def first_order_id(since):
+    """The id of the first order placed at or after ``since``, or None."""
+    return (Order.objects.filter(date__gte=since).order_by('id')
+            .values_list('id', flat=True).first())
+
+
+def export_rows(after_id=None, until_id=None, chunk_size=2000, skip=frozenset()):
+    """Yield one tuple per item (see ``COLUMNS``) of orders with
+    ``after_id < id <= until_id``, oldest first, leaving out the order ids
+    in ``skip``."""
+    items = Item.objects.order_by('order_id', 'id')
+    if after_id is not None:
+        items = items.filter(order_id__gt=after_id)
+    if until_id is not None:
+        items = items.filter(order_id__lte=until_id)
+    rows = items.values_list(*(lookup for _, lookup in FIELDS)).iterator(chunk_size=chunk_size)
+    if skip:
+        rows = (row for row in rows if row[0] not in skip)
+    return rows
+
+
+def _value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def write_rows(rows, stream, fmt='csv'):
+    """Write ``rows`` to the text ``stream``; returns how many were written."""
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(stream)
+        writer.writerow(COLUMNS)
+        for row in rows:
+            writer.writerow([_value(value) for value in row])
+            count += 1
+    else:
+        for row in rows:
+            stream.write(json.dumps(dict(zip(COLUMNS, map(_value, row))), separators=(',', ':')))
+            stream.write('\n')
+            count += 1
+    return count
@@ -0,0 +1,92 @@
+import random
+import time
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from cart.checkout import checkout
+from cart.countries import normalize_location
+from cart.models import Item, Order, PurchaseLocation
+from mapview.rollups import record_order
+from movies.models import Movie
+from movies.popularity import record_purchases
+from movies.recommendations import record_basket
+
+
+def legacy_checkout(user, cart, city, state, country):
+    """The old purchase view body: one INSERT per item."""
+    movies = Movie.objects.filter(id__in=list(cart))
+    total = sum(movie.price * int(cart[movie.id]) for movie in movies)
+    city, state, country = normalize_location(city, state, country)
+    location, _ = PurchaseLocation.objects.get_or_create(
+        city=city, state=state, country=country.name, defaults={'canonical_country': country})
+    order = Order.objects.create(user=user, total=total, location=location)
+    items = [Item.objects.create(movie=movie, price=movie.price, order=order, quantity=cart[movie.id])
+             for movie in movies]
+    record_order(order, items)
+    record_basket([item.movie_id for item in items])
+    record_purchases(items)
+    return order
+
+
+class Command(BaseCommand):
+    help = ('Time checkout against cart size, old per-item inserts vs the bulk pipeline. '
+            'Runs inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1, 5, 20, 50, 100])
+        parser.add_argument('--movies', type=int, default=1000)
+        parser.add_argument('--history', type=int, default=2000,
+                            help='Orders placed before timing starts.')
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def timed(self, fn, repeat):
+        """Best wall time in ms and the query count of one call. Each call
+        is rolled back, so every run starts from the same tables."""
+        best = float('inf')
+        for _ in range(repeat):
+            with transaction.atomic():
+                start = time.perf_counter()
+                fn()
+                best = min(best, time.perf_counter() - start)
+                transaction.set_rollback(True)
+        connection.queries_log.clear()
+        with CaptureQueriesContext(connection) as queries, transaction.atomic():
+            fn()
+            transaction.set_rollback(True)
+        return best * 1000, len(queries)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username='bench-checkout')
+        movies = Movie.objects.bulk_create([
+            Movie(name=f'Bench movie {i}', price=rng.randint(5, 20), description='',
+                  image='movie_images/logo.png')
+            for i in range(options['movies'])
+        ])
+        # some order history, so the derived tables have rows to update
+        for _ in range(options['history']):
+            checkout(user, {movie.id: 1 for movie in rng.sample(movies, rng.randint(1, 5))},
+                     'Atlanta', 'GA', 'United States')
+
+        self.stdout.write(f"{'items':>6} {'legacy ms':>10} {'queries':>8} {'bulk ms':>8} {'queries':>8}")
+        for size in options['sizes']:
+            def cart():
+                return {movie.id: rng.randint(1, 3) for movie in rng.sample(movies, size)}
+            legacy_ms, legacy_queries = self.timed(
+                lambda: legacy_checkout(user, cart(), 'Atlanta', 'GA', 'United States'),
+                options['repeat'])
+            bulk_ms, bulk_queries = self.timed(
+                lambda: checkout(user, cart(), 'Atlanta', 'GA', 'United States', uuid.uuid4().hex),
+                options['repeat'])
+            self.stdout.write(f'{size:>6} {legacy_ms:>10.1f} {legacy_queries:>8} '
+                              f'{bulk_ms:>8.1f} {bulk_queries:>8}')
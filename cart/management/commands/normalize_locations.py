@@ -0,0 +1,45 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cart.countries import normalize_location, sync_countries
+from cart.models import Country, CountryAlias, Order, PurchaseLocation
+
+
+class Command(BaseCommand):
+    help = ('Seed the country dimension and normalize existing purchase locations, '
+            'merging rows that only differed in spelling.')
+
+    @transaction.atomic
+    def handle(self, *args, **options):
+        sync_countries(Country, CountryAlias)
+
+        updated = merged = skipped = 0
+        for location in PurchaseLocation.objects.order_by('id'):
+            try:
+                city, state, country = normalize_location(location.city, location.state,
+                                                          location.country)
+            except ValueError:
+                # nothing to normalize to; left without a canonical country
+                skipped += 1
+                continue
+            duplicate = PurchaseLocation.objects.filter(
+                city=city, state=state, country=country.name).exclude(id=location.id).first()
+            if duplicate:
+                Order.objects.filter(location=location).update(location=duplicate)
+                location.delete()
+                merged += 1
+                continue
+            if (location.city, location.state, location.country,
+                    location.canonical_country_id) != (city, state, country.name, country.id):
+                location.city, location.state, location.country = city, state, country.name
+                location.canonical_country = country
+                location.save(update_fields=['city', 'state', 'country', 'canonical_country'])
+                updated += 1
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Normalized {updated} location(s), merged {merged} duplicate(s), '
+            f'skipped {skipped} without a city or country.'))
+        if updated or merged:
+            # sales rollups are keyed by canonical country
+            call_command('rebuild_rollups', stdout=self.stdout, stderr=self.stderr)
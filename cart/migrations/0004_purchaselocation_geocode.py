@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0003_purchaselocation_order_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaselocation',
+            name='geocode_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('ok', 'Geocoded'), ('not_found', 'Not found'), ('failed', 'Failed')], db_index=True, default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='purchaselocation',
+            name='geocoded_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchaselocation',
+            name='lat',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='purchaselocation',
+            name='lng',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
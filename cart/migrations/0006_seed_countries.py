@@ -0,0 +1,18 @@
+from django.db import migrations
+
+from cart.countries import sync_countries
+
+
+def seed_countries(apps, schema_editor):
+    sync_countries(apps.get_model('cart', 'Country'), apps.get_model('cart', 'CountryAlias'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0005_country_dimension'),
+    ]
+
+    operations = [
+        migrations.RunPython(seed_countries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def summarize_orders(apps, schema_editor):
+    from cart.summaries import recompute
+    recompute(apps.get_model('cart', 'Order'), apps.get_model('cart', 'OrderSummary'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('cart', '0007_order_idempotency_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderSummary',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='order_summary', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('order_count', models.IntegerField(default=0)),
+                ('lifetime_spend', models.IntegerField(default=0)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name_plural': 'order summaries',
+            },
+        ),
+        migrations.RunPython(summarize_orders, migrations.RunPython.noop),
+    ]
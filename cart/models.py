@@ -2,10 +2,48 @@ from django.db import models
 from django.contrib.auth.models import User
 from movies.models import Movie
 
+class Country(models.Model):
+    name = models.CharField(max_length=100, unique=True)
+    continent = models.CharField(max_length=50, db_index=True)
+
+    class Meta:
+        verbose_name_plural = 'countries'
+
+    def __str__(self):
+        return self.name
+
+class CountryAlias(models.Model):
+    alias = models.CharField(max_length=100, unique=True)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE, related_name='aliases')
+
+    class Meta:
+        verbose_name_plural = 'country aliases'
+
+    def __str__(self):
+        return self.alias + ' -> ' + self.country.name
+
 class PurchaseLocation(models.Model):
+    GEOCODE_PENDING = 'pending'
+    GEOCODE_OK = 'ok'
+    GEOCODE_NOT_FOUND = 'not_found'
+    GEOCODE_FAILED = 'failed'
+    GEOCODE_STATUS_CHOICES = [
+        (GEOCODE_PENDING, 'Pending'),
+        (GEOCODE_OK, 'Geocoded'),
+        (GEOCODE_NOT_FOUND, 'Not found'),
+        (GEOCODE_FAILED, 'Failed'),
+    ]
+
     city = models.CharField(max_length=100)
     state = models.CharField(max_length=100, blank=True)
     country = models.CharField(max_length=100)
+    canonical_country = models.ForeignKey(Country, null=True, blank=True,
+                                          on_delete=models.SET_NULL, related_name='locations')
+    lat = models.FloatField(null=True, blank=True)
+    lng = models.FloatField(null=True, blank=True)
+    geocode_status = models.CharField(max_length=10, choices=GEOCODE_STATUS_CHOICES,
+                                      default=GEOCODE_PENDING, db_index=True)
+    geocoded_at = models.DateTimeField(null=True, blank=True)
 
     class Meta:
         unique_together = ('city', 'state', 'country')
@@ -17,12 +55,24 @@ class PurchaseLocation(models.Model):
         parts.append(self.country)
         return ', '.join(parts)
 
+    @property
+    def has_coords(self):
+        return self.lat is not None and self.lng is not None
+
 class Order(models.Model):
     id = models.AutoField(primary_key=True)
     total = models.IntegerField()
     date = models.DateTimeField(auto_now_add=True)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     location = models.ForeignKey(PurchaseLocation, null=True, blank=True, on_delete=models.SET_NULL)
+    # set by the checkout form so a resubmitted purchase returns this order
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'],
+                                    name='order_user_idempotency_key'),
+        ]
 
     def __str__(self):
         return str(self.id) + ' - ' + self.user.username
@@ -36,3 +86,18 @@ class Item(models.Model):
 
     def __str__(self):
         return str(self.id) + ' - ' + self.movie.name
+
+class OrderSummary(models.Model):
+    # kept up to date by cart.checkout so the order history header does not
+    # aggregate the user's whole history
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True,
+                                related_name='order_summary')
+    order_count = models.IntegerField(default=0)
+    lifetime_spend = models.IntegerField(default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name_plural = 'order summaries'
+
+    def __str__(self):
+        return self.user.username + ' - ' + str(self.order_count) + ' orders'
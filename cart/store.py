@@ -0,0 +1,169 @@
+"""Shopping cart kept outside the database session.
+
+A cart maps movie ids to the quantity plus a snapshot of the movie's
+name and price taken when it was added, so the cart page and its total
+render without touching ``Movie``. ``revalidate`` refreshes the
+snapshots with one query before checkout, and the order itself is priced
+from the database by ``cart.checkout``.
+
+``CART_STORE`` picks where carts live:
+
+* ``'cookie'`` (default): the whole cart in a signed, compressed cookie.
+  Nothing is stored server-side. Browsers drop cookies over about 4KB,
+  so ``add`` refuses a movie that would push the cookie past
+  ``MAX_COOKIE_BYTES``.
+* ``'cache'``: the cart in the cache under a random id, with the id in
+  a signed cookie. Needs a shared cache backend when running several
+  processes.
+
+Views load a cart with ``get_cart(request)``, change it, and call
+``cart.save(response)`` on the response they return. ``Cart.add`` raises
+ValueError with a message for the user when it refuses a change.
+"""
+import secrets
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+
+COOKIE_NAME = 'cart'
+SALT = 'cart.store'
+MAX_QUANTITY = 10
+# leaves room for the cookie's name and attributes under the browsers' 4096
+MAX_COOKIE_BYTES = 3800
+
+
+def cart_timeout():
+    return getattr(settings, 'CART_TIMEOUT', 60 * 60 * 24 * 14)
+
+
+def cache_store():
+    return getattr(settings, 'CART_STORE', 'cookie') == 'cache'
+
+
+def _encode(value):
+    return signing.dumps(value, salt=SALT, compress=True)
+
+
+class CartLine:
+    def __init__(self, movie_id, quantity, name, price):
+        self.id = movie_id
+        self.quantity = quantity
+        self.name = name
+        self.price = price
+
+    @property
+    def subtotal(self):
+        return self.price * self.quantity
+
+
+class Cart:
+    def __init__(self, data=None, cart_id=None):
+        # {movie id (str): [quantity, name, price]}, kept JSON-friendly
+        self.data = data or {}
+        self.cart_id = cart_id
+        self.modified = False
+
+    def __len__(self):
+        return len(self.data)
+
+    def __bool__(self):
+        return bool(self.data)
+
+    @property
+    def lines(self):
+        return [CartLine(int(movie_id), quantity, name, price)
+                for movie_id, (quantity, name, price) in self.data.items()]
+
+    @property
+    def total(self):
+        return sum(quantity * price for quantity, _, price in self.data.values())
+
+    def quantities(self):
+        return {int(movie_id): quantity for movie_id, (quantity, _, _) in self.data.items()}
+
+    def add(self, movie, quantity):
+        """Set ``movie``'s quantity, snapshotting its name and price."""
+        try:
+            quantity = int(quantity)
+        except (TypeError, ValueError):
+            quantity = 0
+        if not 1 <= quantity <= MAX_QUANTITY:
+            raise ValueError(f'Choose a quantity from 1 to {MAX_QUANTITY}.')
+        key = str(movie.id)
+        previous = self.data.get(key)
+        self.data[key] = [quantity, movie.name, movie.price]
+        if not cache_store() and len(_encode(self.data)) > MAX_COOKIE_BYTES:
+            if previous is None:
+                del self.data[key]
+            else:
+                self.data[key] = previous
+            raise ValueError('Your cart is full. Purchase or clear it before adding more movies.')
+        self.modified = True
+
+    def clear(self):
+        self.data = {}
+        self.modified = True
+
+    def revalidate(self):
+        """Refresh names and prices from the database in one query and drop
+        movies that no longer exist. Returns the lines whose price changed."""
+        from movies.models import Movie
+
+        if not self.data:
+            return []
+        current = {str(movie_id): (name, price) for movie_id, name, price in
+                   Movie.objects.filter(id__in=list(self.data)).values_list('id', 'name', 'price')}
+        changed = []
+        for movie_id in list(self.data):
+            quantity, name, price = self.data[movie_id]
+            if movie_id not in current:
+                del self.data[movie_id]
+                self.modified = True
+                continue
+            if current[movie_id] != (name, price):
+                if current[movie_id][1] != price:
+                    changed.append(CartLine(int(movie_id), quantity, *current[movie_id]))
+                self.data[movie_id] = [quantity, *current[movie_id]]
+                self.modified = True
+        return changed
+
+    def save(self, response):
+        """Persist the cart if it changed, setting cookies on ``response``."""
+        if not self.modified:
+            return
+        if cache_store():
+            if not self.data:
+                if self.cart_id:
+                    cache.delete(f'cart:{self.cart_id}')
+                response.delete_cookie(COOKIE_NAME)
+                return
+            self.cart_id = self.cart_id or secrets.token_urlsafe(16)
+            cache.set(f'cart:{self.cart_id}', self.data, cart_timeout())
+            value = self.cart_id
+        else:
+            if not self.data:
+                response.delete_cookie(COOKIE_NAME)
+                return
+            value = self.data
+        response.set_cookie(
+            COOKIE_NAME, _encode(value),
+            max_age=cart_timeout(), httponly=True, samesite='Lax',
+            secure=settings.SESSION_COOKIE_SECURE)
+        self.modified = False
+
+
+def get_cart(request):
+    """The request's cart; empty if it has none or the cookie is invalid."""
+    token = request.COOKIES.get(COOKIE_NAME)
+    if not token:
+        return Cart()
+    try:
+        value = signing.loads(token, salt=SALT, max_age=cart_timeout())
+    except signing.BadSignature:
+        return Cart()
+    if cache_store():
+        if not isinstance(value, str):
+            return Cart()
+        return Cart(cache.get(f'cart:{value}'), cart_id=value)
+    return Cart(value if isinstance(value, dict) else None)
@@ -0,0 +1,50 @@
+"""Per-user order summaries: order count, lifetime spend, last order date.
+
+``record_order`` runs inside the checkout transaction and adds the new
+order to the user's ``OrderSummary`` row, so the order history page reads
+the header with one primary-key lookup instead of aggregating every order.
+``recompute`` rebuilds the rows from ``Order``; it backs the data migration
+and can be rerun after orders are edited or deleted by hand.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Sum
+
+from .models import Order, OrderSummary
+
+
+def summary_for(user):
+    """The user's summary, or an empty unsaved one if they never ordered."""
+    return OrderSummary.objects.filter(user=user).first() or OrderSummary(user=user)
+
+
+def record_order(order):
+    summaries = OrderSummary.objects.filter(user_id=order.user_id)
+    changes = {
+        'order_count': F('order_count') + 1,
+        'lifetime_spend': F('lifetime_spend') + order.total,
+        # orders are dated when they are created, so the newest is this one
+        'last_order_date': order.date,
+    }
+    if summaries.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            OrderSummary.objects.create(user_id=order.user_id, order_count=1,
+                                        lifetime_spend=order.total, last_order_date=order.date)
+    except IntegrityError:
+        # another checkout by the same user created the row first
+        summaries.update(**changes)
+
+
+def recompute(order_model=Order, summary_model=OrderSummary, batch_size=1000):
+    """Replace every summary with one aggregated from orders; returns the
+    number of rows written."""
+    rows = (order_model.objects.values('user_id')
+            .annotate(count=Count('id'), spend=Sum('total'), last=Max('date')).order_by())
+    summary_model.objects.all().delete()
+    summaries = summary_model.objects.bulk_create(
+        [summary_model(user_id=row['user_id'], order_count=row['count'],
+                       lifetime_spend=row['spend'], last_order_date=row['last'])
+         for row in rows.iterator()],
+        batch_size=batch_size)
+    return len(summaries)
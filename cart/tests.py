@@ -1,3 +1,195 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from mapview.models import MovieCountryDailySales
+from movies.models import Movie, MoviePairCount
+from .checkout import checkout
+from .models import Country, Item, Order, PurchaseLocation
+from .store import MAX_COOKIE_BYTES
+
+
+def create_movies(count=3):
+    """Movies named 'Movie 0', 'Movie 1', ... priced 5, 6, ..."""
+    return [Movie.objects.create(name=f'Movie {i}', price=5 + i, description='',
+                                 image='movie_images/logo.png') for i in range(count)]
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer', password='pw')
+        self.client.force_login(self.user)
+        self.movies = create_movies()
+        for movie in self.movies:
+            self.client.post(reverse('cart.add', args=[movie.id]), {'quantity': '2'})
+
+    def test_resubmitted_purchase_returns_the_same_order(self):
+        key = self.client.get(reverse('cart.purchase')).context['template_data']['idempotency_key']
+        form = {'city': 'Atlanta', 'state': 'GA', 'country': 'USA', 'idempotency_key': key}
+        first = self.client.post(reverse('cart.purchase'), form)
+        second = self.client.post(reverse('cart.purchase'), form)
+
+        order = Order.objects.get()
+        self.assertEqual(first.context['template_data']['order_id'], order.id)
+        self.assertEqual(second.context['template_data']['order_id'], order.id)
+        self.assertEqual(order.total, (5 + 6 + 7) * 2)
+        self.assertEqual(sorted(Item.objects.values_list('price', 'quantity')),
+                         [(5, 2), (6, 2), (7, 2)])
+        self.assertEqual(MovieCountryDailySales.objects.count(), 3)
+        self.assertEqual(MoviePairCount.objects.count(), 6)
+        self.assertFalse(self.client.get(reverse('cart.index')).context['template_data']['cart'])
+
+    def test_blank_city_or_country_is_rejected(self):
+        for city, country in [('Atlanta', '  '), (' ', 'USA')]:
+            response = self.client.post(reverse('cart.purchase'),
+                                        {'city': city, 'state': 'GA', 'country': country})
+            self.assertEqual(response.context['template_data']['error'], 'Enter a city and a country.')
+        with self.assertRaises(ValueError):
+            checkout(self.user, {self.movies[0].id: 1}, 'Atlanta', 'GA', None)
+        self.assertFalse(Order.objects.exists())
+        self.assertFalse(Country.objects.filter(name='').exists())
+        self.assertTrue(self.client.get(reverse('cart.index')).context['template_data']['cart'])
+
+
+class NormalizeLocationsTests(TestCase):
+    def test_duplicates_are_merged_without_losing_orders(self):
+        user = User.objects.create_user('buyer')
+        movie = create_movies(1)[0]
+        usa = Country.objects.get(name='United States of America')
+        canonical = PurchaseLocation.objects.create(
+            city='Atlanta', state='GA', country=usa.name, canonical_country=usa)
+        locations = [canonical, PurchaseLocation.objects.create(city=' atlanta', state='ga', country='usa'),
+                     PurchaseLocation.objects.create(city='Nowhere', country='')]
+        for location in locations + [locations[1]]:
+            order = Order.objects.create(user=user, total=5, location=location)
+            Item.objects.create(order=order, movie=movie, price=5, quantity=1)
+
+        out = io.StringIO()
+        call_command('normalize_locations', stdout=out)
+
+        self.assertIn('merged 1 duplicate(s), skipped 1 without a city or country', out.getvalue())
+        self.assertFalse(PurchaseLocation.objects.filter(id=locations[1].id).exists())
+        self.assertEqual(Order.objects.filter(location=canonical).count(), 3)
+        self.assertEqual(Order.objects.filter(location=locations[2]).count(), 1)
+        self.assertEqual(Item.objects.count(), 4)
+        self.assertIsNone(PurchaseLocation.objects.get(city='Nowhere').canonical_country)
+        self.assertEqual(MovieCountryDailySales.objects.get(country=usa).items, 3)
+
+
+class CartStoreTests(TestCase):
+    def setUp(self):
+        self.movie = Movie.objects.create(name='Heat', price=12, description='',
+                                          image='movie_images/logo.png')
+
+    def check_cart_flow(self):
+        self.client.post(reverse('cart.add', args=[self.movie.id]), {'quantity': '3'})
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('cart.index'))
+        self.assertContains(response, 'Heat')
+        self.assertEqual(response.context['template_data']['cart'].total, 36)
+
+        Movie.objects.filter(id=self.movie.id).update(price=15)
+        user = User.objects.create_user('buyer')
+        self.client.force_login(user)
+        response = self.client.get(reverse('cart.purchase'))
+        self.assertEqual([line.price for line in response.context['template_data']['price_changes']], [15])
+        self.assertEqual(response.context['template_data']['cart'].total, 45)
+
+        self.client.get(reverse('cart.clear'))
+        self.assertEqual(self.client.get(reverse('cart.index')).context['template_data']['cart'].total, 0)
+
+    def test_cookie_store(self):
+        self.check_cart_flow()
+
+    def test_cache_store(self):
+        with self.settings(CART_STORE='cache'):
+            self.check_cart_flow()
+
+    def test_bad_quantities_are_rejected_with_a_message(self):
+        url = reverse('cart.add', args=[self.movie.id])
+        self.client.post(url, {'quantity': '2'})
+        for quantity in ['0', '11', 'x', '']:
+            response = self.client.post(url, {'quantity': quantity})
+            self.assertEqual(response.context['template_data']['error'],
+                             'Choose a quantity from 1 to 10.')
+        self.assertEqual(self.client.get(reverse('cart.index')).context['template_data']['cart'].total, 24)
+
+    def test_cookie_cart_refuses_to_outgrow_the_cookie(self):
+        # hex digests barely compress, so the cookie grows with every line
+        names = [''.join(hashlib.sha256(f'{i}.{k}'.encode()).hexdigest() for k in range(3))
+                 for i in range(40)]
+        movies = [Movie.objects.create(name=name, price=10, description='',
+                                       image='movie_images/logo.png') for name in names]
+        for movie in movies:
+            response = self.client.post(reverse('cart.add', args=[movie.id]), {'quantity': '1'})
+            if response.status_code == 200:
+                break
+        self.assertIn('cart is full', response.context['template_data']['error'])
+        self.assertLessEqual(len(self.client.cookies['cart'].value), MAX_COOKIE_BYTES)
+        cart = self.client.get(reverse('cart.index')).context['template_data']['cart']
+        self.assertEqual(len(cart), movies.index(movie))
+
+        with self.settings(CART_STORE='cache'):
+            for movie in movies:
+                self.client.post(reverse('cart.add', args=[movie.id]), {'quantity': '1'})
+            self.assertEqual(len(self.client.get(reverse('cart.index')).context['template_data']['cart']), 40)
+
+
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('buyer')
+        self.movies = create_movies()
+        self.place_order()
+        self.place_order()
+
+    def place_order(self):
+        return checkout(self.user, {movie.id: 1 for movie in self.movies}, 'Atlanta', 'GA', 'USA')[0]
+
+    def test_incremental_export_from_state_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'orders.jsonl.gz')
+            state = os.path.join(directory, 'state.json')
+
+            def export():
+                call_command('export_orders', format='jsonl', output=output, state=state,
+                             chunk_size=2, stderr=io.StringIO())
+                with gzip.open(output, 'rt') as exported:
+                    return [json.loads(line) for line in exported]
+
+            rows = export()
+            self.assertEqual(len(rows), 6)
+            self.assertEqual(rows[0]['movie_name'], 'Movie 0')
+            self.assertEqual(rows[0]['city'], 'Atlanta')
+
+            order = self.place_order()
+            rows = export()
+            self.assertEqual({row['order_id'] for row in rows}, {order.id})
+            self.assertEqual(len(rows), 3)
+            self.assertEqual(export(), [])
+
+    def test_late_commits_below_the_mark_are_picked_up(self):
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, 'orders.csv')
+            state = os.path.join(directory, 'state.json')
+            late = self.place_order()
+            newest = self.place_order()
+            # the previous run saw every order but ``late``, which had not
+            # committed yet
+            with open(state, 'w') as state_file:
+                json.dump({'after_id': newest.id, 'exported': [
+                    order.id for order in Order.objects.exclude(id=late.id)]}, state_file)
 
-# Create your tests here.
+            call_command('export_orders', output=output, state=state, stderr=io.StringIO())
+            with open(output) as exported:
+                self.assertEqual({row['order_id'] for row in csv.DictReader(exported)}, {str(late.id)})
+            with open(state) as state_file:
+                self.assertEqual(json.load(state_file)['after_id'], newest.id)
@@ -1,88 +1,91 @@
+import uuid
 from django.shortcuts import render
 from django.shortcuts import get_object_or_404, redirect
 from movies.models import Movie
-from .utils import calculate_cart_total
-from .models import Order, Item
+from .checkout import checkout
+from .store import get_cart
 from django.contrib.auth.decorators import login_required
-from .models import Order, Item, PurchaseLocation
 from django.views.decorators.csrf import csrf_exempt
 
 
 def index(request):
-    cart_total = 0
-    movies_in_cart = []
-    cart = request.session.get('cart', {})
-    movie_ids = list(cart.keys())
-    if (movie_ids != []):
-        movies_in_cart = Movie.objects.filter(id__in=movie_ids)
-        cart_total = calculate_cart_total(cart, movies_in_cart)
+    cart = get_cart(request)
 
     template_data = {}
     template_data['title'] = 'Cart'
-    template_data['movies_in_cart'] = movies_in_cart
-    template_data['cart_total'] = cart_total
+    template_data['cart'] = cart
     return render(request, 'cart/index.html', {'template_data': template_data})
 
 def add(request, id):
-    get_object_or_404(Movie, id=id)
-    cart = request.session.get('cart', {})
-    cart[id] = request.POST['quantity']
-    request.session['cart'] = cart
-    return redirect('cart.index')
+    movie = get_object_or_404(Movie.objects.only('id', 'name', 'price'), id=id)
+    cart = get_cart(request)
+    try:
+        cart.add(movie, request.POST['quantity'])
+    except ValueError as e:
+        template_data = {'title': 'Cart', 'cart': cart, 'error': str(e)}
+        return render(request, 'cart/index.html', {'template_data': template_data})
+    response = redirect('cart.index')
+    cart.save(response)
+    return response
 
 def clear(request):
-    request.session['cart'] = {}
-    return redirect('cart.index')
+    cart = get_cart(request)
+    cart.clear()
+    response = redirect('cart.index')
+    cart.save(response)
+    return response
 
 @login_required
 @csrf_exempt
 def purchase(request):
-    cart = request.session.get('cart', {})
-    movie_ids = list(cart.keys())
-    if not movie_ids:
-        return redirect('cart.index')
-
-    movies_in_cart = Movie.objects.filter(id__in=movie_ids)
-    cart_total = calculate_cart_total(cart, movies_in_cart)
+    cart = get_cart(request)
+    error = None
 
     if request.method == 'POST':
-        city = request.POST.get('city')
-        state = request.POST.get('state', '')
-        country = request.POST.get('country')
-
-        # Get or create the location
-        location, _ = PurchaseLocation.objects.get_or_create(
-            city=city.strip(),
-            state=state.strip(),
-            country=country.strip(),
-        )
-
-        order = Order.objects.create(
-            user=request.user,
-            total=cart_total,
-            location=location,
-        )
-
-        for movie in movies_in_cart:
-            Item.objects.create(
-                movie=movie,
-                price=movie.price,
-                order=order,
-                quantity=cart[str(movie.id)],
+        idempotency_key = (request.POST.get('idempotency_key')
+                           or request.headers.get('Idempotency-Key'))
+        # a resubmitted form carries the key of the order it already placed,
+        # even though the cart has been emptied since
+        try:
+            order, created = checkout(
+                request.user,
+                cart.quantities(),
+                request.POST.get('city'),
+                request.POST.get('state', ''),
+                request.POST.get('country'),
+                idempotency_key=idempotency_key,
             )
+        except ValueError as e:
+            error = str(e)
+        else:
+            if order is None:
+                return redirect('cart.index')
 
-        request.session['cart'] = {}
+            template_data = {
+                'title': 'Purchase confirmation',
+                'order_id': order.id,
+            }
+            response = render(request, 'cart/purchase.html', {'template_data': template_data})
+            if created:
+                cart.clear()
+                cart.save(response)
+            return response
 
-        template_data = {
-            'title': 'Purchase confirmation',
-            'order_id': order.id,
-        }
-        return render(request, 'cart/purchase.html', {'template_data': template_data})
+    # If GET (or the location was missing), show the location form with
+    # current prices
+    price_changes = cart.revalidate()
+    if not cart:
+        response = redirect('cart.index')
+        cart.save(response)
+        return response
 
-    # If GET, show the location form
     template_data = {
         'title': 'Confirm Purchase',
-        'movies_in_cart': movies_in_cart,
-        'cart_total': cart_total,
+        'cart': cart,
+        'price_changes': price_changes,
+        'idempotency_key': uuid.uuid4().hex,
+        'error': error,
     }
-    return render(request, 'cart/location_form.html', {'template_data': template_data})
\ No newline at end of file
+    response = render(request, 'cart/location_form.html', {'template_data': template_data})
+    cart.save(response)
+    return response
@@ -0,0 +1,78 @@
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from home.seed import (
+    ZipfSampler, create_locations, create_movie_votes, create_movies, create_orders,
+    create_petitions, create_reviews, create_users, rebuild_derived,
+)
+
+
+class Command(BaseCommand):
+    help = ('Fill the database with reproducible synthetic users, movies, reviews, votes, '
+            'petitions and orders with Zipf-like popularity, for scale testing.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Random seed; the same seed always generates the same data.')
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--reviews', type=int, default=50000)
+        parser.add_argument('--movie-votes', type=int, default=100000)
+        parser.add_argument('--petitions', type=int, default=200)
+        parser.add_argument('--petition-votes', type=int, default=20000)
+        parser.add_argument('--orders', type=int, default=1000000)
+        parser.add_argument('--days', type=int, default=365,
+                            help='Spread the orders over this many days up to today.')
+        parser.add_argument('--skew', type=float, default=1.1,
+                            help='Zipf exponent for movie, user and city popularity.')
+        parser.add_argument('--image', default='movie_images/Jaafar_Assignment_One.jpg',
+                            help='Poster image name given to every generated movie.')
+        parser.add_argument('--batch-size', type=int, default=5000,
+                            help='Rows per bulk_create and per transaction.')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help='Do not recompute counters, rollups and recommendations afterwards.')
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['movies'] < 1 or options['days'] < 1:
+            raise CommandError('--users, --movies and --days must be at least 1.')
+        prefix = f"seed{options['seed']}_"
+        if User.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(f"Seed {options['seed']} has already been loaded into this database.")
+
+        rng = random.Random(options['seed'])
+        skew = options['skew']
+        batch_size = options['batch_size']
+
+        user_ids = self.step('users', lambda: create_users(options['users'], prefix, batch_size))
+        users = ZipfSampler(user_ids, skew, rng)
+        prices = self.step('movies', lambda: create_movies(options['movies'], rng, options['image'],
+                                                           batch_size))
+        movies = ZipfSampler(prices, skew, rng)
+        locations = ZipfSampler(self.step('locations', create_locations), skew, rng)
+
+        self.step('reviews', lambda: create_reviews(options['reviews'], movies, users, rng, batch_size),
+                  options['reviews'])
+        self.step('movie votes', lambda: create_movie_votes(options['movie_votes'], movies, users, rng,
+                                                            batch_size), options['movie_votes'])
+        self.step('petitions', lambda: create_petitions(options['petitions'], options['petition_votes'],
+                                                        users, rng, batch_size),
+                  options['petitions'] + options['petition_votes'])
+        orders, items = self.step('orders', lambda: create_orders(
+            options['orders'], options['days'], prices, movies, users, locations, rng, batch_size))
+        self.stdout.write(f'{orders} order(s) with {items} item(s).')
+        if not options['skip_derived']:
+            self.step('derived data', rebuild_derived)
+        self.stdout.write(self.style.SUCCESS(f"Seeded with --seed {options['seed']}."))
+
+    def step(self, name, create, rows=None):
+        start = time.perf_counter()
+        result = create()
+        elapsed = time.perf_counter() - start
+        if rows is None:
+            rows = result[0] + result[1] if isinstance(result, tuple) else len(result or ())
+        rate = f' ({rows / elapsed:,.0f} rows/s)' if rows and elapsed else ''
+        self.stdout.write(f'Created {name} in {elapsed:.1f}s{rate}.')
+        return result
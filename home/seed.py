@@ -0,0 +1,259 @@
+"""Synthetic data for scale testing (the ``seed_data`` command).
+
+Everything is drawn from one ``random.Random(seed)``, so a seed always
+produces the same users, catalog, reviews, votes, petitions and orders
+(order dates are laid out over the ``days`` before today). Popularity is
+Zipf-like: movies, buyers, reviewers and cities each get a random rank,
+and rank ``r`` is picked with weight ``r ** -skew``, so a few movies and
+cities account for most sales, as in real stores.
+
+Rows are inserted with ``bulk_create`` in batches, one transaction per
+batch. ``Order.date`` and the other ``auto_now_add`` fields are always
+set to "now" on insert; order dates are spread over the period with one
+ranged ``UPDATE`` per batch afterwards. Bulk inserts skip signals, so
+``rebuild_derived`` recomputes the counters and tables that checkout,
+votes and reviews normally maintain.
+"""
+import datetime
+import itertools
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+from cart.countries import normalize_location
+from cart.models import Item, Order, PurchaseLocation
+from movies.models import Movie, MovieVote, Review
+from petitions.models import Petition, Vote
+
+CITIES = [
+    # (city, state, country, lat, lng), roughly biggest markets first
+    ('New York', 'NY', 'USA', 40.7128, -74.0060),
+    ('Los Angeles', 'CA', 'USA', 34.0522, -118.2437),
+    ('Atlanta', 'GA', 'USA', 33.7490, -84.3880),
+    ('Chicago', 'IL', 'USA', 41.8781, -87.6298),
+    ('Houston', 'TX', 'USA', 29.7604, -95.3698),
+    ('London', '', 'United Kingdom', 51.5074, -0.1278),
+    ('Toronto', 'ON', 'Canada', 43.6532, -79.3832),
+    ('Seattle', 'WA', 'USA', 47.6062, -122.3321),
+    ('Mexico City', '', 'Mexico', 19.4326, -99.1332),
+    ('Paris', '', 'France', 48.8566, 2.3522),
+    ('Berlin', '', 'Germany', 52.5200, 13.4050),
+    ('Tokyo', '', 'Japan', 35.6762, 139.6503),
+    ('Sao Paulo', '', 'Brazil', -23.5505, -46.6333),
+    ('Mumbai', '', 'India', 19.0760, 72.8777),
+    ('Sydney', 'NSW', 'Australia', -33.8688, 151.2093),
+    ('Madrid', '', 'Spain', 40.4168, -3.7038),
+    ('Seoul', '', 'South Korea', 37.5665, 126.9780),
+    ('Vancouver', 'BC', 'Canada', 49.2827, -123.1207),
+    ('Manchester', '', 'United Kingdom', 53.4808, -2.2426),
+    ('Rome', '', 'Italy', 41.9028, 12.4964),
+    ('Amsterdam', '', 'Netherlands', 52.3676, 4.9041),
+    ('Buenos Aires', '', 'Argentina', -34.6037, -58.3816),
+    ('Dublin', '', 'Ireland', 53.3498, -6.2603),
+    ('Stockholm', '', 'Sweden', 59.3293, 18.0686),
+    ('Singapore', '', 'Singapore', 1.3521, 103.8198),
+    ('Lagos', '', 'Nigeria', 6.5244, 3.3792),
+    ('Cairo', '', 'Egypt', 30.0444, 31.2357),
+    ('Cape Town', '', 'South Africa', -33.9249, 18.4241),
+    ('Warsaw', '', 'Poland', 52.2297, 21.0122),
+    ('Lisbon', '', 'Portugal', 38.7223, -9.1393),
+    ('Bangkok', '', 'Thailand', 13.7563, 100.5018),
+    ('Jakarta', '', 'Indonesia', -6.2088, 106.8456),
+]
+
+ADJECTIVES = ['Silent', 'Crimson', 'Last', 'Hidden', 'Broken', 'Golden', 'Midnight', 'Lost',
+              'Electric', 'Wild', 'Frozen', 'Secret', 'Distant', 'Burning', 'Quiet', 'Iron',
+              'Hollow', 'Velvet', 'Savage', 'Endless']
+NOUNS = ['River', 'Empire', 'Horizon', 'Garden', 'Signal', 'Harbor', 'Storm', 'Witness',
+         'Frontier', 'Kingdom', 'Mirror', 'Orchard', 'Voyage', 'Canyon', 'Circus', 'Echo',
+         'Lantern', 'Meridian', 'Summit', 'Tide']
+GENRES = ['drama', 'thriller', 'comedy', 'western', 'romance', 'mystery', 'documentary',
+          'science fiction film', 'animated feature', 'war epic']
+REVIEW_OPENERS = ['Loved it.', 'Not for me.', 'A solid watch.', 'Overrated.', 'Instant classic.',
+                  'Beautifully shot.', 'Too long.', 'Great cast.', 'Fell asleep.', 'Would rewatch.']
+REVIEW_CLOSERS = ['The ending surprised me.', 'The soundtrack is great.', 'Pacing drags in the middle.',
+                  'The lead is fantastic.', 'Bring tissues.', 'Better than the book.', '']
+
+
+class ZipfSampler:
+    """Draw items with weight ``rank ** -skew`` over a random ranking."""
+
+    def __init__(self, items, skew, rng):
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(itertools.accumulate(
+            rank ** -skew for rank in range(1, len(self.items) + 1)))
+        self.rng = rng
+
+    def __call__(self, k=1):
+        return self.rng.choices(self.items, cum_weights=self.cum_weights, k=k)
+
+    def distinct(self, k):
+        """Up to ``k`` different items, most likely the popular ones."""
+        picked = []
+        for _ in range(4 * k):
+            item = self(1)[0]
+            if item not in picked:
+                picked.append(item)
+                if len(picked) == k:
+                    break
+        return picked
+
+
+def _batches(count, batch_size):
+    for start in range(0, count, batch_size):
+        yield min(batch_size, count - start)
+
+
+def create_users(count, prefix, batch_size):
+    ids = []
+    for offset, size in zip(range(0, count, batch_size), _batches(count, batch_size)):
+        with transaction.atomic():
+            # '!' is an unusable password, like set_unusable_password()
+            users = User.objects.bulk_create([
+                User(username=f'{prefix}{offset + i}', password='!', email=f'{prefix}{offset + i}@example.com')
+                for i in range(size)])
+        ids += [user.id for user in users]
+    return ids
+
+
+def create_movies(count, rng, image, batch_size):
+    titles = [f'The {adjective} {noun}' for adjective in ADJECTIVES for noun in NOUNS]
+    rng.shuffle(titles)
+    movies = []
+    for offset, size in zip(range(0, count, batch_size), _batches(count, batch_size)):
+        batch = []
+        for i in range(offset, offset + size):
+            sequel = i // len(titles)
+            name = titles[i % len(titles)] + (f' {sequel + 1}' if sequel else '')
+            batch.append(Movie(
+                name=name, price=rng.randint(5, 25), image=image,
+                description=f'A {rng.choice(GENRES)} about {name.lower()[4:]}.'))
+        with transaction.atomic():
+            movies += Movie.objects.bulk_create(batch)
+    return {movie.id: movie.price for movie in movies}
+
+
+def create_locations():
+    ids = []
+    for city, state, country, lat, lng in CITIES:
+        city, state, country = normalize_location(city, state, country)
+        location, _ = PurchaseLocation.objects.get_or_create(
+            city=city, state=state, country=country.name,
+            defaults={'canonical_country': country, 'lat': lat, 'lng': lng,
+                      'geocode_status': PurchaseLocation.GEOCODE_OK,
+                      'geocoded_at': timezone.now()})
+        ids.append(location.id)
+    return ids
+
+
+def create_reviews(count, movies, users, rng, batch_size):
+    for size in _batches(count, batch_size):
+        with transaction.atomic():
+            Review.objects.bulk_create([
+                Review(movie_id=movie_id, user_id=user_id,
+                       comment=f'{rng.choice(REVIEW_OPENERS)} {rng.choice(REVIEW_CLOSERS)}'.strip())
+                for movie_id, user_id in zip(movies(size), users(size))])
+
+
+def create_movie_votes(count, movies, users, rng, batch_size):
+    # each movie has its own share of thumbs up; repeated (user, movie)
+    # pairs are dropped by the unique constraint
+    approval = {movie_id: rng.betavariate(4, 2) for movie_id in movies.items}
+    for size in _batches(count, batch_size):
+        with transaction.atomic():
+            MovieVote.objects.bulk_create([
+                MovieVote(movie_id=movie_id, user_id=user_id,
+                          vote_type='up' if rng.random() < approval[movie_id] else 'down')
+                for movie_id, user_id in zip(movies(size), users(size))],
+                ignore_conflicts=True)
+
+
+def create_petitions(count, vote_count, users, rng, batch_size):
+    with transaction.atomic():
+        petitions = Petition.objects.bulk_create([
+            Petition(title=f'Add {rng.choice(ADJECTIVES).lower()} {rng.choice(GENRES)}s',
+                     description='', created_by_id=user_id)
+            for user_id in users(count)])
+    if not petitions:
+        return
+    petition_ids = ZipfSampler([petition.id for petition in petitions], 1.0, rng)
+    for size in _batches(vote_count, batch_size):
+        with transaction.atomic():
+            Vote.objects.bulk_create([
+                Vote(petition_id=petition_id, user_id=user_id)
+                for petition_id, user_id in zip(petition_ids(size), users(size))],
+                ignore_conflicts=True)
+
+
+def _daily_counts(count, days, rng):
+    """Split ``count`` orders over ``days``, growing over time, with weekends busier."""
+    today = timezone.localdate()
+    dates = [today - datetime.timedelta(days=days - 1 - i) for i in range(days)]
+    weights = [(1 + i / days) * (1.3 if day.weekday() >= 5 else 1.0) for i, day in enumerate(dates)]
+    counts = [0] * days
+    for index in rng.choices(range(days), weights=weights, k=count):
+        counts[index] += 1
+    return zip(dates, counts)
+
+
+def _create_orders(day, size, prices, movies, users, locations, rng):
+    # seconds into the day, sorted so order ids and dates grow together
+    times = sorted(rng.randrange(24 * 60 * 60) for _ in range(size))
+    baskets = []
+    for _ in range(size):
+        basket_size = min(1 + int(rng.expovariate(1.2)), 6)
+        baskets.append([(movie_id, rng.choice((1, 1, 1, 1, 2, 2, 3)))
+                        for movie_id in movies.distinct(basket_size)])
+    with transaction.atomic():
+        orders = Order.objects.bulk_create([
+            Order(user_id=user_id, location_id=location_id,
+                  total=sum(prices[movie_id] * quantity for movie_id, quantity in basket))
+            for user_id, location_id, basket in zip(users(size), locations(size), baskets)])
+        Item.objects.bulk_create([
+            Item(order_id=order.id, movie_id=movie_id, price=prices[movie_id], quantity=quantity)
+            for order, basket in zip(orders, baskets) for movie_id, quantity in basket])
+
+        midnight = timezone.make_aware(datetime.datetime.combine(day, datetime.time()))
+        hours = {}
+        for order, seconds in zip(orders, times):
+            first, _ = hours.setdefault(seconds // 3600, (order.id, order.id))
+            hours[seconds // 3600] = (first, order.id)
+        Order.objects.filter(id__range=(orders[0].id, orders[-1].id)).update(date=Case(*[
+            When(id__range=ids, then=Value(midnight + datetime.timedelta(hours=hour)))
+            for hour, ids in hours.items()]))
+    return len(orders), sum(map(len, baskets))
+
+
+def create_orders(count, days, prices, movies, users, locations, rng, batch_size):
+    """Place ``count`` orders over the last ``days`` days; returns
+    ``(orders, items)`` created."""
+    orders = items = 0
+    for day, day_count in _daily_counts(count, days, rng):
+        for size in _batches(day_count, batch_size):
+            created = _create_orders(day, size, prices, movies, users, locations, rng)
+            orders += created[0]
+            items += created[1]
+    return orders, items
+
+
+def rebuild_derived():
+    """Recompute what the bulk inserts skipped: vote counters, popularity,
+    order summaries, map rollups, recommendations and the autocomplete
+    index. Cached review leaderboards catch up when they expire."""
+    from cart.summaries import recompute as recompute_summaries
+    from mapview.rollups import rebuild as rebuild_rollups
+    from movies.autocomplete import bump_version
+    from movies.popularity import recompute as recompute_popularity
+    from movies.recommendations import np, rebuild as rebuild_recommendations
+    from movies.votes import reconcile_counts
+
+    reconcile_counts()
+    recompute_popularity()
+    recompute_summaries()
+    rebuild_rollups()
+    if np is not None:
+        rebuild_recommendations()
+    bump_version()
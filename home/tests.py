@@ -0,0 +1,47 @@
+import datetime
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from cart.models import Item, Order, OrderSummary
+from movies.models import Movie, MovieVote, Review
+from petitions.models import Petition
+
+
+class SeedDataTests(TestCase):
+    def seed(self):
+        call_command('seed_data', seed=3, users=20, movies=10, reviews=30, movie_votes=50,
+                     petitions=3, petition_votes=20, orders=100, days=10, batch_size=16,
+                     stdout=StringIO())
+
+    def snapshot(self):
+        # ids differ between loads, so compare natural values in id order
+        return (
+            list(User.objects.order_by('id').values_list('username', flat=True)),
+            list(Movie.objects.order_by('id').values_list('name', 'price', 'thumbs_up', 'thumbs_down')),
+            list(Review.objects.order_by('id').values_list('movie__name', 'user__username', 'comment')),
+            list(Item.objects.order_by('id').values_list(
+                'order__user__username', 'order__date', 'order__location__city', 'movie__name', 'quantity')),
+        )
+
+    def test_counts_and_reproducibility(self):
+        self.seed()
+        self.assertEqual(User.objects.count(), 20)
+        self.assertEqual(Movie.objects.count(), 10)
+        self.assertEqual(Review.objects.count(), 30)
+        self.assertEqual(Petition.objects.count(), 3)
+        self.assertEqual(Order.objects.count(), 100)
+        self.assertGreaterEqual(Item.objects.count(), 100)
+        self.assertTrue(0 < MovieVote.objects.count() <= 50)
+        self.assertEqual(OrderSummary.objects.count(), Order.objects.values('user').distinct().count())
+        oldest = timezone.localdate() - datetime.timedelta(days=9)
+        self.assertFalse(Order.objects.filter(date__date__lt=oldest).exists())
+        first = self.snapshot()
+
+        User.objects.all().delete()
+        Movie.objects.all().delete()
+        self.seed()
+        self.assertEqual(self.snapshot(), first)
@@ -0,0 +1,234 @@
+"""Columnar in-memory snapshot of the sales data for the map analytics.
+
+Used instead of the rollup tables when ``MAPVIEW_ANALYTICS_ENGINE`` is
+``'columnar'``. Every purchased item becomes one row across a handful of
+NumPy arrays, and each map query is a ``bincount`` or a sort-based
+group-by over them. The snapshot refreshes incrementally by loading only
+items, locations and countries with an id above the largest one it has
+seen. Anything that is not an append (deleted orders or items, orders
+moved between locations by ``normalize_locations``, a location's country
+changing) calls ``invalidate_snapshot``, and the next request reloads the
+snapshot from scratch.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from cart.models import Country, Item, PurchaseLocation
+from movies.models import Movie
+from .caching import bump_data_version, get_data_version
+from .trending import DECAY_HORIZON_DAYS, WINDOWS
+
+try:
+    import numpy as np
+except ImportError:  # only needed when the columnar engine is enabled
+    np = None
+
+
+class ColumnarSnapshot:
+    COLUMNS = {
+        'item_id': 'int64',
+        'movie_id': 'int32',
+        'quantity': 'int32',
+        'price': 'int32',
+        'day': 'int32',          # proleptic ordinal of the local Order.date
+        'user_id': 'int32',
+        'location_id': 'int32',  # -1 when the order has no location
+    }
+
+    def __init__(self, chunk_size=50000):
+        self.chunk_size = chunk_size
+        self.version = None
+        self.reset = None
+        self.reload()
+
+    def reload(self):
+        self.columns = {name: np.empty(0, dtype) for name, dtype in self.COLUMNS.items()}
+        self.max_item_id = 0
+        self.country_names = []
+        self.country_code = {}
+        self.continent_names = []
+        self.continent_code = {}
+        self.country_continent = np.empty(0, np.int32)
+        self.country_rank = np.empty(0, np.int64)
+        self.max_country_id = 0
+        # location id -> country code, -1 for unknown
+        self.location_country = np.empty(0, np.int32)
+        self.max_location_id = 0
+        self.refresh()
+
+    def refresh(self):
+        """Append items, locations and countries created since the last
+        refresh. Returns the number of new items."""
+        rows = (
+            Item.objects.filter(id__gt=self.max_item_id).order_by('id')
+            .values_list('id', 'movie_id', 'quantity', 'price', 'order__date',
+                         'order__user_id', 'order__location_id')
+            .iterator(chunk_size=self.chunk_size)
+        )
+        new = {name: [] for name in self.COLUMNS}
+        for item_id, movie_id, quantity, price, date, user_id, location_id in rows:
+            new['item_id'].append(item_id)
+            new['movie_id'].append(movie_id)
+            new['quantity'].append(quantity)
+            new['price'].append(price)
+            new['day'].append(timezone.localdate(date).toordinal())
+            new['user_id'].append(user_id)
+            new['location_id'].append(-1 if location_id is None else location_id)
+        added = len(new['item_id'])
+        if added:
+            for name, dtype in self.COLUMNS.items():
+                self.columns[name] = np.concatenate(
+                    [self.columns[name], np.asarray(new[name], dtype=dtype)])
+            self.max_item_id = int(self.columns['item_id'][-1])
+        self._load_dimensions()
+        return added
+
+    def _load_dimensions(self):
+        """Map new location ids to dense country/continent codes."""
+        countries = list(Country.objects.filter(id__gt=self.max_country_id)
+                         .order_by('id').values_list('id', 'name', 'continent'))
+        for country_id, name, continent in countries:
+            self.country_code[country_id] = len(self.country_names)
+            self.country_names.append(name)
+            if continent not in self.continent_code:
+                self.continent_code[continent] = len(self.continent_names)
+                self.continent_names.append(continent)
+        if countries:
+            self.max_country_id = countries[-1][0]
+            self.country_continent = np.concatenate([self.country_continent, np.array(
+                [self.continent_code[continent] for _, _, continent in countries], dtype=np.int32)])
+            # ties between countries go to the first name alphabetically,
+            # as in the rollup queries
+            self.country_rank = np.argsort(np.argsort(np.array(self.country_names)))
+
+        locations = list(PurchaseLocation.objects.filter(id__gt=self.max_location_id)
+                         .order_by('id').values_list('id', 'canonical_country_id'))
+        if locations:
+            self.max_location_id = locations[-1][0]
+        size = max(int(self.columns['location_id'].max(initial=0)), self.max_location_id) + 1
+        if size > len(self.location_country):
+            self.location_country = np.concatenate([
+                self.location_country,
+                np.full(size - len(self.location_country), -1, dtype=np.int32)])
+        for location_id, country_id in locations:
+            if country_id in self.country_code:
+                self.location_country[location_id] = self.country_code[country_id]
+
+    def __len__(self):
+        return len(self.columns['item_id'])
+
+    def _item_countries(self, mask=None):
+        """Country code per item (optionally masked); drops unlocated items."""
+        locations = self.columns['location_id']
+        if mask is not None:
+            locations = locations[mask]
+        codes = np.full(len(locations), -1, dtype=np.int32)
+        located = locations >= 0
+        codes[located] = self.location_country[locations[located]]
+        return codes
+
+    def country_counts(self):
+        codes = self._item_countries()
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.country_names))
+        return {self.country_names[i]: int(c) for i, c in enumerate(counts) if c}
+
+    def continent_counts(self):
+        codes = self._item_countries()
+        continents = self.country_continent[codes[codes >= 0]]
+        counts = np.bincount(continents, minlength=len(self.continent_names))
+        return {self.continent_names[i]: int(c) for i, c in enumerate(counts) if c}
+
+    def location_counts(self, movie_id):
+        mask = self.columns['movie_id'] == movie_id
+        locations = self.columns['location_id'][mask]
+        locations = locations[locations >= 0]
+        ids, counts = np.unique(locations, return_counts=True)
+        return {int(i): int(c) for i, c in zip(ids, counts)}
+
+    def trending(self, window='7d', half_life=None, limit=5):
+        """Same result shape as ``mapview.trending.trending_movies``."""
+        if window not in WINDOWS:
+            raise ValueError(f'Unknown trending window {window!r}')
+        today = timezone.localdate().toordinal()
+        days = WINDOWS[window]
+
+        codes = self._item_countries()
+        mask = codes >= 0
+        if days is not None:
+            mask &= self.columns['day'] >= today - (days - 1)
+        movies = self.columns['movie_id'][mask]
+        codes = codes[mask]
+        if not len(movies):
+            return []
+
+        if half_life:
+            age = today - self.columns['day'][mask]
+            horizon = days if days is not None else DECAY_HORIZON_DAYS
+            weights = np.where(age < horizon, 0.5 ** (age / half_life), 0.0)
+        else:
+            weights = np.ones(len(movies))
+
+        totals = np.bincount(movies)
+        scores = np.bincount(movies, weights=weights)
+        candidates = np.nonzero(totals)[0]
+        # highest score first, ties broken by lower movie id
+        order = np.lexsort((candidates, -scores[candidates]))[:limit]
+        top = candidates[order]
+        names = dict(Movie.objects.filter(id__in=top.tolist()).values_list('id', 'name'))
+
+        data = []
+        for movie_id in top:
+            movie_mask = movies == movie_id
+            region_counts = np.bincount(codes[movie_mask], minlength=len(self.country_names))
+            region_scores = np.bincount(codes[movie_mask], weights=weights[movie_mask],
+                                        minlength=len(self.country_names))
+            region = int(np.lexsort((self.country_rank, -region_counts, -region_scores))[0])
+            data.append({
+                'movie': names.get(int(movie_id)),
+                'total': int(totals[movie_id]),
+                'score': round(float(scores[movie_id]), 3),
+                'region': self.country_names[region],
+                'region_count': int(region_counts[region]),
+            })
+        return data
+
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+RESET_KEY = 'mapview:snapshot-reset'
+
+
+def use_columnar():
+    return getattr(settings, 'MAPVIEW_ANALYTICS_ENGINE', 'rollups') == 'columnar'
+
+
+def invalidate_snapshot():
+    """Make the next ``get_snapshot`` reload from scratch instead of appending."""
+    cache.set(RESET_KEY, time.time_ns(), timeout=None)
+    bump_data_version()
+
+
+def get_snapshot():
+    """Return the process-wide snapshot, refreshed if the data version moved
+    and reloaded if it was invalidated."""
+    global _snapshot
+    if np is None:
+        raise ImproperlyConfigured("MAPVIEW_ANALYTICS_ENGINE = 'columnar' requires numpy.")
+    with _snapshot_lock:
+        version = get_data_version()[0]
+        reset = cache.get(RESET_KEY)
+        if _snapshot is None:
+            _snapshot = ColumnarSnapshot()
+        elif _snapshot.reset != reset:
+            _snapshot.reload()
+        elif _snapshot.version != version:
+            _snapshot.refresh()
+        _snapshot.version = version
+        _snapshot.reset = reset
+        return _snapshot
@@ -0,0 +1,82 @@
+"""Response caching and conditional GET for the map JSON APIs.
+
+All map data derives from orders, items and purchase locations, so one
+data version covers every endpoint. Saving or deleting any of those rows
+bumps the version (after the transaction commits); cached responses are
+keyed by it and ETags are derived from it, so a revalidating client gets
+a 304 without any aggregation running. Endpoints whose answer also
+depends on the calendar (trending windows, decay) are cached with
+``daily=True``, which adds the local date so they roll over at midnight.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+from functools import partial, wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+from django.utils.timezone import localdate, make_aware
+from django.views.decorators.http import condition
+
+VERSION_KEY = 'mapview:data-version'
+
+
+def get_data_version():
+    """Return ``(version, last_modified)``, starting a new version if none is cached."""
+    state = cache.get(VERSION_KEY)
+    if state is None:
+        state = (time.time_ns(), time.time())
+        cache.add(VERSION_KEY, state, timeout=None)
+        state = cache.get(VERSION_KEY, state)
+    return state
+
+
+def bump_data_version():
+    version, _ = get_data_version()
+    # never reuse a version even if the cache lost the previous one
+    cache.set(VERSION_KEY, (max(version + 1, time.time_ns()), time.time()), timeout=None)
+
+
+def _etag(request, *args, daily=False, **kwargs):
+    version, _ = get_data_version()
+    if daily:
+        version = f'{version}:{localdate().isoformat()}'
+    return hashlib.md5(f'{version}:{request.get_full_path()}'.encode()).hexdigest()
+
+
+def _last_modified(request, *args, daily=False, **kwargs):
+    _, modified = get_data_version()
+    if daily:
+        midnight = make_aware(datetime.combine(localdate(), datetime.min.time()))
+        modified = max(modified, midnight.timestamp())
+    return datetime.fromtimestamp(int(modified), tz=timezone.utc)
+
+
+def cached_api(view=None, *, daily=False):
+    """Cache a JSON view's body per data version and answer conditional GETs.
+
+    With ``daily=True`` the cache key and ETag also change with the local date.
+    """
+    if view is None:
+        return partial(cached_api, daily=daily)
+    etag = partial(_etag, daily=daily)
+    last_modified = partial(_last_modified, daily=daily)
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = 'mapview:response:' + etag(request)
+        content = cache.get(key)
+        if content is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code == 200:
+                cache.set(key, response.content,
+                          getattr(settings, 'MAPVIEW_CACHE_TIMEOUT', 60 * 60))
+        else:
+            response = HttpResponse(content, content_type='application/json')
+        # let browsers keep the body but revalidate it on every use
+        patch_cache_control(response, no_cache=True)
+        return response
+
+    return condition(etag_func=etag, last_modified_func=last_modified)(wrapper)
@@ -0,0 +1,87 @@
+"""Grid clustering of purchase locations for the map.
+
+Purchases are bucketed in SQL into square grid cells whose size follows
+the zoom level (about ``CELL_PX`` screen pixels per cell on a 256px tile
+map), so the response holds at most one point per visible cell no matter
+how many locations exist. Only locations with stored coordinates count;
+pending ones show up once the ``geocode_locations`` worker has reached
+them, so a request never geocodes.
+"""
+import math
+
+from django.db.models import Avg, Count, F, Min, Q
+from django.db.models.functions import Floor
+
+from cart.models import Item
+
+CELL_PX = 64
+MAX_ZOOM = 20
+
+
+def cell_size(zoom):
+    """Grid cell size in degrees at ``zoom``."""
+    return 360.0 / (256 * 2 ** zoom) * CELL_PX
+
+
+def parse_bbox(value):
+    """Parse ``west,south,east,north``; raises ValueError when malformed."""
+    west, south, east, north = (float(v) for v in value.split(','))
+    if not (-90 <= south <= north <= 90) or not all(-180 <= x <= 180 for x in (west, east)):
+        raise ValueError('bbox out of range')
+    return west, south, east, north
+
+
+def cluster_locations(bbox, zoom, movie_ids=None):
+    """Return clusters ``{lat, lng, count, locations, label}`` inside ``bbox``.
+
+    ``count`` is the number of purchases, ``lat``/``lng`` their centroid,
+    and ``label`` the city when the cluster is a single location. A bbox
+    whose west edge is east of its east edge crosses the antimeridian.
+    """
+    west, south, east, north = bbox
+    zoom = min(max(int(zoom), 0), MAX_ZOOM)
+    size = cell_size(zoom)
+    # snap to whole cells so a cluster is never split by the viewport edge
+    south = math.floor(south / size) * size
+    north = math.ceil(north / size) * size
+    west = max(math.floor(west / size) * size, -180)
+    east = min(math.ceil(east / size) * size, 180)
+
+    if west <= east:
+        lng_filter = Q(order__location__lng__gte=west, order__location__lng__lte=east)
+    else:
+        lng_filter = Q(order__location__lng__gte=west) | Q(order__location__lng__lte=east)
+
+    items = Item.objects.filter(
+        lng_filter,
+        order__location__lat__gte=south,
+        order__location__lat__lte=north,
+    )
+    if movie_ids:
+        items = items.filter(movie_id__in=movie_ids)
+
+    rows = (
+        items.annotate(
+            cell_x=Floor(F('order__location__lng') / size),
+            cell_y=Floor(F('order__location__lat') / size),
+        )
+        .values('cell_x', 'cell_y')
+        .annotate(
+            count=Count('id'),
+            locations=Count('order__location', distinct=True),
+            lat=Avg('order__location__lat'),
+            lng=Avg('order__location__lng'),
+            city=Min('order__location__city'),
+        )
+    )
+
+    return [
+        {
+            'lat': round(r['lat'], 5),
+            'lng': round(r['lng'], 5),
+            'count': r['count'],
+            'locations': r['locations'],
+            'label': r['city'] if r['locations'] == 1 else None,
+        }
+        for r in rows
+    ]
@@ -0,0 +1,138 @@
+"""Geocoding backends and the coordinate cache stored on PurchaseLocation.
+
+Map views never talk to a geocoding service directly. They read the
+coordinates cached on ``cart.models.PurchaseLocation`` and, for rows that
+have not been geocoded yet, only fall back to a backend that works offline
+(the bundled gazetteer by default), so no network I/O happens while a page
+is loading.
+"""
+import csv
+import os
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from cart.countries import canonical_name
+from cart.models import PurchaseLocation
+
+GAZETTEER_PATH = os.path.join(os.path.dirname(__file__), 'data', 'gazetteer.csv')
+
+
+class GeocodingError(Exception):
+    """The backend could not answer right now (timeout, service down)."""
+
+
+def _key(value):
+    return (value or '').strip().lower()
+
+
+class GazetteerGeocoder:
+    """Offline geocoder backed by the bundled city/country table.
+
+    Cities are matched on (city, country), using the state to break ties.
+    Unknown cities fall back to the country centroid.
+    """
+    offline = True
+
+    def __init__(self, path=GAZETTEER_PATH):
+        self.cities = {}
+        self.countries = {}
+        with open(path, newline='', encoding='utf-8') as f:
+            for row in csv.DictReader(f):
+                coords = (float(row['lat']), float(row['lng']))
+                country = _key(row['country'])
+                if row['city']:
+                    self.cities.setdefault((_key(row['city']), country), []).append(
+                        (_key(row['state']), coords))
+                else:
+                    self.countries[country] = coords
+
+    def geocode(self, city, state, country):
+        country = _key(canonical_name(country))
+        candidates = self.cities.get((_key(city), country))
+        if candidates:
+            for candidate_state, coords in candidates:
+                if candidate_state == _key(state):
+                    return coords
+            return candidates[0][1]
+        return self.countries.get(country)
+
+
+class NominatimGeocoder:
+    """Online geocoder using OpenStreetMap Nominatim through geopy."""
+    offline = False
+
+    def __init__(self, user_agent='moviesstore', timeout=5):
+        from geopy.geocoders import Nominatim
+        self.client = Nominatim(user_agent=user_agent)
+        self.timeout = timeout
+
+    def geocode(self, city, state, country):
+        from geopy.exc import GeocoderServiceError
+        query = ', '.join(filter(None, [city, state, country]))
+        try:
+            location = self.client.geocode(query, timeout=self.timeout)
+        except GeocoderServiceError as e:
+            raise GeocodingError(str(e)) from e
+        if location:
+            return (location.latitude, location.longitude)
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_geocoder(path=None):
+    """Return the backend named by ``settings.GEOCODER_BACKEND``."""
+    path = path or getattr(settings, 'GEOCODER_BACKEND', 'mapview.geocoding.GazetteerGeocoder')
+    return import_string(path)()
+
+
+def geocode_location(location, geocoder=None):
+    """Geocode a single PurchaseLocation and persist the result."""
+    geocoder = geocoder or get_geocoder()
+    try:
+        coords = geocoder.geocode(location.city, location.state, location.country)
+    except GeocodingError:
+        location.geocode_status = PurchaseLocation.GEOCODE_FAILED
+        coords = None
+    else:
+        location.geocode_status = (PurchaseLocation.GEOCODE_OK if coords
+                                   else PurchaseLocation.GEOCODE_NOT_FOUND)
+    location.lat, location.lng = coords or (None, None)
+    location.geocoded_at = timezone.now()
+    location.save(update_fields=['lat', 'lng', 'geocode_status', 'geocoded_at'])
+    return coords
+
+
+def ensure_coords(locations):
+    """Fill in coordinates for pending locations without network I/O.
+
+    With an offline backend configured the result is persisted. Otherwise the
+    rows stay pending for the ``geocode_locations`` command and only get
+    provisional gazetteer coordinates for this response.
+    """
+    geocoder = get_geocoder()
+    gazetteer = get_geocoder('mapview.geocoding.GazetteerGeocoder')
+    for location in locations:
+        if location.geocode_status != PurchaseLocation.GEOCODE_PENDING:
+            continue
+        if geocoder.offline:
+            geocode_location(location, geocoder)
+        else:
+            location.lat, location.lng = (
+                gazetteer.geocode(location.city, location.state, location.country) or (None, None))
+    return locations
+
+
+def cached_coords(city, state, country):
+    """Coordinates for a free-form address, read through the location cache."""
+    location = PurchaseLocation.objects.filter(
+        city=(city or '').strip(), state=(state or '').strip(), country=(country or '').strip()
+    ).first()
+    if location is None:
+        return get_geocoder('mapview.geocoding.GazetteerGeocoder').geocode(city, state, country)
+    ensure_coords([location])
+    if location.has_coords:
+        return (location.lat, location.lng)
+    return None
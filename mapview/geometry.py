@@ -0,0 +1,101 @@
+"""Bundled country outlines at several levels of detail.
+
+``data/countries.geojson`` holds the Natural Earth 1:110m admin-0
+countries (public domain). ``build_country_shapes`` simplifies it with
+Douglas-Peucker into one file per entry of ``LEVELS``; the map API only
+reads those precomputed files.
+"""
+import json
+import os
+from functools import lru_cache
+
+from cart.countries import canonical_name
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+SOURCE_PATH = os.path.join(DATA_DIR, 'countries.geojson')
+
+# level -> (tolerance in degrees, decimal places kept); None keeps the source
+LEVELS = {
+    'low': (0.5, 2),
+    'medium': (0.1, 3),
+    'high': None,
+}
+
+
+def level_path(level):
+    if LEVELS[level] is None:
+        return SOURCE_PATH
+    return os.path.join(DATA_DIR, f'countries.{level}.geojson')
+
+
+def _distance(p, a, b):
+    """Perpendicular distance from ``p`` to the segment ``a``-``b``."""
+    (x, y), (x1, y1), (x2, y2) = p, a, b
+    dx, dy = x2 - x1, y2 - y1
+    if dx == 0 and dy == 0:
+        return ((x - x1) ** 2 + (y - y1) ** 2) ** 0.5
+    t = max(0, min(1, ((x - x1) * dx + (y - y1) * dy) / (dx * dx + dy * dy)))
+    return ((x - x1 - t * dx) ** 2 + (y - y1 - t * dy) ** 2) ** 0.5
+
+
+def simplify_line(points, tolerance):
+    """Douglas-Peucker simplification, iterative to avoid deep recursion."""
+    if len(points) < 3:
+        return list(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        best, index = 0.0, None
+        for i in range(start + 1, end):
+            d = _distance(points[i], points[start], points[end])
+            if d > best:
+                best, index = d, i
+        if index is not None and best > tolerance:
+            keep[index] = True
+            stack.extend([(start, index), (index, end)])
+    return [p for p, k in zip(points, keep) if k]
+
+
+def simplify_ring(ring, tolerance, digits):
+    """Simplify a closed ring; returns None when it collapses below a triangle."""
+    simplified = simplify_line(ring, tolerance)
+    simplified = [[round(x, digits), round(y, digits)] for x, y in simplified]
+    if len(simplified) < 4:
+        return None
+    return simplified
+
+
+def simplify_geometry(geometry, tolerance, digits):
+    polygons = (geometry['coordinates'] if geometry['type'] == 'MultiPolygon'
+                else [geometry['coordinates']])
+    result = []
+    for polygon in polygons:
+        outer = simplify_ring(polygon[0], tolerance, digits)
+        if outer is None:
+            continue
+        holes = [r for r in (simplify_ring(h, tolerance, digits) for h in polygon[1:]) if r]
+        result.append([outer] + holes)
+    if not result:
+        # keep tiny countries visible: fall back to the rounded source outline
+        result = [[[[round(x, digits), round(y, digits)] for x, y in polygon[0]]]
+                  for polygon in polygons]
+    if len(result) == 1:
+        return {'type': 'Polygon', 'coordinates': result[0]}
+    return {'type': 'MultiPolygon', 'coordinates': result}
+
+
+@lru_cache(maxsize=None)
+def load_level(level):
+    """Return ``[(canonical country name, geometry JSON text), ...]`` for ``level``.
+
+    Geometries are kept pre-serialized so responses only splice strings.
+    """
+    with open(level_path(level), encoding='utf-8') as f:
+        collection = json.load(f)
+    return [
+        (canonical_name(feature['properties']['name']),
+         json.dumps(feature['geometry'], separators=(',', ':')))
+        for feature in collection['features']
+    ]
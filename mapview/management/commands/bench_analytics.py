@@ -0,0 +1,120 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from cart.models import Country, Item, Order, PurchaseLocation
+from mapview.analytics import ColumnarSnapshot
+from movies.models import Movie
+
+
+def orm_queries(movie_id, since):
+    """The same four questions answered by grouped ORM queries over Item."""
+    located = Item.objects.filter(order__location__canonical_country__isnull=False)
+    return {
+        'country': lambda: list(located.values('order__location__canonical_country__name')
+                                .annotate(count=Count('id'))),
+        'continent': lambda: list(located.values('order__location__canonical_country__continent')
+                                  .annotate(count=Count('id'))),
+        'movie locations': lambda: list(
+            Item.objects.filter(movie_id=movie_id, order__location__isnull=False)
+            .values('order__location_id').annotate(count=Count('id'))),
+        'trending 7d': lambda: list(
+            located.filter(order__date__gte=since)
+            .values('movie_id', 'order__location__canonical_country__name')
+            .annotate(count=Count('id'))),
+    }
+
+
+def columnar_queries(snapshot, movie_id):
+    return {
+        'country': snapshot.country_counts,
+        'continent': snapshot.continent_counts,
+        'movie locations': lambda: snapshot.location_counts(movie_id),
+        'trending 7d': lambda: snapshot.trending('7d'),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Compare the columnar analytics snapshot with grouped ORM queries as the '
+            'item count grows. Runs inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+        parser.add_argument('--movies', type=int, default=200)
+        parser.add_argument('--locations', type=int, default=500)
+        parser.add_argument('--days', type=int, default=90)
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def timed(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username='bench-analytics')
+        movies = Movie.objects.bulk_create([
+            Movie(name=f'Bench movie {i}', price=10, description='', image='movie_images/logo.png')
+            for i in range(options['movies'])
+        ])
+        countries = list(Country.objects.all())
+        locations = PurchaseLocation.objects.bulk_create([
+            PurchaseLocation(city=f'Bench city {i}', country=c.name, canonical_country=c)
+            for i, c in enumerate(rng.choice(countries) for _ in range(options['locations']))
+        ])
+        now = timezone.now()
+        since = now - datetime.timedelta(days=7)
+
+        self.stdout.write(f"{'items':>9} {'query':<16} {'orm ms':>9} {'columnar ms':>12} {'speedup':>8}")
+        snapshot = None
+        created = 0
+        for size in sorted(options['sizes']):
+            while created < size:
+                batch = min(20000, size - created)
+                orders = [
+                    Order(user=user, total=10, location=rng.choice(locations))
+                    for _ in range(batch // 2 or 1)
+                ]
+                Order.objects.bulk_create(orders, batch_size=5000)
+                for order in orders:
+                    order.date = now - datetime.timedelta(days=rng.randrange(options['days']))
+                Order.objects.bulk_update(orders, ['date'], batch_size=5000)
+                Item.objects.bulk_create([
+                    Item(order=rng.choice(orders), movie=rng.choice(movies), price=10, quantity=1)
+                    for _ in range(batch)
+                ], batch_size=5000)
+                created += batch
+
+            start = time.perf_counter()
+            if snapshot is None:
+                snapshot = ColumnarSnapshot()
+                action = 'load'
+            else:
+                snapshot.refresh()
+                action = 'incremental refresh'
+            self.stdout.write(f'{created:>9} snapshot {action}: '
+                              f'{(time.perf_counter() - start) * 1000:.0f} ms')
+
+            movie_id = movies[0].id
+            orm = orm_queries(movie_id, since)
+            columnar = columnar_queries(snapshot, movie_id)
+            for name in orm:
+                orm_ms = self.timed(orm[name], options['repeat'])
+                col_ms = self.timed(columnar[name], options['repeat'])
+                self.stdout.write(f'{created:>9} {name:<16} {orm_ms:>9.1f} {col_ms:>12.1f} '
+                                  f'{orm_ms / col_ms:>7.1f}x')
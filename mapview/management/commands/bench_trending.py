@@ -0,0 +1,97 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from cart.models import Country, Item, Order, PurchaseLocation
+from mapview import rollups
+from mapview.models import MovieCountryDailySales
+from mapview.trending import trending_movies
+from movies.models import Movie
+
+
+def legacy_trending():
+    """The old trending_movies_api body: every located Item walked in Python."""
+    counts = {}
+    for item in Item.objects.filter(order__location__isnull=False).select_related(
+            'movie', 'order__location'):
+        regions = counts.setdefault(item.movie.name, {})
+        regions[item.order.location.country] = regions.get(item.order.location.country, 0) + 1
+    totals = sorted(((sum(r.values()), m) for m, r in counts.items()), reverse=True)
+    return totals[:5]
+
+
+class Command(BaseCommand):
+    help = ('Time trending computation against growing item counts. Runs inside a '
+            'transaction that is rolled back, so the database is left untouched.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--movies', type=int, default=50)
+        parser.add_argument('--countries', type=int, default=10)
+        parser.add_argument('--days', type=int, default=60)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Do not time the old Python-loop implementation.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def timed(self, fn, repeat):
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - start)
+        return best * 1000
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username='bench-trending')
+        movies = Movie.objects.bulk_create([
+            Movie(name=f'Bench movie {i}', price=10, description='', image='movie_images/logo.png')
+            for i in range(options['movies'])
+        ])
+        locations = [
+            PurchaseLocation.objects.create(city=f'Bench {c.name}', country=c.name,
+                                            canonical_country=c)
+            for c in Country.objects.order_by('id')[:options['countries']]
+        ]
+        now = timezone.now()
+
+        self.stdout.write(f"{'items':>10} {'rollup rows':>12} {'today ms':>8} {'7d ms':>8} "
+                          f"{'30d+decay ms':>13} {'legacy ms':>10}")
+        created = 0
+        for size in sorted(options['sizes']):
+            while created < size:
+                batch = min(5000, size - created)
+                orders = Order.objects.bulk_create([
+                    Order(user=user, total=10, location=rng.choice(locations))
+                    for _ in range(batch // 2 or 1)
+                ])
+                for order in orders:
+                    order.date = now - datetime.timedelta(days=rng.randrange(options['days']))
+                Order.objects.bulk_update(orders, ['date'], batch_size=1000)
+                Item.objects.bulk_create([
+                    Item(order=rng.choice(orders), movie=rng.choice(movies), price=10, quantity=1)
+                    for _ in range(batch)
+                ], batch_size=1000)
+                created += batch
+            rollups.rebuild()
+            rollup_rows = MovieCountryDailySales.objects.count()
+
+            repeat = options['repeat']
+            day = self.timed(lambda: trending_movies('today'), repeat)
+            week = self.timed(lambda: trending_movies('7d'), repeat)
+            month = self.timed(lambda: trending_movies('30d', half_life=3), repeat)
+            legacy = ('-' if options['skip_legacy']
+                      else f'{self.timed(legacy_trending, 1):.1f}')
+            self.stdout.write(f'{created:>10} {rollup_rows:>12} {day:>8.1f} {week:>8.1f} '
+                              f'{month:>13.1f} {legacy:>10}')
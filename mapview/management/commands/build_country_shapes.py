@@ -0,0 +1,35 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from mapview.geometry import LEVELS, SOURCE_PATH, level_path, simplify_geometry
+
+
+class Command(BaseCommand):
+    help = 'Precompute the simplified country outlines served by the map.'
+
+    def handle(self, *args, **options):
+        with open(SOURCE_PATH, encoding='utf-8') as f:
+            source = json.load(f)
+
+        for level, params in LEVELS.items():
+            if params is None:
+                continue
+            tolerance, digits = params
+            features = [
+                {
+                    'type': 'Feature',
+                    'properties': feature['properties'],
+                    'geometry': simplify_geometry(feature['geometry'], tolerance, digits),
+                }
+                for feature in source['features']
+            ]
+            path = level_path(level)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'type': 'FeatureCollection', 'features': features}, f,
+                          separators=(',', ':'))
+            self.stdout.write(f'{level}: {len(features)} countries, '
+                              f'{os.path.getsize(path) / 1024:.0f} KiB -> {path}')
+        self.stdout.write(self.style.SUCCESS(
+            f'source: {os.path.getsize(SOURCE_PATH) / 1024:.0f} KiB'))
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from cart.models import PurchaseLocation
+from mapview.geocoding import get_geocoder
+from mapview.worker import GeocodingWorker
+
+
+class Command(BaseCommand):
+    help = 'Geocode purchase locations that have no cached coordinates yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--backend', help='Dotted path of the geocoder class to use.')
+        parser.add_argument('--rate', type=float,
+                            default=getattr(settings, 'GEOCODER_RATE_LIMIT', 1.0),
+                            help='Maximum geocoder requests per second (0 for no limit).')
+        parser.add_argument('--concurrency', type=int, default=2,
+                            help='Number of requests allowed in flight at once.')
+        parser.add_argument('--batch-size', type=int, default=50)
+        parser.add_argument('--retries', type=int, default=3,
+                            help='Retries per location after a timeout.')
+        parser.add_argument('--backoff', type=float, default=1.0,
+                            help='Initial retry delay in seconds, doubled on each attempt.')
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also retry locations whose last attempt failed.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running and pick up new locations as they are queued.')
+        parser.add_argument('--interval', type=float, default=30.0,
+                            help='Seconds to sleep between polls in --loop mode.')
+
+    def handle(self, *args, **options):
+        statuses = [PurchaseLocation.GEOCODE_PENDING]
+        if options['retry_failed']:
+            statuses.append(PurchaseLocation.GEOCODE_FAILED)
+        worker = GeocodingWorker(
+            get_geocoder(options['backend']),
+            rate=options['rate'],
+            concurrency=options['concurrency'],
+            batch_size=options['batch_size'],
+            retries=options['retries'],
+            backoff=options['backoff'],
+            statuses=statuses,
+        )
+
+        self.stdout.write(f'Backlog: {worker.backlog()} location(s).')
+        while True:
+            stats = worker.run()
+            self.stdout.write(self.style.SUCCESS(
+                f"Geocoded {stats['processed']} location(s) in {stats['elapsed']:.1f}s "
+                f"({worker.throughput:.2f}/s): {stats['ok']} ok, {stats['not_found']} not found, "
+                f"{stats['failed']} failed, {stats['retries']} retries. "
+                f"Backlog: {worker.backlog()}."
+            ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from mapview.rollups import compute_rollups, rebuild, stored_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the sales rollup tables from raw order items and verify them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verify-only', action='store_true',
+                            help='Only compare the stored rollups with the raw items.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if not options['verify_only']:
+            movie_rows, country_rows = rebuild(options['batch_size'])
+            self.stdout.write(f'Rebuilt {movie_rows} movie and '
+                              f'{country_rows} country rollup row(s).')
+
+        expected = compute_rollups()
+        stored = stored_rollups()
+        mismatches = 0
+        for name, want, have in zip(['movie', 'country'], expected, stored):
+            for key in want.keys() | have.keys():
+                if want.get(key) != have.get(key):
+                    mismatches += 1
+                    self.stderr.write(f'{name} rollup {key}: expected {want.get(key)}, '
+                                      f'stored {have.get(key)}')
+        if mismatches:
+            raise CommandError(f'{mismatches} rollup row(s) do not match the raw items.')
+        self.stdout.write(self.style.SUCCESS('Rollups match the raw items.'))
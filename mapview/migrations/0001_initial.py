@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_rollups(apps, schema_editor):
+    # existing locations have no canonical country until normalize_locations
+    # runs, and the rollups only count sales that have one
+    from cart.countries import assign_countries
+    from mapview.rollups import rebuild
+    assign_countries(apps.get_model('cart', 'PurchaseLocation'), apps.get_model('cart', 'Country'),
+                     apps.get_model('cart', 'CountryAlias'))
+    rebuild(item_model=apps.get_model('cart', 'Item'),
+            movie_rollup_model=apps.get_model('mapview', 'MovieCountryDailySales'),
+            country_rollup_model=apps.get_model('mapview', 'CountryDailySales'))
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('cart', '0006_seed_countries'),
+        ('movies', '0004_movievote'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CountryDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('items', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cart.country')),
+            ],
+            options={
+                'unique_together': {('country', 'day')},
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieCountryDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(db_index=True)),
+                ('items', models.IntegerField(default=0)),
+                ('quantity', models.IntegerField(default=0)),
+                ('country', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='cart.country')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movies.movie')),
+            ],
+            options={
+                'unique_together': {('movie', 'country', 'day')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
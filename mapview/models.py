@@ -1,5 +1,36 @@
 from django.db import models
-from django.contrib.auth.models import User
+from movies.models import Movie
+from cart.models import Country
 
 
-# Create your models here.
+class MovieCountryDailySales(models.Model):
+    """Purchases of one movie from one country on one day.
+
+    Maintained at checkout by ``mapview.rollups.record_order``; rebuilt
+    from ``cart.models.Item`` by the ``rebuild_rollups`` command.
+    """
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
+    country = models.ForeignKey(Country, on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+    items = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('movie', 'country', 'day')
+
+    def __str__(self):
+        return f"{self.movie.name} - {self.country.name} - {self.day}"
+
+
+class CountryDailySales(models.Model):
+    """Purchases of all movies from one country on one day."""
+    country = models.ForeignKey(Country, on_delete=models.CASCADE)
+    day = models.DateField(db_index=True)
+    items = models.IntegerField(default=0)
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('country', 'day')
+
+    def __str__(self):
+        return f"{self.country.name} - {self.day}"
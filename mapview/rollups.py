@@ -0,0 +1,165 @@
+"""Sales rollups read by the map analytics.
+
+``record_order`` folds a new order into the daily rollup tables and must
+run inside the checkout transaction. Edits and deletes are not deltas
+that are easy to apply (an item can move between orders, an order between
+days or countries), so ``mapview.signals`` collects the (country, day)
+keys they touch and ``refresh`` recomputes just those rows from the raw
+items. ``compute_rollups`` recomputes every row for ``rebuild``.
+"""
+from collections import defaultdict
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from cart.models import Item
+from .caching import bump_data_version
+from .models import CountryDailySales, MovieCountryDailySales
+
+
+def _increment(model, keys, items, quantity):
+    """Add to a rollup row, creating it on first use."""
+    updated = model.objects.filter(**keys).update(
+        items=F('items') + items, quantity=F('quantity') + quantity)
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(items=items, quantity=quantity, **keys)
+    except IntegrityError:
+        # another checkout created the row first
+        model.objects.filter(**keys).update(
+            items=F('items') + items, quantity=F('quantity') + quantity)
+
+
+def record_order(order, items):
+    """Add ``items`` of ``order`` to the rollups. Orders without a location
+    (or whose location has no canonical country) are not tracked."""
+    location = order.location
+    if location is None or location.canonical_country_id is None:
+        return
+    country_id = location.canonical_country_id
+    day = timezone.localdate(order.date)
+
+    per_movie = defaultdict(lambda: [0, 0])
+    for item in items:
+        per_movie[item.movie_id][0] += 1
+        per_movie[item.movie_id][1] += int(item.quantity)
+
+    # one UPDATE for the movies that already have a row today, one INSERT
+    # for the rest, so a large order costs the same few statements
+    rows = MovieCountryDailySales.objects.filter(country_id=country_id, day=day)
+    existing = set(rows.filter(movie_id__in=per_movie).values_list('movie_id', flat=True))
+    if existing:
+        rows.filter(movie_id__in=existing).update(
+            items=F('items') + Case(
+                *[When(movie_id=m, then=Value(per_movie[m][0])) for m in existing], default=0),
+            quantity=F('quantity') + Case(
+                *[When(movie_id=m, then=Value(per_movie[m][1])) for m in existing], default=0))
+    missing = [m for m in per_movie if m not in existing]
+    try:
+        with transaction.atomic():
+            MovieCountryDailySales.objects.bulk_create([
+                MovieCountryDailySales(movie_id=m, country_id=country_id, day=day,
+                                       items=per_movie[m][0], quantity=per_movie[m][1])
+                for m in missing
+            ])
+    except IntegrityError:
+        # another checkout created some of the rows first
+        for m in missing:
+            _increment(MovieCountryDailySales,
+                       {'movie_id': m, 'country_id': country_id, 'day': day}, *per_movie[m])
+    _increment(CountryDailySales, {'country_id': country_id, 'day': day},
+               sum(c for c, _ in per_movie.values()),
+               sum(q for _, q in per_movie.values()))
+
+
+def order_keys(orders):
+    """The (country id, local day) rollup keys of an Order queryset."""
+    return {
+        (country_id, timezone.localdate(date))
+        for country_id, date in orders.values_list('location__canonical_country_id', 'date')
+        if country_id is not None
+    }
+
+
+def refresh(keys):
+    """Recompute the rollup rows of each (country id, day) in ``keys``."""
+    for country_id, day in keys:
+        rows = list(
+            Item.objects.filter(order__location__canonical_country_id=country_id,
+                                order__date__date=day)
+            .values('movie_id').annotate(items=Count('id'), total_quantity=Sum('quantity'))
+            .order_by()
+        )
+        MovieCountryDailySales.objects.filter(country_id=country_id, day=day).delete()
+        CountryDailySales.objects.filter(country_id=country_id, day=day).delete()
+        if not rows:
+            continue
+        MovieCountryDailySales.objects.bulk_create([
+            MovieCountryDailySales(movie_id=r['movie_id'], country_id=country_id, day=day,
+                                   items=r['items'], quantity=r['total_quantity'])
+            for r in rows
+        ])
+        CountryDailySales.objects.create(
+            country_id=country_id, day=day, items=sum(r['items'] for r in rows),
+            quantity=sum(r['total_quantity'] for r in rows))
+
+
+def compute_rollups(item_model=Item):
+    """Recompute both rollups from raw items.
+
+    Returns two dicts keyed like the tables' unique constraints, mapping
+    to ``(items, quantity)``.
+    """
+    rows = (
+        item_model.objects.filter(order__location__canonical_country__isnull=False)
+        .annotate(day=TruncDate('order__date'))
+        .values('movie_id', 'order__location__canonical_country_id', 'day')
+        .annotate(items=Count('id'), total_quantity=Sum('quantity'))
+    )
+    movie_rollup = {}
+    country_rollup = defaultdict(lambda: (0, 0))
+    for r in rows:
+        country_id = r['order__location__canonical_country_id']
+        movie_rollup[(r['movie_id'], country_id, r['day'])] = (r['items'], r['total_quantity'])
+        items, quantity = country_rollup[(country_id, r['day'])]
+        country_rollup[(country_id, r['day'])] = (items + r['items'],
+                                                  quantity + r['total_quantity'])
+    return movie_rollup, dict(country_rollup)
+
+
+def stored_rollups():
+    """Current contents of the rollup tables, in the shape of compute_rollups."""
+    movie_rollup = {
+        (r.movie_id, r.country_id, r.day): (r.items, r.quantity)
+        for r in MovieCountryDailySales.objects.all()
+    }
+    country_rollup = {
+        (r.country_id, r.day): (r.items, r.quantity)
+        for r in CountryDailySales.objects.all()
+    }
+    return movie_rollup, country_rollup
+
+
+@transaction.atomic
+def rebuild(batch_size=1000, item_model=Item, movie_rollup_model=MovieCountryDailySales,
+            country_rollup_model=CountryDailySales):
+    """Replace both rollup tables with numbers recomputed from raw items.
+    The model arguments let the data migration pass its historical models."""
+    movie_rollup, country_rollup = compute_rollups(item_model)
+    movie_rollup_model.objects.all().delete()
+    country_rollup_model.objects.all().delete()
+    movie_rollup_model.objects.bulk_create(
+        [movie_rollup_model(movie_id=movie_id, country_id=country_id, day=day,
+                            items=items, quantity=quantity)
+         for (movie_id, country_id, day), (items, quantity) in movie_rollup.items()],
+        batch_size=batch_size)
+    country_rollup_model.objects.bulk_create(
+        [country_rollup_model(country_id=country_id, day=day, items=items, quantity=quantity)
+         for (country_id, day), (items, quantity) in country_rollup.items()],
+        batch_size=batch_size)
+    transaction.on_commit(bump_data_version)
+    return len(movie_rollup), len(country_rollup)
@@ -0,0 +1,88 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from cart.models import Item, Order, PurchaseLocation
+from .analytics import invalidate_snapshot
+from .caching import bump_data_version
+from .rollups import order_keys, refresh
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Item)
+@receiver([post_save, post_delete], sender=PurchaseLocation)
+def invalidate_map_data(sender, **kwargs):
+    transaction.on_commit(bump_data_version)
+
+
+@receiver([post_save, post_delete], sender=Order)
+@receiver([post_save, post_delete], sender=Item)
+@receiver([post_save, post_delete], sender=PurchaseLocation)
+def reload_snapshot_on_change(sender, created=False, update_fields=None, **kwargs):
+    """Deletes and edits are not appends, so the columnar snapshot has to
+    reload; geocoding only touches coordinates, which it does not hold."""
+    if created:
+        return
+    if sender is PurchaseLocation and update_fields and 'canonical_country' not in update_fields:
+        return
+    transaction.on_commit(invalidate_snapshot)
+
+
+def _orders_of(sender, pk):
+    if sender is Order:
+        return Order.objects.filter(pk=pk)
+    if sender is Item:
+        return Order.objects.filter(item__pk=pk)
+    return Order.objects.filter(location_id=pk)
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Item)
+@receiver(pre_save, sender=PurchaseLocation)
+def remember_rollup_keys(sender, instance, update_fields=None, **kwargs):
+    """Note which rollup rows an edited row counted towards before the save.
+    New rows are skipped: checkout adds them with ``record_order``."""
+    if instance._state.adding:
+        return
+    if sender is PurchaseLocation and update_fields and 'canonical_country' not in update_fields:
+        return
+    instance._rollup_keys = order_keys(_orders_of(sender, instance.pk))
+
+
+@receiver(post_save, sender=Order)
+@receiver(post_save, sender=Item)
+@receiver(post_save, sender=PurchaseLocation)
+def refresh_edited_rollups(sender, instance, **kwargs):
+    keys = instance.__dict__.pop('_rollup_keys', None)
+    if keys is not None:
+        refresh(keys | order_keys(_orders_of(sender, instance.pk)))
+
+
+@receiver(pre_delete, sender=Order)
+@receiver(pre_delete, sender=Item)
+@receiver(pre_delete, sender=PurchaseLocation)
+def remember_deleted_rollup_keys(sender, instance, origin=None, **kwargs):
+    """Gather the rollup keys of every row one ``delete()`` removes, cascades
+    included, on the deleted object so they are refreshed once."""
+    target = instance if origin is None else origin
+    if getattr(target, '_rollup_keys', None) is None:
+        target._rollup_keys, target._rollup_orders = set(), set()
+    if sender is PurchaseLocation:
+        target._rollup_keys |= order_keys(_orders_of(sender, instance.pk))
+        return
+    order_id = instance.pk if sender is Order else instance.order_id
+    if order_id not in target._rollup_orders:
+        target._rollup_orders.add(order_id)
+        target._rollup_keys |= order_keys(Order.objects.filter(pk=order_id))
+
+
+@receiver(post_delete, sender=Order)
+@receiver(post_delete, sender=Item)
+@receiver(post_delete, sender=PurchaseLocation)
+def refresh_deleted_rollups(sender, instance, origin=None, **kwargs):
+    # the first post_delete of a cascade comes after every item is gone
+    target = instance if origin is None else origin
+    keys = getattr(target, '_rollup_keys', None)
+    if keys is not None:
+        target._rollup_keys = set()
+        refresh(keys)
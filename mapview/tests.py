@@ -1,3 +1,457 @@
-from django.test import TestCase
+import datetime
+import gzip
+import json
+import threading
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db.models import Count
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from cart.checkout import checkout
+from cart.models import Country, Item, Order, PurchaseLocation
+from cart.tests import create_movies
+from movies.models import Movie
+from mapview import analytics
+from mapview.clustering import cluster_locations
+from mapview.geocoding import GeocodingError, cached_coords, ensure_coords
+from mapview.models import CountryDailySales, MovieCountryDailySales
+from mapview.rollups import compute_rollups, rebuild, record_order, stored_rollups
+from mapview.trending import WINDOWS, trending_movies
+from mapview.worker import GeocodingWorker
+
+
+class FakeGeocoder:
+    """Answers from a dict and times out a set number of times per city."""
+    offline = False
+
+    def __init__(self, coords=None, timeouts=None):
+        self.coords = coords or {}
+        self.timeouts = dict(timeouts or {})
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def geocode(self, city, state, country):
+        with self.lock:
+            self.calls += 1
+        if self.timeouts.get(city):
+            self.timeouts[city] -= 1
+            raise GeocodingError('timed out')
+        return self.coords.get(city)
+
+
+class GeocodeCacheTests(TestCase):
+    def test_offline_lookups_are_stored_and_reused(self):
+        atlanta = PurchaseLocation.objects.create(city='Atlanta', state='GA', country='USA')
+        village = PurchaseLocation.objects.create(city='Tiny Village', country='France')
+        nowhere = PurchaseLocation.objects.create(city='Atlantis', country='Ocean')
+        ensure_coords([atlanta, village, nowhere])
+
+        atlanta.refresh_from_db()
+        self.assertEqual((atlanta.geocode_status, atlanta.lat, atlanta.lng),
+                         (PurchaseLocation.GEOCODE_OK, 33.749, -84.388))
+        # unknown cities fall back to their country's centroid
+        self.assertEqual(PurchaseLocation.objects.get(id=village.id).lat, 46.2276)
+        self.assertEqual(PurchaseLocation.objects.get(id=nowhere.id).geocode_status,
+                         PurchaseLocation.GEOCODE_NOT_FOUND)
+
+        with self.assertNumQueries(0):
+            ensure_coords([atlanta])
+        with self.assertNumQueries(1):
+            self.assertEqual(cached_coords(' Atlanta', 'GA', 'USA '), (33.749, -84.388))
+
+
+class GeocodingWorkerTests(TestCase):
+    def setUp(self):
+        for city in ['Atlanta', 'Paris', 'Atlantis']:
+            PurchaseLocation.objects.create(city=city, country='Somewhere')
+
+    def test_drains_backlog_in_batches_with_retries(self):
+        geocoder = FakeGeocoder(coords={'Atlanta': (33.7, -84.4), 'Paris': (48.9, 2.4)},
+                                timeouts={'Paris': 2})
+        worker = GeocodingWorker(geocoder, rate=0, batch_size=2, backoff=0)
+        self.assertEqual(worker.backlog(), 3)
+
+        stats = worker.run()
+
+        self.assertEqual(stats['processed'], 3)
+        self.assertEqual(stats['ok'], 2)
+        self.assertEqual(stats['not_found'], 1)
+        self.assertEqual(stats['retries'], 2)
+        self.assertEqual(worker.backlog(), 0)
+        paris = PurchaseLocation.objects.get(city='Paris')
+        self.assertEqual((paris.lat, paris.lng), (48.9, 2.4))
+        self.assertIsNotNone(paris.geocoded_at)
+
+    def test_retries_on_pool_threads_are_all_counted(self):
+        cities = [f'City {i}' for i in range(40)]
+        for city in cities:
+            PurchaseLocation.objects.create(city=city, country='Somewhere')
+        geocoder = FakeGeocoder(coords={city: (1.0, 2.0) for city in cities},
+                                timeouts={city: 2 for city in cities})
+        stats = GeocodingWorker(geocoder, rate=0, concurrency=8, batch_size=20, backoff=0).run()
+
+        self.assertEqual(stats['retries'], 80)
+        self.assertEqual(stats['ok'], 40)
+        self.assertEqual(geocoder.calls, 3 * 40 + 3)
+
+    def test_gives_up_after_retries(self):
+        worker = GeocodingWorker(FakeGeocoder(timeouts={'Atlanta': 10}),
+                                 rate=0, retries=1, backoff=0)
+        stats = worker.run()
+
+        self.assertEqual(stats['failed'], 1)
+        self.assertEqual(PurchaseLocation.objects.get(city='Atlanta').geocode_status,
+                         PurchaseLocation.GEOCODE_FAILED)
+
+    def test_command_reports_backlog(self):
+        out = StringIO()
+        call_command('geocode_locations', rate=0, stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertEqual(lines[0], 'Backlog: 3 location(s).')
+        self.assertTrue(lines[-1].endswith('Backlog: 0.'))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='buyer')
+        movie = Movie.objects.create(name='Heat', price=10, description='', image='heat.jpg')
+        self.order = Order.objects.create(user=user, total=10)
+        Item.objects.create(order=self.order, movie=movie, price=10, quantity=1)
+
+    def test_revalidation_returns_304_until_data_changes(self):
+        response = self.client.get('/map/api/countries/')
+        etag = response['ETag']
+        self.assertIn('no-cache', response['Cache-Control'])
+
+        response = self.client.get('/map/api/countries/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        response = self.client.get('/map/api/countries/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_windowed_responses_roll_over_at_midnight(self):
+        MovieCountryDailySales.objects.create(
+            movie=self.order.item_set.get().movie, country=Country.objects.get(name='France'),
+            day=timezone.localdate(), items=1, quantity=1)
+        response = self.client.get('/map/api/trending/', {'window': 'today'})
+        self.assertEqual([m['movie'] for m in response.json()], ['Heat'])
+        etag, modified = response['ETag'], response['Last-Modified']
+
+        tomorrow = timezone.now() + datetime.timedelta(days=1)
+        with mock.patch('django.utils.timezone.now', return_value=tomorrow):
+            response = self.client.get('/map/api/trending/', {'window': 'today'},
+                                       HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), [])
+            response = self.client.get('/map/api/trending/', {'window': 'today'},
+                                       HTTP_IF_MODIFIED_SINCE=modified)
+            self.assertEqual(response.status_code, 200)
+
+    def test_cached_body_skips_aggregation(self):
+        self.client.get('/map/api/trending/')
+        with self.assertNumQueries(0):
+            response = self.client.get('/map/api/trending/')
+        self.assertEqual(response.status_code, 200)
+
+
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        france = Country.objects.get(name='France')
+        usa = Country.objects.get(name='United States of America')
+        self.heat = Movie.objects.create(name='Heat', price=10, description='', image='heat.jpg')
+        self.alien = Movie.objects.create(name='Alien', price=10, description='', image='alien.jpg')
+        today = timezone.localdate()
+        for movie, country, age, items in [(self.heat, france, 0, 1), (self.heat, usa, 6, 1),
+                                           (self.heat, usa, 7, 4), (self.alien, france, 0, 2)]:
+            MovieCountryDailySales.objects.create(
+                movie=movie, country=country, day=today - datetime.timedelta(days=age),
+                items=items, quantity=items)
+
+    def test_windows_count_whole_days_ending_today(self):
+        self.assertEqual([(m['movie'], m['total']) for m in trending_movies('today')],
+                         [('Alien', 2), ('Heat', 1)])
+        self.assertEqual([(m['movie'], m['total']) for m in trending_movies('7d')],
+                         [('Heat', 2), ('Alien', 2)])
+        self.assertEqual([(m['movie'], m['total'], m['region']) for m in trending_movies('all')],
+                         [('Heat', 6, 'United States of America'), ('Alien', 2, 'France')])
+
+    def test_decay_weights_each_day_by_its_age(self):
+        heat = {m['movie']: m for m in trending_movies('7d', half_life=2)}['Heat']
+        self.assertEqual(heat['score'], round(1 + 0.5 ** 3, 3))
+        self.assertEqual(heat['region'], 'France')
+
+    def test_half_life_must_be_a_positive_finite_number(self):
+        for value in ['nan', 'inf', '-inf', '0', '-1', 'x']:
+            response = self.client.get('/map/api/trending/', {'half_life': value})
+            self.assertEqual(response.status_code, 400, value)
+        self.assertEqual(self.client.get('/map/api/trending/', {'window': '24h'}).status_code, 400)
+        response = self.client.get('/map/api/trending/', {'window': '7d', 'half_life': '2'})
+        self.assertEqual(response.json()[1]['score'], 1.125)
+
+
+class ColumnarSnapshotTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        analytics._snapshot = None
+        self.user = User.objects.create(username='buyer')
+        self.movies = create_movies(2)
+        # Movie 0 sells once in each country, so its top region is a tie
+        for movie, city, state, country in [(0, 'Paris', '', 'France'), (0, 'Atlanta', 'GA', 'USA'),
+                                            (1, 'Atlanta', 'GA', 'USA'), (1, 'Boston', 'MA', 'USA')]:
+            self.buy(self.movies[movie], city, state, country)
+
+    def buy(self, movie, city, state, country):
+        with self.captureOnCommitCallbacks(execute=True):
+            return checkout(self.user, {movie.id: 1}, city, state, country)[0]
+
+    def country_counts(self):
+        return dict(Item.objects.filter(order__location__canonical_country__isnull=False)
+                    .values_list('order__location__canonical_country__name').annotate(Count('id')))
+
+    def test_results_match_the_rollups(self):
+        snapshot = analytics.get_snapshot()
+        self.assertEqual(snapshot.country_counts(), self.country_counts())
+        for window in WINDOWS:
+            for half_life in [None, 3]:
+                self.assertEqual(snapshot.trending(window, half_life),
+                                 trending_movies(window, half_life), (window, half_life))
+        self.assertEqual(snapshot.trending('all')[0]['region'], 'France')
+
+    def test_new_rows_are_appended_without_a_reload(self):
+        analytics.get_snapshot()
+        with mock.patch.object(analytics.ColumnarSnapshot, 'reload') as reload:
+            self.buy(self.movies[1], 'Tokyo', '', 'Japan')
+            counts = analytics.get_snapshot().country_counts()
+        reload.assert_not_called()
+        self.assertEqual(counts['Japan'], 1)
+
+    def test_deletes_and_merged_locations_reload(self):
+        analytics.get_snapshot()
+        with self.captureOnCommitCallbacks(execute=True):
+            Order.objects.filter(location__city='Boston').delete()
+        self.assertEqual(analytics.get_snapshot().country_counts(), self.country_counts())
+
+        # a location saved before normalization, merged into Paris afterwards
+        with self.captureOnCommitCallbacks(execute=True):
+            paris = PurchaseLocation.objects.create(city='paris', country='france')
+            order = Order.objects.create(user=self.user, total=5, location=paris)
+            Item.objects.create(order=order, movie=self.movies[1], price=5, quantity=1)
+        self.assertEqual(analytics.get_snapshot().country_counts()['France'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('normalize_locations', stdout=StringIO())
+        self.assertEqual(analytics.get_snapshot().country_counts(),
+                         {'France': 2, 'United States of America': 2})
+
+
+class ClusteringTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='buyer')
+        movies = create_movies(2)
+        for city, coords, purchases in [('Atlanta', (33.7, -84.4), 2), ('Boston', (42.4, -71.1), 1),
+                                        ('Paris', (48.9, 2.4), 1), ('Suva', (-18.1, 178.4), 1),
+                                        ('Apia', (-13.8, -171.8), 1), ('Nowhere', None, 1)]:
+            location = PurchaseLocation.objects.create(city=city, country='Somewhere')
+            if coords:
+                location.lat, location.lng = coords
+                location.geocode_status = PurchaseLocation.GEOCODE_OK
+                location.save()
+            order = Order.objects.create(user=user, total=5, location=location)
+            for i in range(purchases):
+                Item.objects.create(order=order, movie=movies[i % 2], price=5, quantity=1)
+
+    def clusters(self, bbox, zoom, movie_ids=None):
+        return sorted((c['count'], c['locations'], c['label'])
+                      for c in cluster_locations(bbox, zoom, movie_ids))
+
+    def test_cells_shrink_as_zoom_grows(self):
+        world = (-180, -90, 180, 90)
+        # 90 degree cells: the two US cities share one
+        self.assertIn((3, 2, None), self.clusters(world, 0))
+        self.assertIn((2, 1, 'Atlanta'), self.clusters(world, 4))
+        self.assertIn((1, 1, 'Boston'), self.clusters(world, 4))
+        self.assertEqual(sum(c[0] for c in self.clusters(world, 4)), 6)
+        self.assertEqual(self.clusters(world, 4, [Movie.objects.get(name='Movie 1').id]),
+                         [(1, 1, 'Atlanta')])
+
+    def test_bbox_limits_and_wraps_the_antimeridian(self):
+        self.assertEqual(self.clusters((-10, 40, 10, 55), 6), [(1, 1, 'Paris')])
+        self.assertEqual(self.clusters((170, -30, -160, 0), 6), [(1, 1, 'Apia'), (1, 1, 'Suva')])
+
+    def test_pending_locations_are_not_geocoded(self):
+        with self.assertNumQueries(1):
+            self.clusters((-180, -90, 180, 90), 2)
+        self.assertEqual(PurchaseLocation.objects.get(city='Nowhere').geocode_status,
+                         PurchaseLocation.GEOCODE_PENDING)
+
+    def test_api_validates_bbox_and_zoom(self):
+        url = '/map/api/clusters/'
+        self.assertEqual(self.client.get(url, {'bbox': '1,2,3'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'bbox': '0,60,10,50'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'zoom': 'far'}).status_code, 400)
+        response = self.client.get(url, {'bbox': '-10,40,10,55', 'zoom': '99'})
+        self.assertEqual([c['label'] for c in response.json()], ['Paris'])
+
+
+class MovieLocationsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create(username='buyer')
+        self.movies = create_movies(3)
+        for city, coords, bought in [('Atlanta', (33.7, -84.4), [0, 0, 1]),
+                                     ('Paris', (48.9, 2.4), [1]), ('Nowhere', None, [0])]:
+            location = PurchaseLocation.objects.create(
+                city=city, country='Somewhere', lat=coords and coords[0], lng=coords and coords[1],
+                geocode_status=PurchaseLocation.GEOCODE_OK if coords
+                else PurchaseLocation.GEOCODE_NOT_FOUND)
+            order = Order.objects.create(user=user, total=5, location=location)
+            for movie in bought:
+                Item.objects.create(order=order, movie=self.movies[movie], price=5, quantity=1)
+
+    def test_every_movie_in_two_queries(self):
+        # the grouped purchase counts and the locations they point at
+        with self.assertNumQueries(2):
+            data = self.client.get('/map/api/locations/').json()
+        self.assertEqual(
+            [(m['movie'], [(p['city'], p['count']) for p in m['locations']]) for m in data],
+            [('Movie 0', [('Atlanta', 2)]), ('Movie 1', [('Atlanta', 1), ('Paris', 1)])])
+
+        data = self.client.get('/map/api/locations/', {'movies': f'{self.movies[1].id},x'}).json()
+        self.assertEqual([m['movie'] for m in data], ['Movie 1'])
+        self.assertEqual(self.client.get(f'/map/api/movie/{self.movies[1].id}/locations/').json(),
+                         data[0]['locations'])
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create(username='buyer')
+        self.movies = create_movies(3)
+
+    def place(self, location, movies, days_ago, hour=12):
+        day = timezone.localdate() - datetime.timedelta(days=days_ago)
+        date = timezone.make_aware(datetime.datetime.combine(day, datetime.time(hour, 30)))
+        order = Order.objects.create(user=self.user, total=0, location=location)
+        Order.objects.filter(id=order.id).update(date=date)
+        order.date = date
+        items = Item.objects.bulk_create([
+            Item(order=order, movie=self.movies[m], price=5, quantity=m + 1) for m in movies])
+        record_order(order, items)
+
+    def test_incremental_updates_match_the_rebuild(self):
+        usa = Country.objects.get(name='United States of America')
+        atlanta = PurchaseLocation.objects.create(city='Atlanta', state='GA', country=usa.name,
+                                                  canonical_country=usa)
+        boston = PurchaseLocation.objects.create(city='Boston', state='MA', country=usa.name,
+                                                 canonical_country=usa)
+        paris = PurchaseLocation.objects.create(city='Paris', country='France',
+                                                canonical_country=Country.objects.get(name='France'))
+        unknown = PurchaseLocation.objects.create(city='Atlantis', country='')
+        self.place(atlanta, [0, 1], 0)
+        self.place(boston, [1, 2], 0)
+        self.place(atlanta, [1], 1, hour=23)
+        self.place(paris, [0, 1, 2], 1, hour=0)
+        self.place(unknown, [0], 0)
+        self.place(None, [2], 0)
+
+        stored = stored_rollups()
+        self.assertEqual(stored, compute_rollups())
+        today = timezone.localdate()
+        self.assertEqual(stored[0][(self.movies[1].id, usa.id, today)], (2, 4))
+        self.assertEqual(stored[1][(usa.id, today)], (4, 8))
+        call_command('rebuild_rollups', verify_only=True, stdout=StringIO())
+
+        self.assertEqual(rebuild(), (7, 3))
+        self.assertEqual(stored_rollups(), stored)
+
+
+    def test_edits_and_deletes_keep_the_rollups_in_step(self):
+        usa = Country.objects.get(name='United States of America')
+        france = Country.objects.get(name='France')
+        atlanta = PurchaseLocation.objects.create(city='Atlanta', state='GA', country=usa.name,
+                                                  canonical_country=usa)
+        paris = PurchaseLocation.objects.create(city='Paris', country='France',
+                                                canonical_country=france)
+        self.place(atlanta, [0, 1], 0)
+        self.place(atlanta, [1, 2], 1)
+        self.place(paris, [0, 2], 0)
+        orders = list(Order.objects.order_by('id'))
+
+        def check():
+            self.assertEqual(stored_rollups(), compute_rollups())
+
+        item = Item.objects.filter(order=orders[0]).first()
+        item.quantity = 7
+        item.save()
+        check()
+        item.order = orders[2]
+        item.save()
+        check()
+        orders[1].date -= datetime.timedelta(days=3)
+        orders[1].save()
+        check()
+        orders[0].location = paris
+        orders[0].save()
+        check()
+        Item.objects.filter(order=orders[2]).first().delete()
+        check()
+        orders[1].delete()
+        check()
+        self.movies[0].delete()
+        check()
+        paris.canonical_country = usa
+        paris.save()
+        check()
+        paris.delete()
+        check()
+        self.assertEqual(stored_rollups(), ({}, {}))
+
+class CountryShapesTests(TestCase):
+    url = '/map/api/countries/shapes/'
+
+    def setUp(self):
+        cache.clear()
+        CountryDailySales.objects.create(country=Country.objects.get(name='France'),
+                                         day=timezone.localdate(), items=3, quantity=4)
+
+    def test_levels_are_joined_with_counts_and_gzipped(self):
+        sizes = {}
+        for detail in ['low', 'medium', 'high']:
+            sizes[detail] = len(self.client.get(self.url, {'detail': detail}).content)
+        self.assertLess(sizes['low'], sizes['medium'])
+        self.assertLess(sizes['medium'], sizes['high'])
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertLess(len(response.content), sizes['low'])
+        data = json.loads(gzip.decompress(response.content))
+        counts = {f['properties']['name']: f['properties']['count'] for f in data['features']}
+        self.assertEqual(counts['France'], 3)
+        self.assertEqual(sum(counts.values()), 3)
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_unknown_detail_is_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'detail': 'ultra'}).status_code, 400)
+
+    @override_settings(MAPVIEW_ANALYTICS_ENGINE='columnar')
+    def test_columnar_engine_counts_the_shapes(self):
+        analytics._snapshot = None
+        with mock.patch.object(analytics.ColumnarSnapshot, 'country_counts',
+                               return_value={'Japan': 2}) as country_counts:
+            data = self.client.get(self.url).json()
+        country_counts.assert_called_once_with()
+        counts = {f['properties']['name']: f['properties']['count'] for f in data['features']}
+        self.assertEqual(counts['Japan'], 2)
+        self.assertEqual(sum(counts.values()), 2)
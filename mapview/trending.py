@@ -0,0 +1,80 @@
+"""Trending movies computed in SQL from the daily sales rollups.
+
+Windows are whole local days of ``MovieCountryDailySales`` ending today:
+``7d`` covers today and the six days before it, and ``today`` covers
+only the sales since local midnight (the rollups have no finer grain). With a half-life, each day's sales are weighted by
+``0.5 ** (age_in_days / half_life)`` before ranking; the weights are
+passed to the database as a CASE expression, one branch per day.
+"""
+import datetime
+
+from django.db.models import Case, FloatField, Sum, Value, When, F
+from django.utils import timezone
+
+from .models import MovieCountryDailySales
+
+WINDOWS = {'today': 1, '7d': 7, '30d': 30, 'all': None}
+
+# decayed scores over the 'all' window only look this far back
+DECAY_HORIZON_DAYS = 365
+
+
+def window_start(today, days):
+    """First day of a ``days``-day window ending on ``today``."""
+    return today - datetime.timedelta(days=days - 1)
+
+
+def _weighted_items(days, half_life, today):
+    if not half_life:
+        return Sum('items')
+    whens = [
+        When(day=today - datetime.timedelta(days=age),
+             then=Value(0.5 ** (age / half_life)))
+        for age in range(days)
+    ]
+    weight = Case(*whens, default=Value(0.0), output_field=FloatField())
+    return Sum(F('items') * weight, output_field=FloatField())
+
+
+def trending_movies(window='7d', half_life=None, limit=5):
+    """Top ``limit`` movies in ``window`` with the country buying each most.
+
+    Runs two grouped queries over the rollups: one ranks movies, one picks
+    the top region for the movies that made the cut.
+    """
+    if window not in WINDOWS:
+        raise ValueError(f'Unknown trending window {window!r}')
+    today = timezone.localdate()
+    days = WINDOWS[window]
+    rows = MovieCountryDailySales.objects.all()
+    if days is not None:
+        rows = rows.filter(day__gte=window_start(today, days))
+    score_days = days if days is not None else DECAY_HORIZON_DAYS
+
+    top = list(
+        rows.values('movie_id', 'movie__name')
+        .annotate(total=Sum('items'), score=_weighted_items(score_days, half_life, today))
+        .order_by('-score', 'movie_id')[:limit]
+    )
+
+    regions = (
+        rows.filter(movie_id__in=[m['movie_id'] for m in top])
+        .values('movie_id', 'country__name')
+        .annotate(count=Sum('items'), score=_weighted_items(score_days, half_life, today))
+        .order_by('movie_id', '-score', '-count', 'country__name')
+    )
+    top_region = {}
+    for r in regions:
+        top_region.setdefault(r['movie_id'], r)
+
+    data = []
+    for m in top:
+        region = top_region.get(m['movie_id'], {})
+        data.append({
+            'movie': m['movie__name'],
+            'total': m['total'],
+            'score': round(m['score'] or 0, 3),
+            'region': region.get('country__name'),
+            'region_count': region.get('count', 0),
+        })
+    return data
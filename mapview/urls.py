@@ -3,8 +3,11 @@ from . import views
 
 urlpatterns = [
     path("", views.gt_map, name="gt_map"),
+    path("api/locations/", views.all_movie_locations_api, name="all_movie_locations_api"),
     path("api/movie/<int:movie_id>/locations/", views.movie_locations_api, name="movie_locations_api"),
     path("api/continents/", views.continent_popularity_api, name="continent_popularity_api"),  # ✅ new
     path("api/countries/", views.country_popularity_api, name="country_popularity_api"),
+    path("api/countries/shapes/", views.country_shapes_api, name="country_shapes_api"),
+    path("api/clusters/", views.clusters_api, name="clusters_api"),
     path("api/trending/", views.trending_movies_api, name="trending_movies_api"),
 ]
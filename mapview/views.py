@@ -1,23 +1,25 @@
+import json
+import math
 from django.shortcuts import render
-from django.http import JsonResponse
-from cart.models import Item
-from django.db.models import Count
-from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderUnavailable
+from django.http import HttpResponse, JsonResponse
+from cart.models import Item, PurchaseLocation
+from django.db.models import Count, Sum
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+from .analytics import get_snapshot, use_columnar
+from .caching import cached_api
+from .clustering import cluster_locations, parse_bbox
+from .geocoding import cached_coords, ensure_coords
+from .geometry import LEVELS, load_level
+from .models import CountryDailySales
+from .trending import WINDOWS, trending_movies
 
-# --- Geopy setup ---
-geolocator = Nominatim(user_agent="moviesstore")
 
 def get_coords(city, state, country):
-    """Fetch coordinates for a location using GeoPy (Nominatim)."""
-    try:
-        # Build a simple location query string
-        query = ", ".join(filter(None, [city, state, country]))
-        location = geolocator.geocode(query)
-        if location:
-            return {"lat": location.latitude, "lng": location.longitude}
-    except (GeocoderTimedOut, GeocoderUnavailable):
-        return None
+    """Return cached coordinates for a location, without network I/O."""
+    coords = cached_coords(city, state, country)
+    if coords:
+        return {"lat": coords[0], "lng": coords[1]}
     return None
 
 
@@ -26,138 +28,120 @@ def gt_map(request):
     return render(request, "mapview/gt_map.html")
 
 
-def movie_locations_api(request, movie_id):
-    geolocator = Nominatim(user_agent="movies_app")
+def location_points(counts, locations):
+    """Build map points from per-location purchase counts.
 
-    results = (
-        Item.objects.filter(movie_id=movie_id, order__location__isnull=False)
-        .values("order__location__city", "order__location__state", "order__location__country")
-        .annotate(count=Count("id"))
+    ``counts`` maps PurchaseLocation ids to purchase counts; ``locations``
+    maps those ids to their rows, already passed through ensure_coords.
+    Locations are normalized at checkout, so each row is one city.
+    """
+    data = []
+    for location_id, count in counts.items():
+        location = locations.get(location_id)
+        if location is None or not location.has_coords:
+            continue
+        data.append({
+            "city": location.city,
+            "state": location.state,
+            "country": location.country,
+            "count": count,
+            "lat": location.lat,
+            "lng": location.lng,
+        })
+    return data
+
+
+def country_counts():
+    """Purchase counts by canonical country name, from the configured engine."""
+    if use_columnar():
+        return get_snapshot().country_counts()
+    return dict(
+        CountryDailySales.objects.values_list("country__name")
+        .annotate(count=Sum("items"))
     )
 
-    # --- normalization mapping for consistent grouping ---
-    def normalize_country(country):
-        if not country:
-            return ""
-        country = country.strip().lower()
-        if country in ["us", "u.s.", "usa", "united states of america", "united states"]:
-            return "USA"
-        elif country in ["uk", "united kingdom", "england", "great britain"]:
-            return "UK"
-        elif country in ["canada"]:
-            return "Canada"
-        return country.title()
-
-    def normalize_state(state):
-        if not state:
-            return ""
-        return state.strip().title()
-
-    # aggregate by normalized values
-    aggregated = {}
-    for r in results:
-        city = (r["order__location__city"] or "").strip().title()
-        state = normalize_state(r["order__location__state"])
-        country = normalize_country(r["order__location__country"])
-        key = (city, state, country)
-        aggregated[key] = aggregated.get(key, 0) + r["count"]
 
-    data = []
-    for (city, state, country), total in aggregated.items():
-        if not city or not country:
-            continue
-        query = f"{city}, {state}, {country}".strip(", ")
-        try:
-            location = geolocator.geocode(query, timeout=5)
-        except Exception as e:
-            print("Geocode error:", e)
-            continue
+def locations_by_id(ids):
+    locations = ensure_coords(list(PurchaseLocation.objects.filter(id__in=ids).order_by("id")))
+    return {location.id: location for location in locations}
 
-        if location:
-            data.append({
-                "city": city,
-                "state": state,
-                "country": country,
-                "count": total,
-                "lat": location.latitude,
-                "lng": location.longitude,
-            })
 
-    return JsonResponse(data, safe=False)
+@require_GET
+@cached_api
+def movie_locations_api(request, movie_id):
+    if use_columnar():
+        counts = get_snapshot().location_counts(movie_id)
+    else:
+        results = (
+            Item.objects.filter(movie_id=movie_id, order__location__isnull=False)
+            .values("order__location_id")
+            .annotate(count=Count("id"))
+        )
+        counts = {r["order__location_id"]: r["count"] for r in results}
+    return JsonResponse(location_points(counts, locations_by_id(counts)), safe=False)
 
-from django.views.decorators.http import require_GET
 
 @require_GET
-def continent_popularity_api(request):
-    """Return total purchase counts aggregated by continent."""
+@cached_api
+def all_movie_locations_api(request):
+    """Return purchase locations for every movie (or ``?movies=1,2,3``) at once."""
     results = (
         Item.objects.filter(order__location__isnull=False)
-        .values("order__location__country")
+        .values("movie_id", "movie__name", "order__location_id")
         .annotate(count=Count("id"))
+        .order_by("movie_id", "order__location_id")
     )
+    movie_ids = [m for m in request.GET.get("movies", "").split(",") if m.strip().isdigit()]
+    if movie_ids:
+        results = results.filter(movie_id__in=movie_ids)
 
-    # --- Normalize and map countries to continents ---
-    def normalize_country(country):
-        if not country:
-            return ""
-        c = country.strip().lower()
-        if c in ["us", "usa", "united states", "united states of america"]:
-            return "USA"
-        if c in ["uk", "england", "great britain", "united kingdom"]:
-            return "UK"
-        return country.title()
-
-    continent_map = {
-        "North America": ["USA", "Canada", "Mexico"],
-        "South America": [
-            "Brazil", "Argentina", "Chile", "Peru", "Colombia", "Venezuela"
-        ],
-        "Europe": [
-            "UK", "France", "Germany", "Italy", "Spain", "Netherlands",
-            "Sweden", "Norway", "Poland", "Greece", "Ireland", "Portugal"
-        ],
-        "Asia": [
-            "China", "Japan", "India", "South Korea", "Indonesia",
-            "Thailand", "Singapore", "Malaysia", "Philippines", "Saudi Arabia"
-        ],
-        "Africa": [
-            "Egypt", "South Africa", "Nigeria", "Kenya", "Morocco", "Ghana"
-        ],
-        "Oceania": ["Australia", "New Zealand"],
-    }
-
-    def country_to_continent(country):
-        for continent, countries in continent_map.items():
-            if country in countries:
-                return continent
-        return "Other"
-
-    # Aggregate counts by continent
-    continent_counts = {}
+    movies = {}
     for r in results:
-        country = normalize_country(r["order__location__country"])
-        if not country:
-            continue
-        continent = country_to_continent(country)
-        continent_counts[continent] = continent_counts.get(continent, 0) + r["count"]
-
-    # Approximate continent center coordinates
-    continent_coords = {
-        "North America": {"lat": 54.5260, "lng": -105.2551},
-        "South America": {"lat": -8.7832, "lng": -55.4915},
-        "Europe": {"lat": 54.5260, "lng": 15.2551},
-        "Asia": {"lat": 34.0479, "lng": 100.6197},
-        "Africa": {"lat": 1.9577, "lng": 17.8498},
-        "Oceania": {"lat": -22.7359, "lng": 140.0188},
-        "Other": {"lat": 0, "lng": 0},
-    }
+        movie = movies.setdefault(r["movie_id"], {"name": r["movie__name"], "counts": {}})
+        movie["counts"][r["order__location_id"]] = r["count"]
+
+    # each movie only walks its own locations, so the response is built in
+    # time proportional to the grouped rows
+    locations = locations_by_id({loc_id for movie in movies.values() for loc_id in movie["counts"]})
+
+    data = []
+    for movie_id, movie in movies.items():
+        data.append({
+            "movie_id": movie_id,
+            "movie": movie["name"],
+            "locations": location_points(movie["counts"], locations),
+        })
+    return JsonResponse(data, safe=False)
+
+# Approximate continent center coordinates
+CONTINENT_COORDS = {
+    "North America": {"lat": 54.5260, "lng": -105.2551},
+    "South America": {"lat": -8.7832, "lng": -55.4915},
+    "Europe": {"lat": 54.5260, "lng": 15.2551},
+    "Asia": {"lat": 34.0479, "lng": 100.6197},
+    "Africa": {"lat": 1.9577, "lng": 17.8498},
+    "Oceania": {"lat": -22.7359, "lng": 140.0188},
+    "Other": {"lat": 0, "lng": 0},
+}
+
+@require_GET
+@cached_api
+def continent_popularity_api(request):
+    """Return total purchase counts aggregated by continent."""
+    if use_columnar():
+        counts = get_snapshot().continent_counts()
+    else:
+        counts = dict(
+            CountryDailySales.objects.values_list("country__continent")
+            .annotate(count=Sum("items"))
+        )
 
     data = []
-    for continent, total in continent_counts.items():
-        coords = continent_coords.get(continent, {"lat": 0, "lng": 0})
+    for continent, count in counts.items():
+        coords = CONTINENT_COORDS.get(continent, CONTINENT_COORDS["Other"])
         data.append({
             "region": continent,
-            "count": total,
+            "count": count,
             "lat": coords["lat"],
             "lng": coords["lng"],
         })
@@ -165,86 +149,71 @@ def continent_popularity_api(request):
     return JsonResponse(data, safe=False)
 
 @require_GET
+@cached_api
 def country_popularity_api(request):
     """Return total purchase counts aggregated by country."""
-    results = (
-        Item.objects.filter(order__location__isnull=False)
-        .values("order__location__country")
-        .annotate(count=Count("id"))
-    )
-
-    # Normalize country names
-    def normalize_country(country):
-        if not country:
-            return ""
-        c = country.strip().lower()
-        aliases = {
-            "us": "United States of America",
-            "u.s.": "United States of America",
-            "usa": "United States of America",
-            "united states": "United States of America",
-            "uk": "United Kingdom",
-            "england": "United Kingdom",
-            "great britain": "United Kingdom",
-        }
-        return aliases.get(c, country.title())
-
-    aggregated = {}
-    for r in results:
-        country = normalize_country(r["order__location__country"])
-        if country:
-            aggregated[country] = aggregated.get(country, 0) + r["count"]
-
-    data = [{"country": k, "count": v} for k, v in aggregated.items()]
+    counts = country_counts()
+    data = [{"country": country, "count": count} for country, count in counts.items()]
     return JsonResponse(data, safe=False)
 
-from movies.models import Movie
+@gzip_page
+@require_GET
+@cached_api
+def country_shapes_api(request):
+    """Return country outlines joined with purchase counts as GeoJSON.
+
+    ``detail`` picks a precomputed simplification level (low, medium, high).
+    """
+    detail = request.GET.get("detail", "low")
+    if detail not in LEVELS:
+        return JsonResponse({"error": f"detail must be one of {', '.join(LEVELS)}"}, status=400)
+
+    counts = country_counts()
+    features = []
+    for name, geometry in load_level(detail):
+        properties = json.dumps({"name": name, "count": counts.get(name, 0)})
+        features.append(f'{{"type":"Feature","properties":{properties},"geometry":{geometry}}}')
+    body = '{"type":"FeatureCollection","features":[' + ",".join(features) + "]}"
+    return HttpResponse(body, content_type="application/json")
 
 @require_GET
+@cached_api(daily=True)
 def trending_movies_api(request):
-    """Return top 5 most purchased movies globally with one sample region (fixed normalization)."""
-    items = Item.objects.filter(order__location__isnull=False).select_related(
-        "movie", "order__location"
-    )
-
-    def normalize_country(country):
-        if not country:
-            return ""
-        c = country.strip().lower()
-        aliases = {
-            "us": "United States of America",
-            "u.s.": "United States of America",
-            "usa": "United States of America",
-            "united states": "United States of America",
-            "united states of america": "United States of America",
-            "america": "United States of America",
-            "uk": "United Kingdom",
-            "england": "United Kingdom",
-            "great britain": "United Kingdom",
-        }
-        return aliases.get(c, country.title())
-
-    # manually aggregate so normalization happens first
-    movie_country_counts = {}
-    for item in items:
-        movie_name = item.movie.name
-        country = normalize_country(item.order.location.country if item.order.location else None)
-        movie_country_counts.setdefault(movie_name, {})
-        movie_country_counts[movie_name][country] = movie_country_counts[movie_name].get(country, 0) + 1
-
-    # build global totals and top region for each movie
-    movie_totals = []
-    for movie, regions in movie_country_counts.items():
-        total = sum(regions.values())
-        top_region = max(regions, key=regions.get)
-        movie_totals.append({
-            "movie": movie,
-            "total": total,
-            "region": top_region,
-            "region_count": regions[top_region],
-        })
+    """Return the top movies in a time window with the region buying each most.
+
+    Query parameters: ``window`` (today, 7d, 30d or all; default all), in
+    whole local days ending today, so ``today`` starts at local midnight;
+    ``half_life`` in days for exponential decay; and ``limit`` (default 5).
+    """
+    window = request.GET.get("window", "all")
+    if window not in WINDOWS:
+        return JsonResponse({"error": f"window must be one of {', '.join(WINDOWS)}"}, status=400)
+    try:
+        half_life = float(request.GET["half_life"]) if request.GET.get("half_life") else None
+        limit = min(max(int(request.GET.get("limit", 5)), 1), 50)
+    except ValueError:
+        return JsonResponse({"error": "half_life and limit must be numbers"}, status=400)
+    if half_life is not None and not (math.isfinite(half_life) and half_life > 0):
+        return JsonResponse({"error": "half_life must be a positive number"}, status=400)
+
+    if use_columnar():
+        data = get_snapshot().trending(window, half_life, limit)
+    else:
+        data = trending_movies(window, half_life, limit)
+    return JsonResponse(data, safe=False)
 
-    # top 5 globally
-    movie_totals.sort(key=lambda x: x["total"], reverse=True)
-    return JsonResponse(movie_totals[:5], safe=False)
+@require_GET
+@cached_api
+def clusters_api(request):
+    """Return purchase clusters for ``?bbox=west,south,east,north&zoom=N``.
 
+    ``movies=1,2,3`` restricts the clusters to those movies.
+    """
+    try:
+        bbox = parse_bbox(request.GET.get("bbox", "-180,-90,180,90"))
+        zoom = int(request.GET.get("zoom", 2))
+    except ValueError:
+        return JsonResponse({"error": "bbox must be west,south,east,north and zoom an integer"},
+                            status=400)
+    movie_ids = [m for m in request.GET.get("movies", "").split(",") if m.strip().isdigit()]
+    return JsonResponse(cluster_locations(bbox, zoom, movie_ids), safe=False)
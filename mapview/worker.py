@@ -0,0 +1,111 @@
+"""Background geocoding of pending PurchaseLocation rows.
+
+Backend calls run on a small thread pool behind a shared rate limiter;
+results are written back from the calling thread with one ``bulk_update``
+per batch, so worker threads never touch the database.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.utils import timezone
+
+from cart.models import PurchaseLocation
+from .caching import bump_data_version
+from .geocoding import GeocodingError
+
+
+class RateLimiter:
+    """Spaces calls evenly so at most ``rate`` start per second, across threads."""
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate if rate else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class GeocodingWorker:
+    def __init__(self, geocoder, rate=1.0, concurrency=2, batch_size=50,
+                 retries=3, backoff=1.0, statuses=(PurchaseLocation.GEOCODE_PENDING,)):
+        self.geocoder = geocoder
+        self.limiter = RateLimiter(rate)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.retries = retries
+        self.backoff = backoff
+        self.statuses = list(statuses)
+        self.stats = {}
+        # geocode() runs on the pool threads and counts retries from there
+        self.stats_lock = threading.Lock()
+
+    def backlog(self):
+        return PurchaseLocation.objects.filter(geocode_status__in=self.statuses).count()
+
+    def geocode(self, location):
+        """Look up one location, retrying timeouts with exponential backoff."""
+        for attempt in range(self.retries + 1):
+            self.limiter.wait()
+            try:
+                coords = self.geocoder.geocode(location.city, location.state, location.country)
+            except GeocodingError:
+                if attempt == self.retries:
+                    return PurchaseLocation.GEOCODE_FAILED, None
+                with self.stats_lock:
+                    self.stats['retries'] += 1
+                time.sleep(self.backoff * 2 ** attempt)
+            else:
+                if coords:
+                    return PurchaseLocation.GEOCODE_OK, coords
+                return PurchaseLocation.GEOCODE_NOT_FOUND, None
+
+    def run_batch(self, pool, seen):
+        """Geocode the next batch; return how many rows it contained."""
+        batch = list(
+            PurchaseLocation.objects.filter(geocode_status__in=self.statuses)
+            .exclude(id__in=seen).order_by('id')[:self.batch_size]
+        )
+        if not batch:
+            return 0
+
+        now = timezone.now()
+        for location, (status, coords) in zip(batch, pool.map(self.geocode, batch)):
+            location.geocode_status = status
+            location.lat, location.lng = coords or (None, None)
+            location.geocoded_at = now
+            self.stats[status] += 1
+            seen.add(location.id)
+        PurchaseLocation.objects.bulk_update(batch, ['lat', 'lng', 'geocode_status', 'geocoded_at'])
+        # bulk_update sends no signals, so refresh the map APIs explicitly
+        bump_data_version()
+        self.stats['processed'] += len(batch)
+        return len(batch)
+
+    def run(self, max_batches=None):
+        """Drain the backlog batch by batch, or stop after ``max_batches``."""
+        self.stats = {'processed': 0, PurchaseLocation.GEOCODE_OK: 0,
+                      PurchaseLocation.GEOCODE_NOT_FOUND: 0, PurchaseLocation.GEOCODE_FAILED: 0,
+                      'retries': 0, 'elapsed': 0.0}
+        start = time.monotonic()
+        # rows retried in this run and failed again stay excluded until the next run
+        seen = set()
+        batches = 0
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            while max_batches is None or batches < max_batches:
+                if not self.run_batch(pool, seen):
+                    break
+                batches += 1
+        self.stats['elapsed'] = time.monotonic() - start
+        return self.stats
+
+    @property
+    def throughput(self):
+        elapsed = self.stats['elapsed']
+        return self.stats['processed'] / elapsed if elapsed else 0.0
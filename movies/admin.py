@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Movie, Review
+from .models import Movie, Review, ReviewLike
 class MovieAdmin(admin.ModelAdmin):
     ordering = ['name']
     search_fields = ['name']
 admin.site.register(Movie, MovieAdmin)
 admin.site.register(Review)
+admin.site.register(ReviewLike)
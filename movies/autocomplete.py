@@ -0,0 +1,126 @@
+"""In-process prefix index for the catalog's search-as-you-type box.
+
+Each movie name is normalized (case-folded, accents and punctuation
+stripped) and every word position becomes a key, so "kni" finds "The
+Dark Knight". Keys are kept in one sorted list, and a lookup is a
+``bisect`` to the range of keys starting with the query. That range is
+then ranked by ``Movie.popularity``. Short or common prefixes can match
+much of the catalog, so when a range holds more than ``SCAN_LIMIT`` keys
+its top matches are computed when the index is built.
+
+Movie save/delete signals bump a version in the cache, and each process
+rebuilds its index on the next lookup after the version moves. Writes
+that skip signals (votes, purchases, ``bulk_create``) show up after
+``AUTOCOMPLETE_MAX_AGE`` seconds.
+"""
+import heapq
+import re
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Movie
+
+VERSION_KEY = 'movies:autocomplete:version'
+# prefixes matching more keys than this have their top matches precomputed
+SCAN_LIMIT = 256
+DEFAULT_LIMIT = 8
+MAX_LIMIT = 20
+
+
+def normalize(text):
+    text = unicodedata.normalize('NFKD', text.casefold())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(re.findall(r'\w+', text))
+
+
+class PrefixIndex:
+    def __init__(self, movies, top=MAX_LIMIT):
+        """``movies`` is an iterable of (id, name, popularity)."""
+        # movies best first (higher popularity, then alphabetical, then
+        # older); entries refer to movies by position in this list, so the
+        # best matches in a range are simply its smallest positions
+        self.movies = sorted(((-popularity, name.casefold(), movie_id, name)
+                              for movie_id, name, popularity in movies))
+        entries = []
+        for position, (_, _, _, name) in enumerate(self.movies):
+            words = normalize(name).split()
+            for i in range(len(words)):
+                entries.append((' '.join(words[i:]), position))
+        entries.sort()
+        self.keys = [key for key, _ in entries]
+        self.positions = [position for _, position in entries]
+        self.top = {}
+        self._precompute(top)
+
+    def _precompute(self, top):
+        """Store the best matches of every prefix whose range is too long
+        to rank on each lookup."""
+        pending = [('', 0, len(self.keys))]
+        while pending:
+            prefix, start, end = pending.pop()
+            i = start
+            while i < end:
+                if len(self.keys[i]) <= len(prefix):
+                    i += 1
+                    continue
+                child = self.keys[i][:len(prefix) + 1]
+                j = bisect_left(self.keys, child + '\uffff', i, end)
+                if j - i > SCAN_LIMIT:
+                    self.top[child] = heapq.nsmallest(top, set(self.positions[i:j]))
+                    pending.append((child, i, j))
+                i = j
+
+    def __len__(self):
+        return len(self.movies)
+
+    def lookup(self, query, limit=DEFAULT_LIMIT):
+        """Up to ``limit`` (id, name) pairs whose name has a word starting
+        with ``query``, most popular first."""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        if prefix in self.top:
+            positions = self.top[prefix][:limit]
+        else:
+            start = bisect_left(self.keys, prefix)
+            end = bisect_left(self.keys, prefix + '\uffff', start)
+            positions = heapq.nsmallest(limit, set(self.positions[start:end]))
+        return [self.movies[position][2:] for position in positions]
+
+
+_index = None
+_index_version = None
+_index_built = 0.0
+_index_lock = threading.Lock()
+
+
+def bump_version():
+    if not cache.add(VERSION_KEY, 1, timeout=None):
+        try:
+            cache.incr(VERSION_KEY)
+        except ValueError:  # evicted between add and incr
+            cache.add(VERSION_KEY, 1, timeout=None)
+
+
+def get_index():
+    """This process's index, rebuilt if movies changed or it is too old."""
+    global _index, _index_version, _index_built
+    version = cache.get(VERSION_KEY)
+    max_age = getattr(settings, 'AUTOCOMPLETE_MAX_AGE', 300)
+    if _index is not None and _index_version == version and time.monotonic() - _index_built < max_age:
+        return _index
+    with _index_lock:
+        if _index is None or _index_version != version or time.monotonic() - _index_built >= max_age:
+            _index = PrefixIndex(Movie.objects.values_list('id', 'name', 'popularity').iterator())
+            _index_version = version
+            _index_built = time.monotonic()
+        return _index
+
+
+def suggest(query, limit=DEFAULT_LIMIT):
+    return get_index().lookup(query, min(max(limit, 1), MAX_LIMIT))
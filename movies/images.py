@@ -0,0 +1,119 @@
+"""Resized copies of movie posters for the catalog cards and detail page.
+
+Each variant is rendered at 1x and 2x of the height its CSS box allows
+(``img-card-200`` and ``img-card-400``), in WebP plus a fallback for
+browsers without it (PNG for PNG originals, which may be transparent, and
+JPEG otherwise). Files live next to the originals under
+``movie_images/derived/`` in MEDIA_ROOT and are named after the source
+file, so templates build their URLs without a database lookup. The name
+keeps the source extension (``poster-jpg-200.webp``), since ``poster.jpg``
+and ``poster.png`` would otherwise share variants.
+
+``render_derivatives`` works on plain file paths only, so the backfill
+command can run it in worker processes.
+"""
+import os
+
+from django.core.files.storage import default_storage
+
+# variant -> heights in pixels for 1x and 2x screens
+VARIANTS = {
+    'thumb': (200, 400),
+    'detail': (400, 800),
+}
+HEIGHTS = sorted({height for heights in VARIANTS.values() for height in heights})
+DERIVED_DIR = 'derived'
+
+
+def _has_alpha(image):
+    return image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info)
+
+
+def fallback_format(name):
+    return 'png' if name.lower().endswith('.png') else 'jpg'
+
+
+def derivative_name(name, height, fmt):
+    """Storage name of one rendering of the image stored at ``name``."""
+    directory, filename = os.path.split(name)
+    stem, ext = os.path.splitext(filename)
+    if ext:
+        stem = f'{stem}-{ext[1:].lower()}'
+    return os.path.join(directory, DERIVED_DIR, f'{stem}-{height}.{fmt}').replace(os.sep, '/')
+
+
+def render_derivatives(source_path, target_paths, force=False):
+    """Write every rendering of ``source_path``.
+
+    ``target_paths`` maps (height, format) to an absolute path. Heights above
+    the original are rendered at the original size rather than upscaled.
+    Returns the number of files written.
+    """
+    from PIL import Image
+
+    if not force and all(os.path.exists(path) for path in target_paths.values()):
+        return 0
+    written = 0
+    with Image.open(source_path) as original:
+        original.load()
+        alpha = _has_alpha(original)
+        original = original.convert('RGBA' if alpha else 'RGB')
+        for (height, fmt), path in target_paths.items():
+            if not force and os.path.exists(path):
+                continue
+            image = original
+            if original.height > height:
+                width = max(1, round(original.width * height / original.height))
+                image = original.resize((width, height), Image.LANCZOS)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if fmt == 'webp':
+                image.save(path, 'WEBP', quality=80)
+            elif fmt == 'png':
+                image.save(path, 'PNG', optimize=True)
+            else:
+                if image.mode == 'RGBA':
+                    image = image.convert('RGB')
+                image.save(path, 'JPEG', quality=82, optimize=True, progressive=True)
+            written += 1
+    return written
+
+
+def target_paths(name):
+    """The ``render_derivatives`` targets for an image in default_storage."""
+    fallback = fallback_format(name)
+    return {
+        (height, fmt): default_storage.path(derivative_name(name, height, fmt))
+        for height in HEIGHTS for fmt in ('webp', fallback)
+    }
+
+
+def build_derivatives(image_field, force=False):
+    """Render the variants of a Movie.image, skipping ones already on disk.
+
+    A movie whose source file is missing gets no variants, so saving it
+    does not fail the commit callback; its pages use the original URL.
+    """
+    if not image_field or not default_storage.exists(image_field.name):
+        return 0
+    return render_derivatives(image_field.path, target_paths(image_field.name), force)
+
+
+def variant_urls(image_field, variant):
+    """``{'webp': srcset, 'fallback': srcset, 'src': url}`` for a variant.
+
+    Falls back to the original when the derivatives have not been built.
+    """
+    name = image_field.name
+    one_x, two_x = VARIANTS[variant]
+    fallback = fallback_format(name)
+    if not default_storage.exists(derivative_name(name, one_x, fallback)):
+        return None
+    urls = {
+        fmt: [default_storage.url(derivative_name(name, height, fmt)) for height in (one_x, two_x)]
+        for fmt in ('webp', fallback)
+    }
+    return {
+        'webp': f"{urls['webp'][0]} 1x, {urls['webp'][1]} 2x",
+        'fallback': f'{urls[fallback][0]} 1x, {urls[fallback][1]} 2x',
+        'src': urls[fallback][0],
+    }
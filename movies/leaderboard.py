@@ -0,0 +1,122 @@
+"""Top-comments leaderboards kept in the cache.
+
+There is one list for the whole site and one per movie. Each list holds
+the best ``2 * REVIEW_LEADERBOARD_SIZE`` reviews, ordered like the movie
+page (likes, then newest first), as plain dicts carrying the author and
+movie names. Pages read only the cache once a list is built.
+
+Lists are patched in place when reviews are created, edited, liked or
+deleted. The spare entries let a list absorb deletions, and the list is
+only dropped and rebuilt when it would fall short of a full page.
+Rebuilding is one query that joins the users and movies. Lists also
+expire after ``REVIEW_LEADERBOARD_TIMEOUT``, so a lost update between
+two processes is repaired on the next rebuild.
+"""
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Review
+
+PREFIX = 'movies:leaderboard:'
+
+
+def page_size():
+    return getattr(settings, 'REVIEW_LEADERBOARD_SIZE', 10)
+
+
+def _key(movie_id):
+    return f'{PREFIX}movie:{movie_id}' if movie_id else f'{PREFIX}global'
+
+
+def _sort_key(entry):
+    return (-entry['likes'], -entry['date'].timestamp(), -entry['id'])
+
+
+def _entry(review):
+    return {
+        'id': review.id,
+        'comment': review.comment,
+        'likes': review.likes,
+        'date': review.date,
+        'user': review.user.username,
+        'movie_id': review.movie_id,
+        'movie': review.movie.name,
+    }
+
+
+def _reviews():
+    return (Review.objects.select_related('user', 'movie')
+            .only('id', 'comment', 'likes', 'date', 'movie_id', 'user__username', 'movie__name'))
+
+
+def _save(movie_id, board):
+    cache.set(_key(movie_id), board, getattr(settings, 'REVIEW_LEADERBOARD_TIMEOUT', 60 * 60))
+
+
+def _build(movie_id):
+    depth = 2 * page_size()
+    reviews = _reviews().order_by('-likes', '-date', '-id')
+    if movie_id:
+        reviews = reviews.filter(movie_id=movie_id)
+    entries = [_entry(review) for review in reviews[:depth]]
+    # complete: the list holds every review, so any review may join it
+    board = {'entries': entries, 'complete': len(entries) < depth}
+    _save(movie_id, board)
+    return board
+
+
+def top_reviews(movie_id=None):
+    """The top reviews overall, or for one movie, as dicts."""
+    board = cache.get(_key(movie_id)) or _build(movie_id)
+    return board['entries'][:page_size()]
+
+
+def _place(movie_id, entries):
+    """Insert or refresh ``entries`` in one cached list, if it is cached."""
+    board = cache.get(_key(movie_id))
+    if board is None:
+        return
+    ids = {entry['id'] for entry in entries}
+    listed = {entry['id'] for entry in board['entries']}
+    current = [entry for entry in board['entries'] if entry['id'] not in ids]
+    depth = 2 * page_size()
+    for entry in entries:
+        # likes only grow, so a listed review stays; an unlisted one below
+        # the last cached entry may still trail reviews that are not cached
+        if (board['complete'] or entry['id'] in listed or not current
+                or _sort_key(entry) < _sort_key(current[-1])):
+            current.append(entry)
+            current.sort(key=_sort_key)
+    if len(current) > depth:
+        del current[depth:]
+        board['complete'] = False
+    board['entries'] = current
+    _save(movie_id, board)
+
+
+def reviews_changed(review_ids):
+    """Refresh reviews whose likes or text changed, or that were just created."""
+    entries = [_entry(review) for review in _reviews().filter(id__in=review_ids)]
+    if not entries:
+        return
+    _place(None, entries)
+    by_movie = {}
+    for entry in entries:
+        by_movie.setdefault(entry['movie_id'], []).append(entry)
+    for movie_id, movie_entries in by_movie.items():
+        _place(movie_id, movie_entries)
+
+
+def review_removed(review_id, movie_id):
+    for key_movie in (None, movie_id):
+        board = cache.get(_key(key_movie))
+        if board is None:
+            continue
+        entries = [entry for entry in board['entries'] if entry['id'] != review_id]
+        if len(entries) == len(board['entries']):
+            continue
+        if not board['complete'] and len(entries) < page_size():
+            cache.delete(_key(key_movie))
+        else:
+            board['entries'] = entries
+            _save(key_movie, board)
@@ -0,0 +1,178 @@
+"""Review likes: one ReviewLike row per user and review, plus a counter.
+
+By default the ``Review.likes`` counter is bumped with an F() update in
+the same transaction as the ReviewLike insert. With
+``REVIEW_LIKES_COALESCE = True`` the increments are buffered in the cache
+instead and written in batches by ``flush_likes`` (run by the
+``flush_review_likes`` command, or inline once ``REVIEW_LIKES_FLUSH_SIZE``
+reviews are waiting), so a burst of likes on one review becomes a single
+UPDATE instead of a queue of writers on the same SQLite row.
+
+The buffer lives in the ``REVIEW_LIKES_CACHE`` cache alias, which must
+be shared between processes and must never evict keys on its own, or
+buffered likes are lost (``recount_likes`` repairs the counters from the
+ReviewLike rows if that happens). Writers only use ``add``/``incr``, and
+a flush holds the ``movies:likes:lock`` key (taken with ``add``) while it
+claims and applies the counts, so the inline flush and the command never
+apply the same likes twice:
+
+* ``movies:likes:pending:<id>`` counts likes not yet written for a review;
+* ``movies:likes:queued:<id>`` marks a review as already queued;
+* ``movies:likes:seq`` numbers queue slots, ``movies:likes:slot:<n>``
+  holds the review id queued in slot n, and ``movies:likes:flushed`` is
+  the last slot written.
+
+A writer takes its slot number before it stores the review id in it, so
+a flush stops at the first slot that is still empty and leaves it and
+everything after it for the next run. A slot that is still empty on the
+next flush as well belongs to a writer that died in between
+(``movies:likes:gap`` remembers it) and is skipped; ``recount_likes``
+repairs that review's counter.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import leaderboard
+from .models import Review, ReviewLike
+
+PREFIX = 'movies:likes:'
+LOCK_TIMEOUT = 60
+
+
+def coalescing():
+    return getattr(settings, 'REVIEW_LIKES_COALESCE', False)
+
+
+def likes_cache():
+    return caches[getattr(settings, 'REVIEW_LIKES_CACHE', 'default')]
+
+
+def _incr(key, delta=1):
+    cache = likes_cache()
+    cache.add(key, 0, timeout=None)
+    return cache.incr(key, delta)
+
+
+@transaction.atomic
+def like_review(user, review_id):
+    """Record ``user`` liking a review; returns False if they already had."""
+    try:
+        with transaction.atomic():
+            ReviewLike.objects.create(review_id=review_id, user=user)
+    except IntegrityError:
+        return False
+
+    if not coalescing():
+        Review.objects.filter(id=review_id).update(likes=F('likes') + 1)
+        transaction.on_commit(lambda: leaderboard.reviews_changed([review_id]))
+        return True
+
+    # buffer only once the like row is committed, so a rollback adds nothing
+    transaction.on_commit(lambda: _buffer(review_id))
+    return True
+
+
+def _buffer(review_id):
+    cache = likes_cache()
+    _incr(f'{PREFIX}pending:{review_id}')
+    if cache.add(f'{PREFIX}queued:{review_id}', 1, timeout=None):
+        slot = _incr(f'{PREFIX}seq')
+        cache.set(f'{PREFIX}slot:{slot}', review_id, timeout=None)
+        flushed = cache.get(f'{PREFIX}flushed', 0)
+        if slot - flushed >= getattr(settings, 'REVIEW_LIKES_FLUSH_SIZE', 100):
+            flush_likes()
+
+
+def pending_likes(review_ids):
+    """Buffered likes not yet written, as ``{review_id: count}``."""
+    if not coalescing() or not review_ids:
+        return {}
+    keys = {f'{PREFIX}pending:{review_id}': review_id for review_id in review_ids}
+    return {keys[key]: count for key, count in likes_cache().get_many(keys).items() if count}
+
+
+def flush_likes(batch_size=500):
+    """Write buffered likes to the database; returns the number of reviews
+    updated, or 0 if another flush is running."""
+    cache = likes_cache()
+    if not cache.add(f'{PREFIX}lock', 1, timeout=LOCK_TIMEOUT):
+        return 0
+    try:
+        return _flush(cache, batch_size)
+    finally:
+        cache.delete(f'{PREFIX}lock')
+
+
+def _flush(cache, batch_size):
+    seq = cache.get(f'{PREFIX}seq', 0)
+    flushed = cache.get(f'{PREFIX}flushed', 0)
+    if seq <= flushed:
+        return 0
+
+    slots = cache.get_many([f'{PREFIX}slot:{n}' for n in range(flushed + 1, seq + 1)])
+    gap = cache.get(f'{PREFIX}gap')
+    last = flushed
+    for n in range(flushed + 1, seq + 1):
+        if f'{PREFIX}slot:{n}' not in slots and n != gap:
+            # its writer has not stored the review id yet
+            cache.set(f'{PREFIX}gap', n, timeout=None)
+            break
+        last = n
+    if last == flushed:
+        return 0
+    cache.set(f'{PREFIX}flushed', last, timeout=None)
+
+    slot_keys = [f'{PREFIX}slot:{n}' for n in range(flushed + 1, last + 1)]
+    review_ids = {slots[key] for key in slot_keys if key in slots}
+    cache.delete_many(slot_keys)
+
+    deltas = {}
+    for review_id in review_ids:
+        # unmark before reading so likes arriving now queue the review again
+        cache.delete(f'{PREFIX}queued:{review_id}')
+        count = cache.get(f'{PREFIX}pending:{review_id}', 0)
+        if count > 0:
+            # only take what was read; likes added since stay pending
+            cache.decr(f'{PREFIX}pending:{review_id}', count)
+            deltas[review_id] = count
+
+    items = list(deltas.items())
+    for start in range(0, len(items), batch_size):
+        batch = items[start:start + batch_size]
+        with transaction.atomic():
+            for review_id, count in batch:
+                Review.objects.filter(id=review_id).update(likes=F('likes') + count)
+        leaderboard.reviews_changed([review_id for review_id, _ in batch])
+    return len(deltas)
+
+
+def recount_likes():
+    """Set every review's counter to its number of ReviewLike rows and
+    drop the buffer; returns how many counters changed.
+
+    A like committed while this runs can be missed or counted twice until
+    the next recount, so schedule it when likes are quiet.
+    """
+    cache = likes_cache()
+    if not cache.add(f'{PREFIX}lock', 1, timeout=LOCK_TIMEOUT):
+        return 0
+    try:
+        counts = (ReviewLike.objects.filter(review=OuterRef('pk')).order_by()
+                  .values('review').annotate(total=Count('id')).values('total'))
+        actual = Coalesce(Subquery(counts), 0)
+        changed = list(Review.objects.annotate(actual=actual).exclude(likes=F('actual'))
+                       .values_list('id', flat=True))
+        Review.objects.filter(id__in=changed).update(likes=actual)
+        seq = cache.get(f'{PREFIX}seq', 0)
+        slot_keys = [f'{PREFIX}slot:{n}' for n in range(cache.get(f'{PREFIX}flushed', 0) + 1, seq + 1)]
+        queued = set(cache.get_many(slot_keys).values())
+        cache.delete_many(slot_keys + [key for review_id in queued for key in (
+            f'{PREFIX}pending:{review_id}', f'{PREFIX}queued:{review_id}')])
+        cache.set(f'{PREFIX}flushed', seq, timeout=None)
+    finally:
+        cache.delete(f'{PREFIX}lock')
+    leaderboard.reviews_changed(changed)
+    return len(changed)
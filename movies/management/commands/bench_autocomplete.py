@@ -0,0 +1,59 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from movies.autocomplete import PrefixIndex
+from movies.management.commands.bench_search import WORDS
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = ('Time search-as-you-type lookups in the prefix index against the '
+            'equivalent database query. Runs inside a transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movies', type=int, default=100000)
+        parser.add_argument('--lookups', type=int, default=10000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        syllables = ['ka', 'lo', 'mi', 'ne', 'ru', 'sa', 'ti', 'vo', 'de', 'ba', 'zu', 'pe']
+        vocabulary = list({''.join(rng.choices(syllables, k=rng.randint(2, 4)))
+                           for _ in range(5000)}) + WORDS
+        Movie.objects.bulk_create([
+            Movie(name=' '.join(rng.sample(WORDS, rng.randint(0, 2)) +
+                                rng.sample(vocabulary, 2)).title(),
+                  price=10, description='', image='movie_images/logo.png', popularity=rng.random())
+            for _ in range(options['movies'])
+        ], batch_size=5000)
+
+        start = time.perf_counter()
+        index = PrefixIndex(Movie.objects.values_list('id', 'name', 'popularity').iterator())
+        self.stdout.write(f'Built index over {len(index)} movies in '
+                          f'{time.perf_counter() - start:.2f}s ({len(index.top)} precomputed prefixes)')
+
+        words = [rng.choice(vocabulary) for _ in range(options['lookups'])]
+        self.stdout.write(f"{'prefix':>7} {'index us':>9} {'database us':>12}")
+        for length in (1, 2, 3, 4, 6):
+            queries = [word[:length] for word in words]
+            start = time.perf_counter()
+            for query in queries:
+                index.lookup(query)
+            index_us = (time.perf_counter() - start) / len(queries) * 1e6
+
+            sample = queries[:20]
+            start = time.perf_counter()
+            for query in sample:
+                list(Movie.objects.filter(Q(name__istartswith=query) | Q(name__icontains=f' {query}'))
+                     .order_by('-popularity').values_list('id', 'name')[:8])
+            db_us = (time.perf_counter() - start) / len(sample) * 1e6
+            self.stdout.write(f'{length:>7} {index_us:>9.1f} {db_us:>12.0f}')
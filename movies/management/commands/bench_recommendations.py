@@ -0,0 +1,87 @@
+import itertools
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from cart.models import Item, Order
+from movies import recommendations
+from movies.models import Movie
+
+
+def python_pair_counts():
+    """Pair counts from a plain dict-of-sets walk over the items, for comparison."""
+    baskets = {}
+    for order_id, movie_id in Item.objects.order_by().values_list('order_id', 'movie_id').iterator(
+            chunk_size=50000):
+        baskets.setdefault(order_id, set()).add(movie_id)
+    pairs = Counter()
+    for basket in baskets.values():
+        pairs.update(itertools.combinations(sorted(basket), 2))
+    return pairs
+
+
+class Command(BaseCommand):
+    help = ('Time the full recommendation rebuild on synthetic orders. Runs inside a '
+            'transaction that is rolled back.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000000)
+        parser.add_argument('--movies', type=int, default=2000)
+        parser.add_argument('--max-basket', type=int, default=6)
+        parser.add_argument('--skip-python', action='store_true',
+                            help='Do not time the pure-Python pair count.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self.run(options)
+            transaction.set_rollback(True)
+
+    def phase(self, label, fn):
+        start = time.perf_counter()
+        result = fn()
+        self.stdout.write(f'{label:<28} {time.perf_counter() - start:>8.2f}s')
+        return result
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        user = User.objects.create(username='bench-recommendations')
+        movies = Movie.objects.bulk_create([
+            Movie(name=f'Bench movie {i}', price=10, description='', image='movie_images/logo.png')
+            for i in range(options['movies'])
+        ])
+        # long-tailed popularity so a few movies appear in many baskets
+        weights = [1 / (rank + 1) for rank in range(len(movies))]
+
+        def insert():
+            created = 0
+            while created < options['items']:
+                sizes = [rng.randint(1, options['max_basket']) for _ in range(5000)]
+                orders = Order.objects.bulk_create([Order(user=user, total=10) for _ in sizes])
+                items = [Item(order=order, movie=movie, price=10, quantity=1)
+                         for order, size in zip(orders, sizes)
+                         for movie in set(rng.choices(movies, weights, k=size))]
+                Item.objects.bulk_create(items[:options['items'] - created], batch_size=5000)
+                created += len(items)
+        self.phase(f"insert {options['items']} items", insert)
+
+        pairs, marginals, total_orders = self.phase(
+            'load + count (numpy)', recommendations.co_occurrence)
+        neighbours = self.phase('score + top-K (numpy)', lambda: recommendations.rank_neighbours(
+            pairs, marginals, total_orders, recommendations.scoring(), recommendations.top_k()))
+        self.stdout.write(f'{total_orders} orders, {len(pairs[0])} pairs, '
+                          f'{len(neighbours[0])} recommendations')
+        self.phase('full rebuild (with writes)', recommendations.rebuild)
+
+        if not options['skip_python']:
+            expected = self.phase('load + count (python)', python_pair_counts)
+            counted = {(int(a), int(b)): int(c) for a, b, c in zip(*pairs)}
+            self.stdout.write('pair counts match' if counted == dict(expected)
+                              else 'pair counts DIFFER')
+
+        basket = [movie.id for movie in rng.sample(movies[:50], 3)]
+        self.phase('record_basket (3 movies)', lambda: recommendations.record_basket(basket))
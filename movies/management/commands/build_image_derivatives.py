@@ -0,0 +1,39 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from movies.images import render_derivatives, target_paths
+from movies.models import Movie
+
+
+class Command(BaseCommand):
+    help = 'Render the resized WebP/JPEG variants of every movie image, in parallel.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count(),
+                            help='Worker processes (default: one per CPU).')
+        parser.add_argument('--force', action='store_true',
+                            help='Re-render variants that already exist.')
+
+    def handle(self, *args, **options):
+        names = sorted(set(Movie.objects.exclude(image='').values_list('image', flat=True)))
+        start = time.perf_counter()
+        written = failed = 0
+        with ProcessPoolExecutor(max_workers=options['workers']) as pool:
+            futures = {
+                pool.submit(render_derivatives, default_storage.path(name),
+                            target_paths(name), options['force']): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                try:
+                    written += future.result()
+                except (OSError, ValueError) as exc:
+                    failed += 1
+                    self.stderr.write(f'{futures[future]}: {exc}')
+        self.stdout.write(self.style.SUCCESS(
+            f'{len(names)} image(s), {written} file(s) written, {failed} failed '
+            f'in {time.perf_counter() - start:.1f}s.'))
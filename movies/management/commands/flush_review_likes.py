@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from movies.likes import flush_likes, recount_likes
+
+
+class Command(BaseCommand):
+    help = 'Write review likes buffered in the cache (REVIEW_LIKES_COALESCE) to the database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recount', action='store_true',
+                            help='Instead recount every review from its like rows, repairing '
+                                 'likes lost from the buffer.')
+
+    def handle(self, *args, **options):
+        if options['recount']:
+            fixed = recount_likes()
+            self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} review(s).'))
+            return
+        updated = flush_likes()
+        self.stdout.write(self.style.SUCCESS(f'Updated {updated} review(s).'))
@@ -0,0 +1,19 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from movies.recommendations import rebuild, scoring
+
+
+class Command(BaseCommand):
+    help = 'Recompute co-purchase counts and every movie\'s top-K recommendations from order items.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        pairs, recommendations = rebuild(options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{pairs} co-purchased pair(s), {recommendations} recommendation(s) '
+            f'({scoring()}) in {time.perf_counter() - start:.1f}s.'))
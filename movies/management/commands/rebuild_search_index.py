@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from movies.models import Movie
+from movies.search import fts_available, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text movie search index from the movies table.'
+
+    def handle(self, *args, **options):
+        if not fts_available():
+            raise CommandError('The full-text index is only available on SQLite.')
+        rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Indexed {Movie.objects.count()} movie(s).'))
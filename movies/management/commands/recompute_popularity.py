@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from movies.popularity import recompute
+
+
+class Command(BaseCommand):
+    help = ('Recount recent purchases and recompute every movie\'s popularity score. '
+            'Run daily so purchases that leave the window stop counting.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        changed = recompute(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rescored {changed} movie(s).'))
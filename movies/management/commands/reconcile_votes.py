@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from movies.votes import reconcile_counts
+
+
+class Command(BaseCommand):
+    help = 'Recount the thumbs up/down counters on every movie from the MovieVote rows.'
+
+    def handle(self, *args, **options):
+        fixed = reconcile_counts()
+        self.stdout.write(self.style.SUCCESS(f'Corrected {fixed} movie(s).'))
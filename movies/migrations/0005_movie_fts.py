@@ -0,0 +1,28 @@
+from django.db import migrations
+
+
+def create_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from movies.search import CREATE_SQL
+    for statement in CREATE_SQL:
+        schema_editor.execute(statement)
+
+
+def drop_fts(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    from movies.search import DROP_SQL
+    for statement in DROP_SQL:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0004_movievote'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:27
+
+from django.db import migrations, models
+
+
+def count_votes(apps, schema_editor):
+    from movies.votes import reconcile_counts
+    reconcile_counts(apps.get_model('movies', 'Movie'), apps.get_model('movies', 'MovieVote'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0005_movie_fts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='thumbs_down',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='thumbs_up',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_votes, migrations.RunPython.noop),
+    ]
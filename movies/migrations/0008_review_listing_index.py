@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:29
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movies', '0007_reviewlike'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['movie', 'likes', 'date'], name='review_movie_likes_date_idx'),
+        ),
+    ]
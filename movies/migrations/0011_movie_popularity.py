@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 19:37
+
+from django.db import migrations, models
+
+
+def score_movies(apps, schema_editor):
+    from movies.popularity import recompute
+    recompute(apps.get_model('movies', 'Movie'), apps.get_model('cart', 'Item'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0006_seed_countries'),
+        ('movies', '0010_recommendations'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='movie',
+            name='popularity',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='movie',
+            name='recent_purchases',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(score_movies, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 20:29
+
+from django.db import migrations, models
+
+
+def count_baskets(apps, schema_editor):
+    orders = apps.get_model('cart', 'Order').objects.filter(item__isnull=False).distinct().count()
+    apps.get_model('movies', 'BasketCount').objects.create(pk=1, orders=orders)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('cart', '0002_item'),
+        ('movies', '0011_movie_popularity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BasketCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('orders', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(count_baskets, migrations.RunPython.noop),
+    ]
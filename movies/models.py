@@ -6,14 +6,20 @@ class Movie(models.Model):
     price = models.IntegerField()
     description = models.TextField()
     image = models.ImageField(upload_to='movie_images/')
+    # denormalized MovieVote counts, maintained by movies.votes.toggle_vote
+    thumbs_up = models.IntegerField(default=0)
+    thumbs_down = models.IntegerField(default=0)
+    # catalog ranking for ?sort=top, maintained by movies.popularity
+    recent_purchases = models.IntegerField(default=0)
+    popularity = models.FloatField(default=0, db_index=True)
     def __str__(self):
         return str(self.id) + ' - ' + self.name
     def get_thumbs_up_count(self):
-        return  self.movievote_set.filter(vote_type='up').count()
+        return self.thumbs_up
     def get_thumbs_down_count(self):
-        return  self.movievote_set.filter(vote_type='down').count()
+        return self.thumbs_down
     def get_net_score(self):
-        return self.get_thumbs_up_count() - self.get_thumbs_down_count()
+        return self.thumbs_up - self.thumbs_down
     
     def user_vote(self, user):
         if user.is_authenticated:
@@ -31,8 +37,27 @@ class Review(models.Model):
     user = models.ForeignKey(User,
         on_delete=models.CASCADE)
     likes = models.IntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # serves the movie page's ORDER BY -likes, -date, -id keyset scan
+            models.Index(fields=['movie', 'likes', 'date'], name='review_movie_likes_date_idx'),
+            # rebuilds of the global top-comments leaderboard
+            models.Index(fields=['likes', 'date'], name='review_likes_date_idx'),
+        ]
+
     def __str__(self):
         return str(self.id) + ' - ' + self.movie.name
+class ReviewLike(models.Model):
+    review = models.ForeignKey(Review, on_delete=models.CASCADE)
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('review', 'user')
+
+    def __str__(self):
+        return f"{self.user.username} likes review {self.review_id}"
 class MovieVote(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
@@ -47,4 +72,39 @@ class MovieVote(models.Model):
 
     def __str__(self):
         return f"{self.user.username} = {self.movie.name} - {self.vote_type}"
-    
\ No newline at end of file
+    
+class MoviePairCount(models.Model):
+    """Number of orders containing both movies (movie_a <= movie_b).
+
+    Rows with movie_a == movie_b count the orders containing that movie.
+    Maintained at checkout by ``movies.recommendations.record_basket``.
+    """
+    movie_a = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    movie_b = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    orders = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('movie_a', 'movie_b')
+
+    def __str__(self):
+        return f"{self.movie_a_id} + {self.movie_b_id}: {self.orders}"
+class MovieRecommendation(models.Model):
+    """One of a movie's top-K co-purchased movies, best first by rank."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        unique_together = ('movie', 'rank')
+
+    def __str__(self):
+        return f"{self.movie.name} -> {self.recommended.name} ({self.score:.3f})"
+
+class BasketCount(models.Model):
+    """The number of orders counted into MoviePairCount, in a single row,
+    so lift scoring does not count the orders table at every checkout."""
+    orders = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.orders} orders"
@@ -0,0 +1,44 @@
+"""Keyset (cursor) pagination helpers.
+
+A cursor is the sort key of the last row on a page, encoded as an opaque
+URL-safe token. The next page is fetched with a ``WHERE key > cursor``
+condition on an indexed ordering instead of an ``OFFSET`` scan, so every
+page costs the same however deep the reader goes.
+"""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 48
+
+
+def encode_cursor(values):
+    raw = json.dumps(list(values), separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return the cursor values as a tuple, or None for a missing or bad token.
+
+    Every sort key used here is numeric, so anything else is rejected.
+    """
+    if not token:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        return None
+    if (not isinstance(values, list) or not values
+            or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values)):
+        return None
+    return tuple(values)
+
+
+def page_size(request, default=DEFAULT_PAGE_SIZE):
+    """The requested page size, capped to MAX_PAGE_SIZE."""
+    try:
+        size = int(request.GET.get('size', default))
+    except ValueError:
+        size = default
+    return min(max(size, 1), MAX_PAGE_SIZE)
@@ -0,0 +1,91 @@
+"""Stored popularity score used to rank the catalog by ``?sort=top``.
+
+``Movie.popularity`` blends two signals:
+
+* the Wilson score lower bound (95%) of the thumbs-up share, so ten
+  votes at 90% rank above one vote at 100%;
+* recent purchase volume (``Movie.recent_purchases``: copies bought in
+  the last ``POPULARITY_WINDOW_DAYS``), squashed into [0, 1) as
+  ``n / (n + POPULARITY_PURCHASE_SCALE)``.
+
+They are combined as ``(1 - w) * wilson + w * purchases`` with
+``w = POPULARITY_PURCHASE_WEIGHT``.
+
+Votes and checkouts update the score of the movies they touch. Purchases
+only ever add to ``recent_purchases``, so the ``recompute_popularity``
+command should run daily to drop purchases that have left the window.
+"""
+import datetime
+import math
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import Case, F, Sum, Value, When
+from django.utils import timezone
+
+from .models import Movie
+
+Z = 1.96  # 95% confidence
+
+
+def wilson_lower_bound(up, down, z=Z):
+    total = up + down
+    if not total:
+        return 0.0
+    share = up / total
+    return ((share + z * z / (2 * total)
+             - z * math.sqrt((share * (1 - share) + z * z / (4 * total)) / total))
+            / (1 + z * z / total))
+
+
+def popularity(up, down, purchases):
+    weight = getattr(settings, 'POPULARITY_PURCHASE_WEIGHT', 0.3)
+    scale = getattr(settings, 'POPULARITY_PURCHASE_SCALE', 10)
+    return (1 - weight) * wilson_lower_bound(up, down) + weight * purchases / (purchases + scale)
+
+
+def window_start():
+    return timezone.now() - datetime.timedelta(days=getattr(settings, 'POPULARITY_WINDOW_DAYS', 30))
+
+
+def refresh(movie_ids):
+    """Recompute the stored score of ``movie_ids`` from their counters."""
+    movies = list(Movie.objects.filter(id__in=movie_ids).only(
+        'id', 'thumbs_up', 'thumbs_down', 'recent_purchases'))
+    for movie in movies:
+        movie.popularity = popularity(movie.thumbs_up, movie.thumbs_down, movie.recent_purchases)
+    Movie.objects.bulk_update(movies, ['popularity'])
+
+
+def record_purchases(items):
+    """Add purchased ``items`` to recent_purchases; runs inside checkout."""
+    quantities = defaultdict(int)
+    for item in items:
+        quantities[item.movie_id] += int(item.quantity)
+    if not quantities:
+        return
+    Movie.objects.filter(id__in=quantities).update(recent_purchases=F('recent_purchases') + Case(
+        *[When(id=movie_id, then=Value(quantity)) for movie_id, quantity in quantities.items()],
+        default=Value(0)))
+    refresh(list(quantities))
+
+
+def recompute(movie_model=Movie, item_model=None, batch_size=1000):
+    """Recount recent purchases and rescore every movie; returns how many
+    movies changed. Also used by the score's data migration."""
+    if item_model is None:
+        from cart.models import Item as item_model
+    purchases = dict(
+        item_model.objects.filter(order__date__gte=window_start())
+        .values_list('movie_id').annotate(total=Sum('quantity')).order_by()
+    )
+    changed = []
+    for movie in movie_model.objects.only(
+            'id', 'thumbs_up', 'thumbs_down', 'recent_purchases', 'popularity').iterator():
+        recent = purchases.get(movie.id, 0)
+        score = popularity(movie.thumbs_up, movie.thumbs_down, recent)
+        if (movie.recent_purchases, movie.popularity) != (recent, score):
+            movie.recent_purchases, movie.popularity = recent, score
+            changed.append(movie)
+    movie_model.objects.bulk_update(changed, ['recent_purchases', 'popularity'], batch_size=batch_size)
+    return len(changed)
@@ -0,0 +1,242 @@
+"""Co-purchase recommendations ("customers who bought this also bought").
+
+Movies are scored by how often they share an order. ``MoviePairCount``
+holds the sparse movie x movie co-occurrence counts (the upper triangle
+plus the diagonal, which counts each movie's orders). ``MovieRecommendation``
+keeps each movie's top ``RECOMMENDATION_TOP_K`` neighbours, so the movie
+page reads them with one indexed query.
+
+Scores are either cosine, ``c_ab / sqrt(c_a * c_b)``, or lift,
+``c_ab * N / (c_a * c_b)`` with N orders, picked by
+``RECOMMENDATION_SCORING``.
+
+``record_basket`` runs inside the checkout transaction. It updates the
+counts, including the order total N kept in ``BasketCount``, and re-ranks
+the movies in the basket with a fixed number of queries, whatever the
+basket size. Other movies' scores drift a little as the marginals grow,
+until ``rebuild`` (the ``rebuild_recommendations`` command) recomputes
+everything from ``cart.models.Item`` with NumPy.
+"""
+import math
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+
+from cart.models import Item
+from .models import BasketCount, MoviePairCount, MovieRecommendation
+
+try:
+    import numpy as np
+except ImportError:  # only needed for the full rebuild
+    np = None
+
+SCORINGS = ('cosine', 'lift')
+
+
+def scoring():
+    return getattr(settings, 'RECOMMENDATION_SCORING', 'cosine')
+
+
+def top_k():
+    return getattr(settings, 'RECOMMENDATION_TOP_K', 10)
+
+
+def score(together, count_a, count_b, total_orders=None, method='cosine'):
+    if method == 'lift':
+        return together * total_orders / (count_a * count_b)
+    return together / math.sqrt(count_a * count_b)
+
+
+def recommended_movies(movie_id, fields=('id', 'name', 'image')):
+    """The stored neighbours of a movie as Movie instances, best first."""
+    rows = (MovieRecommendation.objects.filter(movie_id=movie_id)
+            .select_related('recommended')
+            .only('recommended_id', *(f'recommended__{field}' for field in fields))
+            .order_by('rank'))
+    return [row.recommended for row in rows]
+
+
+def _increment(movie_a, movie_b):
+    pairs = MoviePairCount.objects.filter(movie_a_id=movie_a, movie_b_id=movie_b)
+    if pairs.update(orders=F('orders') + 1):
+        return
+    try:
+        with transaction.atomic():
+            MoviePairCount.objects.create(movie_a_id=movie_a, movie_b_id=movie_b, orders=1)
+    except IntegrityError:
+        # another checkout created the row first
+        pairs.update(orders=F('orders') + 1)
+
+
+def counted_orders():
+    return BasketCount.objects.values_list('orders', flat=True).first() or 0
+
+
+def _count_order():
+    counts = BasketCount.objects.filter(pk=1)
+    if counts.update(orders=F('orders') + 1):
+        return
+    try:
+        with transaction.atomic():
+            BasketCount.objects.create(pk=1, orders=1)
+    except IntegrityError:
+        # another checkout created the row first
+        counts.update(orders=F('orders') + 1)
+
+
+def record_basket(movie_ids):
+    """Count one order containing ``movie_ids`` and re-rank those movies."""
+    movie_ids = sorted(set(movie_ids))
+    if not movie_ids:
+        return
+    _count_order()
+    # rows are stored with movie_a <= movie_b, so these are exactly the
+    # basket's pairs (and diagonal) that already exist
+    rows = MoviePairCount.objects.filter(movie_a_id__in=movie_ids, movie_b_id__in=movie_ids)
+    existing = set(rows.values_list('movie_a_id', 'movie_b_id'))
+    rows.update(orders=F('orders') + 1)
+    missing = [(movie_a, movie_b)
+               for i, movie_a in enumerate(movie_ids) for movie_b in movie_ids[i:]
+               if (movie_a, movie_b) not in existing]
+    try:
+        with transaction.atomic():
+            MoviePairCount.objects.bulk_create([
+                MoviePairCount(movie_a_id=movie_a, movie_b_id=movie_b, orders=1)
+                for movie_a, movie_b in missing
+            ])
+    except IntegrityError:
+        # another checkout created some of the rows first
+        for movie_a, movie_b in missing:
+            _increment(movie_a, movie_b)
+    # a single movie has no new pair, but its marginal moved its scores
+    refresh(movie_ids)
+
+
+def refresh(movie_ids):
+    """Recompute the stored top-K of ``movie_ids`` from the pair counts."""
+    method = scoring()
+    total_orders = counted_orders() if method == 'lift' else None
+    movie_ids = set(movie_ids)
+    together = {movie_id: {} for movie_id in movie_ids}
+    marginals = {}
+    for movie_a, movie_b, orders in MoviePairCount.objects.filter(
+            Q(movie_a_id__in=movie_ids) | Q(movie_b_id__in=movie_ids)).values_list(
+            'movie_a_id', 'movie_b_id', 'orders'):
+        if movie_a == movie_b:
+            marginals[movie_a] = orders
+            continue
+        if movie_a in movie_ids:
+            together[movie_a][movie_b] = orders
+        if movie_b in movie_ids:
+            together[movie_b][movie_a] = orders
+    others = {other for counts in together.values() for other in counts} - marginals.keys()
+    marginals.update(MoviePairCount.objects.filter(
+        movie_a_id__in=others, movie_b_id=F('movie_a_id')).values_list('movie_a_id', 'orders'))
+
+    recommendations = []
+    for movie_id, counts in together.items():
+        own = marginals.get(movie_id)
+        if not own:
+            continue
+        scored = sorted(
+            ((score(count, own, marginals[other], total_orders, method), count, other)
+             for other, count in counts.items() if marginals.get(other)),
+            key=lambda row: (-row[0], -row[1], row[2]))[:top_k()]
+        recommendations += [
+            MovieRecommendation(movie_id=movie_id, recommended_id=other, score=value, rank=rank)
+            for rank, (value, _, other) in enumerate(scored)
+        ]
+    MovieRecommendation.objects.filter(movie_id__in=movie_ids).delete()
+    MovieRecommendation.objects.bulk_create(recommendations)
+
+
+def co_occurrence(chunk_size=50000):
+    """Count baskets from raw items.
+
+    Returns ``(movie_a, movie_b, orders)`` arrays for every pair bought
+    together (movie_a < movie_b), per-movie order counts as a dense array
+    indexed by movie id, and the number of orders.
+    """
+    if np is None:
+        raise ImproperlyConfigured('Rebuilding recommendations requires numpy.')
+    rows = Item.objects.order_by().values_list('order_id', 'movie_id').iterator(chunk_size=chunk_size)
+    flat = np.fromiter((value for row in rows for value in row), dtype=np.int64)
+    orders, movies = flat[0::2], flat[1::2]
+
+    # sort by (order, movie) and drop repeats of a movie within an order
+    order = np.lexsort((movies, orders))
+    orders, movies = orders[order], movies[order]
+    keep = np.ones(len(orders), dtype=bool)
+    keep[1:] = (orders[1:] != orders[:-1]) | (movies[1:] != movies[:-1])
+    orders, movies = orders[keep], movies[keep]
+
+    marginals = np.bincount(movies) if len(movies) else np.zeros(0, dtype=np.int64)
+    total_orders = int(np.count_nonzero(np.diff(orders)) + 1) if len(orders) else 0
+
+    # rows of one order are contiguous, so the pairs at distance d are the
+    # row pairs (i, i + d) that share an order; baskets are short, so this
+    # loops a handful of times
+    stride = int(movies.max(initial=0)) + 1
+    keys = []
+    distance = 1
+    while distance < len(orders):
+        same = orders[:-distance] == orders[distance:]
+        if not same.any():
+            break
+        keys.append(movies[:-distance][same] * stride + movies[distance:][same])
+        distance += 1
+    keys, counts = np.unique(np.concatenate(keys) if keys else np.zeros(0, np.int64),
+                             return_counts=True)
+    return (keys // stride, keys % stride, counts), marginals, total_orders
+
+
+def rank_neighbours(pairs, marginals, total_orders, method='cosine', k=10):
+    """Top-k neighbours per movie as ``(movie, neighbour, score, rank)`` arrays."""
+    movie_a, movie_b, together = pairs
+    if method == 'lift':
+        scores = together * total_orders / (marginals[movie_a] * marginals[movie_b])
+    else:
+        scores = together / np.sqrt(marginals[movie_a] * marginals[movie_b])
+
+    # both directions of each pair, then best first within each movie
+    source = np.concatenate([movie_a, movie_b])
+    target = np.concatenate([movie_b, movie_a])
+    scores = np.concatenate([scores, scores])
+    together = np.concatenate([together, together])
+    order = np.lexsort((target, -together, -scores, source))
+    source, target, scores = source[order], target[order], scores[order]
+
+    starts = np.ones(len(source), dtype=bool)
+    starts[1:] = source[1:] != source[:-1]
+    group_start = np.maximum.accumulate(np.where(starts, np.arange(len(source)), 0))
+    rank = np.arange(len(source)) - group_start
+    top = rank < k
+    return source[top], target[top], scores[top], rank[top]
+
+
+@transaction.atomic
+def rebuild(batch_size=5000):
+    """Replace the pair counts and recommendations with ones recomputed
+    from raw items. Returns the number of pairs and recommendations."""
+    method = scoring()
+    if method not in SCORINGS:
+        raise ImproperlyConfigured(f'RECOMMENDATION_SCORING must be one of {", ".join(SCORINGS)}.')
+    pairs, marginals, total_orders = co_occurrence()
+    neighbours = rank_neighbours(pairs, marginals, total_orders, method, top_k())
+
+    MoviePairCount.objects.all().delete()
+    MoviePairCount.objects.bulk_create(
+        [MoviePairCount(movie_a_id=int(a), movie_b_id=int(b), orders=int(c))
+         for a, b, c in zip(*pairs)]
+        + [MoviePairCount(movie_a_id=movie_id, movie_b_id=movie_id, orders=int(c))
+           for movie_id, c in enumerate(marginals) if c],
+        batch_size=batch_size)
+    BasketCount.objects.update_or_create(pk=1, defaults={'orders': total_orders})
+    MovieRecommendation.objects.all().delete()
+    MovieRecommendation.objects.bulk_create(
+        [MovieRecommendation(movie_id=int(m), recommended_id=int(n), score=float(s), rank=int(r))
+         for m, n, s, r in zip(*neighbours)],
+        batch_size=batch_size)
+    return len(pairs[0]), len(neighbours[0])
@@ -0,0 +1,143 @@
+"""Full-text movie search backed by an SQLite FTS5 index.
+
+``movies_movie_fts`` is an external-content FTS5 table over
+``Movie.name`` and ``Movie.description``. Triggers created by migration
+0005 keep it in sync with every insert, update and delete on
+``movies_movie`` (bulk operations included); ``rebuild_search_index``
+rebuilds it from scratch. SQLite drops a table's triggers when Django
+rebuilds the table to alter it (adding a column with a default does), so
+``ensure_index`` recreates missing triggers and reindexes after every
+``migrate``. On other databases search falls back to
+``icontains`` on the name.
+"""
+import re
+
+from django.db import connection, connections
+
+from .models import Movie
+
+FTS_TABLE = 'movies_movie_fts'
+
+# bm25 column weights: a hit in the name counts ten times one in the description
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+CREATE_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        name, description,
+        content='movies_movie', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description
+        ON movies_movie BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+        VALUES ('delete', old.id, old.name, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, name, description)
+        VALUES (new.id, new.name, new.description);
+    END""",
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+DROP_SQL = [
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ai',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_ad',
+    f'DROP TRIGGER IF EXISTS {FTS_TABLE}_au',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def fts_available():
+    return connection.vendor == 'sqlite'
+
+
+def match_expression(term):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    words = re.findall(r'\w+', term or '')
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_ids(term, limit=50, after=None):
+    """Return ``[(movie_id, rank), ...]`` best match first.
+
+    ``rank`` is the weighted bm25 score (lower is better). ``after`` is the
+    ``(rank, movie_id)`` of the last row of the previous page.
+    """
+    match = match_expression(term)
+    if not match:
+        return []
+    sql = (f'SELECT rowid, bm25({FTS_TABLE}, %s, %s) AS score FROM {FTS_TABLE} '
+           f'WHERE {FTS_TABLE} MATCH %s')
+    params = [NAME_WEIGHT, DESCRIPTION_WEIGHT, match]
+    if after is not None:
+        sql += ' AND (score > %s OR (score = %s AND rowid > %s))'
+        params += [after[0], after[0], after[1]]
+    sql += ' ORDER BY score, rowid LIMIT %s'
+    params.append(limit)
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def search_movies(term, limit=50, after=None, fields=None):
+    """Movies matching ``term``, most relevant first.
+
+    Each movie gets a ``search_cursor`` attribute holding its
+    ``(rank, id)`` for keyset pagination via ``after``. ``fields``
+    restricts the columns loaded for the movies. A cursor of the wrong
+    shape is ignored and the first page is returned.
+    """
+    if after is not None and len(after) != 2:
+        after = None
+    movies = Movie.objects.all()
+    if fields:
+        movies = movies.only(*fields)
+    if not fts_available():
+        movies = movies.filter(name__icontains=term).order_by('id')
+        if after is not None:
+            movies = movies.filter(id__gt=after[-1])
+        results = list(movies[:limit])
+        for movie in results:
+            movie.search_cursor = (0, movie.id)
+        return results
+    hits = search_ids(term, limit, after)
+    by_id = movies.in_bulk([movie_id for movie_id, _ in hits])
+    results = []
+    for movie_id, rank in hits:
+        if movie_id in by_id:
+            by_id[movie_id].search_cursor = (rank, movie_id)
+            results.append(by_id[movie_id])
+    return results
+
+
+def rebuild_index():
+    with connection.cursor() as cursor:
+        # also restores any missing triggers, then rebuilds
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')")
+
+
+def ensure_index(using='default'):
+    """Recreate the sync triggers and reindex if any trigger is missing.
+    Returns True when the index was repaired."""
+    db = connections[using]
+    if db.vendor != 'sqlite':
+        return False
+    with db.cursor() as cursor:
+        cursor.execute("SELECT type, name FROM sqlite_master WHERE name LIKE %s", [f'{FTS_TABLE}%'])
+        present = set(cursor.fetchall())
+        if ('table', FTS_TABLE) not in present:
+            return False  # migration 0005 has not run yet
+        if {('trigger', f'{FTS_TABLE}_{suffix}') for suffix in ('ai', 'ad', 'au')} <= present:
+            return False
+        for statement in CREATE_SQL:
+            cursor.execute(statement)
+    return True
@@ -0,0 +1,38 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_migrate, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, leaderboard, search
+from .images import build_derivatives
+from .models import Movie, Review
+
+
+@receiver(post_save, sender=Movie)
+def render_image_variants(sender, instance, **kwargs):
+    # existing variants are skipped, so saves that keep the image are cheap
+    transaction.on_commit(lambda: build_derivatives(instance.image))
+
+
+@receiver([post_save, post_delete], sender=Movie)
+def invalidate_autocomplete(sender, **kwargs):
+    transaction.on_commit(autocomplete.bump_version)
+
+
+@receiver(post_save, sender=Review)
+def update_leaderboards(sender, instance, **kwargs):
+    review_id = instance.id
+    transaction.on_commit(lambda: leaderboard.reviews_changed([review_id]))
+
+
+@receiver(post_delete, sender=Review)
+def remove_from_leaderboards(sender, instance, **kwargs):
+    # delete() clears instance.id before the commit callback runs
+    review_id, movie_id = instance.id, instance.movie_id
+    transaction.on_commit(lambda: leaderboard.review_removed(review_id, movie_id))
+
+
+@receiver(post_migrate)
+def restore_search_triggers(sender, using, **kwargs):
+    # table rebuilds during migrate drop the full-text triggers
+    if sender.name == 'movies':
+        search.ensure_index(using)
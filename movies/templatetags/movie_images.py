@@ -0,0 +1,21 @@
+from django import template
+from django.utils.html import format_html
+
+from movies.images import variant_urls
+
+register = template.Library()
+
+
+@register.simple_tag
+def movie_picture(image, variant, css_class='', alt='', lazy=True):
+    """A <picture> for a movie poster variant: WebP with a JPEG/PNG fallback,
+    1x and 2x renderings, and lazy loading unless ``lazy=False``."""
+    loading = 'lazy' if lazy else 'eager'
+    urls = variant_urls(image, variant)
+    if urls is None:
+        return format_html('<img src="{}" class="{}" alt="{}" loading="{}">',
+                           image.url, css_class, alt, loading)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" class="{}" alt="{}" loading="{}" decoding="async"></picture>',
+        urls['webp'], urls['src'], urls['fallback'], css_class, alt, loading)
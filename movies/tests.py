@@ -1,3 +1,442 @@
-from django.test import TestCase
+import math
+import os
+import re
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection
+from django.template import Context, Template
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from PIL import Image
+
+from cart.models import Item, Order
+from . import autocomplete, likes, popularity, recommendations
+from .images import build_derivatives
+from .leaderboard import top_reviews
+from .likes import PREFIX, flush_likes, like_review, likes_cache, pending_likes, recount_likes
+from .models import BasketCount, Movie, MoviePairCount, MovieRecommendation, MovieVote, Review, ReviewLike
+from .pagination import encode_cursor
+from .popularity import record_purchases
+from .recommendations import recommended_movies, record_basket
+from .search import FTS_TABLE, ensure_index, search_movies
+from .votes import toggle_vote
+
+
+class CatalogPaginationTests(TestCase):
+    def setUp(self):
+        # identical names give identical search ranks, so pages must break
+        # ties on id
+        self.movies = [Movie.objects.create(name='Space Movie' if i % 3 else 'Movie', price=10,
+                                            description='', image='movie_images/logo.png')
+                       for i in range(13)]
+
+    def walk(self, params):
+        seen, after = [], ''
+        while True:
+            response = self.client.get(reverse('movies.index'), {**params, 'size': 4, 'after': after})
+            seen += [movie.id for movie in response.context['template_data']['movies']]
+            after = response.context['template_data']['next_cursor']
+            if not after:
+                return seen
+
+    def test_pages_have_no_gaps_or_duplicates(self):
+        ids = [movie.id for movie in self.movies]
+        self.assertEqual(self.walk({}), ids)
+        found = self.walk({'search': 'movie'})
+        self.assertEqual(sorted(found), ids)
+        self.assertEqual(len(found), len(set(found)))
+        self.assertEqual(sorted(self.walk({'search': 'space'})), [i for n, i in enumerate(ids) if n % 3])
+
+    def test_malformed_cursors_serve_the_first_page(self):
+        first = [movie.id for movie in self.movies[:4]]
+        for params in ({'search': 'movie', 'after': encode_cursor((5,))},
+                       {'sort': 'top', 'after': encode_cursor((5,))},
+                       {'after': encode_cursor((0.5, 3))},
+                       {'after': 'not-a-cursor'},
+                       {'after': encode_cursor(['x'])}):
+            response = self.client.get(reverse('movies.index'), {**params, 'size': 4})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['template_data']['is_first_page'])
+            self.assertEqual(len(response.context['template_data']['movies']), 4)
+        response = self.client.get(reverse('movies.index'), {'after': encode_cursor((0.5, 3)), 'size': 4})
+        self.assertEqual([movie.id for movie in response.context['template_data']['movies']], first)
+
+
+class SearchTests(TestCase):
+    def names(self, term):
+        return [movie.name for movie in search_movies(term)]
+
+    def test_index_follows_writes_and_ranks_names_first(self):
+        heat = Movie.objects.create(name='Heat', price=10, description='A heist in Los Angeles.',
+                                    image='movie_images/logo.png')
+        Movie.objects.create(name='Los Angeles Story', price=10, description='',
+                             image='movie_images/logo.png')
+        self.assertEqual(self.names('los ang'), ['Los Angeles Story', 'Heat'])
+
+        Movie.objects.filter(id=heat.id).update(name='Heat 2', description='')
+        self.assertEqual(self.names('los'), ['Los Angeles Story'])
+        self.assertEqual(self.names('heat'), ['Heat 2'])
+        Movie.objects.filter(id=heat.id).delete()
+        self.assertEqual(self.names('heat'), [])
+
+    def test_missing_triggers_are_restored(self):
+        self.assertFalse(ensure_index())
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TRIGGER {FTS_TABLE}_ai')
+        Movie.objects.create(name='Heat', price=10, description='', image='movie_images/logo.png')
+        self.assertEqual(self.names('heat'), [])
+        self.assertTrue(ensure_index())
+        self.assertEqual(self.names('heat'), ['Heat'])
+
+
+class ReviewLikeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        likes_cache().clear()
+        self.user = User.objects.create_user('liker', password='pw')
+        movie = Movie.objects.create(name='Heat', price=10, description='',
+                                     image='movie_images/logo.png')
+        self.review = Review.objects.create(comment='Great', movie=movie, user=self.user)
+
+    def test_like_is_counted_once_per_user(self):
+        self.assertTrue(like_review(self.user, self.review.id))
+        self.assertFalse(like_review(self.user, self.review.id))
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 1)
+        self.assertEqual(ReviewLike.objects.count(), 1)
+
+    @override_settings(REVIEW_LIKES_COALESCE=True, REVIEW_LIKES_FLUSH_SIZE=100)
+    def test_coalesced_likes_are_flushed_in_one_update(self):
+        others = [User.objects.create_user(f'fan{i}') for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for user in others:
+                like_review(user, self.review.id)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 0)
+        self.assertEqual(pending_likes([self.review.id]), {self.review.id: 3})
+
+        with self.assertNumQueries(4):  # savepoint, update, release, leaderboard refresh
+            self.assertEqual(flush_likes(), 1)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 3)
+        self.assertEqual(pending_likes([self.review.id]), {})
+        self.assertEqual(flush_likes(), 0)
+
+    @override_settings(REVIEW_LIKES_COALESCE=True, REVIEW_LIKES_FLUSH_SIZE=100)
+    def test_concurrent_flushes_apply_likes_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            like_review(User.objects.create_user('fan'), self.review.id)
+        # another process is flushing: this one leaves the buffer alone
+        likes_cache().add(f'{PREFIX}lock', 1)
+        self.assertEqual(flush_likes(), 0)
+        self.assertEqual(pending_likes([self.review.id]), {self.review.id: 1})
+        likes_cache().delete(f'{PREFIX}lock')
+        self.assertEqual(flush_likes(), 1)
+        self.assertEqual(flush_likes(), 0)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 1)
+        self.assertIsNone(likes_cache().get(f'{PREFIX}lock'))
+
+    @override_settings(REVIEW_LIKES_COALESCE=True, REVIEW_LIKES_FLUSH_SIZE=100)
+    def test_flush_between_slot_reservation_and_write(self):
+        incr = likes._incr
+
+        def incr_then_flush(key, delta=1):
+            value = incr(key, delta)
+            if key == f'{PREFIX}seq':
+                self.assertEqual(flush_likes(), 0)
+            return value
+
+        with mock.patch('movies.likes._incr', side_effect=incr_then_flush), \
+                self.captureOnCommitCallbacks(execute=True):
+            like_review(User.objects.create_user('fan0'), self.review.id)
+        self.assertEqual(flush_likes(), 1)
+        self.assertIsNone(likes_cache().get(f'{PREFIX}queued:{self.review.id}'))
+
+        # the review queues again, and later likes reach the counter
+        with self.captureOnCommitCallbacks(execute=True):
+            like_review(User.objects.create_user('fan1'), self.review.id)
+        self.assertEqual(flush_likes(), 1)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 2)
+
+    @override_settings(REVIEW_LIKES_COALESCE=True, REVIEW_LIKES_FLUSH_SIZE=100)
+    def test_abandoned_slot_is_skipped_on_the_next_flush(self):
+        likes._incr(f'{PREFIX}seq')  # a writer that died before storing its review
+        with self.captureOnCommitCallbacks(execute=True):
+            like_review(User.objects.create_user('fan'), self.review.id)
+        self.assertEqual(flush_likes(), 0)
+        self.assertEqual(flush_likes(), 1)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 1)
+
+    @override_settings(REVIEW_LIKES_COALESCE=True, REVIEW_LIKES_FLUSH_SIZE=100)
+    def test_recount_repairs_lost_likes(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for i in range(2):
+                like_review(User.objects.create_user(f'fan{i}'), self.review.id)
+        likes_cache().delete(f'{PREFIX}pending:{self.review.id}')  # evicted
+        self.assertEqual(recount_likes(), 1)
+        self.review.refresh_from_db()
+        self.assertEqual(self.review.likes, 2)
+        self.assertEqual(flush_likes(), 0)
+        self.assertEqual(recount_likes(), 0)
+
+
+class ReviewListingTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('reader', password='pw')
+        self.client.force_login(self.user)
+
+    def add_movie(self, reviews):
+        movie = Movie.objects.create(name='Heat', price=10, description='',
+                                     image='movie_images/logo.png')
+        for i in range(reviews):
+            author = User.objects.create_user(f'critic{movie.id}-{i}')
+            Review.objects.create(comment=f'Review {i}', movie=movie, user=author, likes=i % 4)
+        return movie
+
+    def count_queries(self, movie):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(reverse('movies.show', args=[movie.id])).status_code, 200)
+        return len(queries)
+
+    def test_show_query_count_is_constant(self):
+        self.assertEqual(self.count_queries(self.add_movie(2)),
+                         self.count_queries(self.add_movie(40)))
+
+    def test_load_more_walks_every_review_once(self):
+        movie = self.add_movie(25)
+        url = reverse('movies.reviews', args=[movie.id])
+        seen, after = [], ''
+        while True:
+            page = self.client.get(url, {'after': after, 'size': 10}).json()
+            seen += re.findall(r'Review \d+', page['html'])
+            if not page['next']:
+                break
+            after = page['next']
+        self.assertEqual(len(seen), 25)
+        self.assertEqual(len(set(seen)), 25)
+
+
+@override_settings(REVIEW_LEADERBOARD_SIZE=2)
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.movie = Movie.objects.create(name='Heat', price=10, description='',
+                                          image='movie_images/logo.png')
+        self.reviews = []
+        with self.captureOnCommitCallbacks(execute=True):
+            for likes in (5, 3, 1, 0, 0):
+                author = User.objects.create_user(f'critic{likes}-{len(self.reviews)}')
+                self.reviews.append(Review.objects.create(
+                    comment=f'{likes} likes', movie=self.movie, user=author, likes=likes))
+
+    def top_ids(self, movie_id=None):
+        return [entry['id'] for entry in top_reviews(movie_id)]
+
+    def test_page_is_served_from_cache(self):
+        self.client.get(reverse('top_comments'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('top_comments'))
+        self.assertContains(response, 'critic5-0')
+        self.assertContains(response, 'Heat')
+
+    def test_likes_and_deletes_update_the_lists(self):
+        self.assertEqual(self.top_ids(), [self.reviews[0].id, self.reviews[1].id])
+        self.top_ids(self.movie.id)
+        fans = [User.objects.create_user(f'fan{i}') for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for fan in fans:
+                like_review(fan, self.reviews[2].id)
+        self.assertEqual(self.top_ids(), [self.reviews[0].id, self.reviews[2].id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reviews[0].delete()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.top_ids(), [self.reviews[2].id, self.reviews[1].id])
+            self.assertEqual(self.top_ids(self.movie.id), [self.reviews[2].id, self.reviews[1].id])
+
+
+class ImageDerivativeTests(TestCase):
+    def test_variants_are_rendered_and_referenced(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            os.makedirs(os.path.join(media_root, 'movie_images'))
+            Image.new('RGB', (600, 900), 'red').save(
+                os.path.join(media_root, 'movie_images', 'poster.jpg'))
+            movie = Movie(name='Heat', price=10, description='', image='movie_images/poster.jpg')
+            self.assertEqual(build_derivatives(movie.image), 6)
+            self.assertEqual(build_derivatives(movie.image), 0)
+            with Image.open(os.path.join(media_root, 'movie_images', 'derived', 'poster-jpg-200.webp')) as thumb:
+                self.assertEqual(thumb.size, (133, 200))
+
+            Image.new('RGB', (300, 900), 'blue').save(
+                os.path.join(media_root, 'movie_images', 'poster.png'))
+            other = Movie(name='Alien', price=10, description='', image='movie_images/poster.png')
+            self.assertEqual(build_derivatives(other.image), 6)
+            with Image.open(os.path.join(media_root, 'movie_images', 'derived', 'poster-jpg-200.webp')) as thumb:
+                self.assertEqual(thumb.size, (133, 200))
+
+            html = Template("{% load movie_images %}{% movie_picture movie.image 'thumb' %}").render(
+                Context({'movie': movie}))
+            self.assertIn('poster-jpg-200.webp 1x, /media/movie_images/derived/poster-jpg-400.webp 2x', html)
+            self.assertIn('loading="lazy"', html)
+
+    def test_missing_source_is_skipped(self):
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            with self.captureOnCommitCallbacks(execute=True):
+                movie = Movie.objects.create(name='Heat', price=10, description='',
+                                             image='movie_images/missing.jpg')
+            self.assertEqual(build_derivatives(movie.image), 0)
+            self.assertFalse(os.path.exists(os.path.join(media_root, 'movie_images')))
+            html = Template("{% load movie_images %}{% movie_picture movie.image 'thumb' %}").render(
+                Context({'movie': movie}))
+            self.assertIn('src="/media/movie_images/missing.jpg"', html)
+
+
+class RecommendationTests(TestCase):
+    def test_incremental_updates_match_the_rebuild(self):
+        user = User.objects.create_user('buyer')
+        movies = [Movie.objects.create(name=f'Movie {i}', price=10, description='',
+                                       image='movie_images/logo.png') for i in range(4)]
+        a, b, c, d = (movie.id for movie in movies)
+        for basket in ([a, b], [a, b, c], [a, c], [b, d], [a, b]):
+            order = Order.objects.create(user=user, total=10)
+            for movie_id in basket:
+                Item.objects.create(order=order, movie_id=movie_id, price=10, quantity=1)
+            record_basket(basket)
+
+        incremental = {movie.id: [m.id for m in recommended_movies(movie.id)] for movie in movies}
+        self.assertEqual(incremental[a], [b, c])
+        recommendations.rebuild()
+        self.assertEqual(
+            {movie.id: [m.id for m in recommended_movies(movie.id)] for movie in movies},
+            incremental)
+        self.assertEqual(
+            MovieRecommendation.objects.get(movie_id=a, rank=0).score, 3 / math.sqrt(4 * 4))
+
+    @override_settings(RECOMMENDATION_SCORING='lift')
+    def test_single_movie_orders_rescore_without_counting_orders(self):
+        user = User.objects.create_user('buyer')
+        a, b = (Movie.objects.create(name=name, price=10, description='',
+                                     image='movie_images/logo.png').id for name in ['Heat', 'Alien'])
+        for basket in ([a, b], [a], [b], [a]):
+            order = Order.objects.create(user=user, total=10)
+            for movie_id in basket:
+                Item.objects.create(order=order, movie_id=movie_id, price=10, quantity=1)
+            with CaptureQueriesContext(connection) as queries:
+                record_basket(basket)
+            self.assertFalse([q for q in queries if 'COUNT' in q['sql'] and 'cart_order' in q['sql']])
+        incremental = MovieRecommendation.objects.get(movie_id=a).score
+        self.assertEqual(incremental, 1 * 4 / (3 * 2))
+        recommendations.rebuild()
+        self.assertEqual(MovieRecommendation.objects.get(movie_id=a).score, incremental)
+        self.assertEqual(BasketCount.objects.get().orders, 4)
+
+    def test_a_movie_is_never_recommended_with_itself(self):
+        a, b = (Movie.objects.create(name=name, price=10, description='',
+                                     image='movie_images/logo.png').id for name in ['Heat', 'Alien'])
+        record_basket([a, a, b])
+        record_basket([a])
+        self.assertEqual(MoviePairCount.objects.get(movie_a_id=a, movie_b_id=a).orders, 2)
+        self.assertEqual(MoviePairCount.objects.get(movie_a_id=a, movie_b_id=b).orders, 1)
+        self.assertEqual([m.id for m in recommended_movies(a)], [b])
+        self.assertEqual([m.id for m in recommended_movies(b)], [a])
+        response = self.client.get(reverse('movies.show', args=[a]))
+        self.assertEqual([m.id for m in response.context['template_data']['recommendations']], [b])
+
+
+class VoteTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('voter')
+        self.movie = Movie.objects.create(name='Heat', price=10, description='',
+                                          image='movie_images/logo.png')
+
+    def counts(self):
+        self.movie.refresh_from_db(fields=['thumbs_up', 'thumbs_down'])
+        return self.movie.thumbs_up, self.movie.thumbs_down
+
+    def test_toggle_switch_and_remove(self):
+        self.assertEqual(toggle_vote(self.user, self.movie.id, 'up'), 'up')
+        self.assertEqual(self.counts(), (1, 0))
+        self.assertEqual(toggle_vote(self.user, self.movie.id, 'down'), 'down')
+        self.assertEqual(self.counts(), (0, 1))
+        self.assertEqual(MovieVote.objects.get().vote_type, 'down')
+        self.assertIsNone(toggle_vote(self.user, self.movie.id, 'down'))
+        self.assertEqual(self.counts(), (0, 0))
+        self.assertFalse(MovieVote.objects.exists())
+
+    def test_lost_insert_race_leaves_counters_alone(self):
+        # another click inserted the row between our checks and our insert
+        with mock.patch.object(MovieVote.objects, 'create', side_effect=IntegrityError):
+            self.assertIsNone(toggle_vote(self.user, self.movie.id, 'up'))
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_reconcile_votes_fixes_drifted_counters(self):
+        toggle_vote(self.user, self.movie.id, 'up')
+        Movie.objects.filter(id=self.movie.id).update(thumbs_up=7, thumbs_down=2)
+        out = StringIO()
+        call_command('reconcile_votes', stdout=out)
+        self.assertIn('Corrected 1 movie(s).', out.getvalue())
+        self.assertEqual(self.counts(), (1, 0))
+
+
+class PopularityTests(TestCase):
+    def test_votes_and_purchases_rank_the_catalog(self):
+        movies = [Movie.objects.create(name=f'Movie {i}', price=10, description='',
+                                       image='movie_images/logo.png') for i in range(5)]
+        voters = [User.objects.create_user(f'voter{i}') for i in range(5)]
+        for voter in voters:
+            toggle_vote(voter, movies[3].id, 'up')
+        toggle_vote(voters[0], movies[1].id, 'up')
+        order = Order.objects.create(user=voters[0], total=30)
+        record_purchases([Item.objects.create(order=order, movie=movies[2], price=10, quantity=3)])
+
+        self.assertEqual(popularity.wilson_lower_bound(0, 0), 0.0)
+        self.assertLess(popularity.wilson_lower_bound(1, 0), popularity.wilson_lower_bound(9, 1))
+        self.assertEqual(popularity.recompute(), 0)  # incremental updates were exact
+
+        seen, after = [], ''
+        while True:
+            response = self.client.get(reverse('movies.index'), {'sort': 'top', 'size': 2, 'after': after})
+            seen += [movie.id for movie in response.context['template_data']['movies']]
+            after = response.context['template_data']['next_cursor']
+            if not after:
+                break
+        self.assertEqual(seen[:3], [movies[3].id, movies[1].id, movies[2].id])
+        self.assertEqual(sorted(seen), [movie.id for movie in movies])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        autocomplete._index = None
+
+    def names(self, query):
+        response = self.client.get(reverse('movies.autocomplete'), {'q': query})
+        return [movie['name'] for movie in response.json()['results']]
+
+    def test_word_prefixes_ranked_by_popularity(self):
+        for name, score in [('The Dark Knight', 0.9), ('Knives Out', 0.5), ('Amélie', 0.1)]:
+            Movie.objects.create(name=name, price=10, description='', image='movie_images/logo.png',
+                                 popularity=score)
+        self.assertEqual(self.names('kni'), ['The Dark Knight', 'Knives Out'])
+        self.assertEqual(self.names('AME'), ['Amélie'])
+        self.assertEqual(self.names(''), [])
+
+        # no poster, so the save signal has no image variants to render
+        with self.captureOnCommitCallbacks(execute=True):
+            Movie.objects.create(name='Knight Moves', price=10, description='', image='', popularity=0.7)
+        self.assertEqual(self.names('knig'), ['The Dark Knight', 'Knight Moves'])
+
+    def test_large_ranges_are_precomputed(self):
+        index = autocomplete.PrefixIndex(
+            [(i, f'Star {i}', i / 1000) for i in range(1, 1000)])
+        self.assertIn('st', index.top)
+        self.assertEqual([movie_id for movie_id, _ in index.lookup('sta', 3)], [999, 998, 997])
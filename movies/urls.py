@@ -4,10 +4,13 @@ from . import views
 urlpatterns = [
     path('', views.index, name='movies.index'),
     path('<int:id>/', views.show, name='movies.show'),
+    path('autocomplete/', views.autocomplete, name='movies.autocomplete'),
+    path('<int:id>/reviews/', views.reviews_fragment, name='movies.reviews'),
     path('<int:id>/review/create/', views.create_review, name='movies.create_review'),
     path('<int:id>/review/<int:review_id>/edit/', views.edit_review, name='movies.edit_review'),
     path('<int:id>/review/<int:review_id>/delete/', views.delete_review, name='movies.delete_review'),
     path('top-comments/', views.top_comments, name='top_comments'),
+    path('<int:id>/top-comments/', views.top_comments, name='movies.top_comments'),
     path('comments/<int:comment_id>/like/', views.like_comment, name='like_comment'),
     path('<int:id>/', views.show, name='movies.show'),
     path('reviews/<int:comment_id>/like/', views.like_comment, name='like_comment'),
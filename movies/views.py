@@ -1,22 +1,113 @@
+import datetime
+from django.db.models import Q
+from django.http import JsonResponse
 from django.shortcuts import render, redirect, get_object_or_404
-from .models import Movie, Review, MovieVote
+from django.template.loader import render_to_string
+from django.urls import reverse
+from .models import Movie, Review
+from .pagination import decode_cursor, encode_cursor, page_size
+from .search import search_movies
+from .autocomplete import suggest
+from .leaderboard import top_reviews
+from .likes import like_review, pending_likes
+from .recommendations import recommended_movies
+from .votes import toggle_vote
 from django.contrib.auth.decorators import login_required
 
+# columns the catalog cards render
+CARD_FIELDS = ('id', 'name', 'image')
+
+REVIEWS_PAGE_SIZE = 10
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
 def index(request):
     search_term = request.GET.get('search')
+    # ?sort=top ranks by the stored popularity score; search results keep
+    # their relevance order
+    sort = 'top' if request.GET.get('sort') == 'top' and not search_term else ''
+    size = page_size(request)
+    after = decode_cursor(request.GET.get('after'))
+    # search and top cursors are (score, id), the default one is (id,); a
+    # cursor of another shape is ignored and the first page served
+    if after and len(after) != (2 if search_term or sort == 'top' else 1):
+        after = None
     if search_term:
-        movies = Movie.objects.filter(name__icontains=search_term)
+        movies = search_movies(search_term, limit=size + 1, after=after, fields=CARD_FIELDS)
+    elif sort == 'top':
+        movies = Movie.objects.only(*CARD_FIELDS, 'popularity').order_by('-popularity', '-id')
+        if after:
+            # the leading range lets SQLite seek in the index
+            movies = movies.filter(popularity__lte=after[0]).filter(
+                Q(popularity__lt=after[0]) | Q(id__lt=after[1]))
+        movies = list(movies[:size + 1])
     else:
-        movies = Movie.objects.all()
+        movies = Movie.objects.only(*CARD_FIELDS).order_by('id')
+        if after:
+            movies = movies.filter(id__gt=after[0])
+        movies = list(movies[:size + 1])
+
+    next_cursor = None
+    if len(movies) > size:
+        movies = movies[:size]
+        last = movies[-1]
+        if search_term:
+            next_cursor = encode_cursor(last.search_cursor)
+        elif sort == 'top':
+            next_cursor = encode_cursor((last.popularity, last.id))
+        else:
+            next_cursor = encode_cursor((last.id,))
 
     template_data = {}
     template_data['title'] = 'Movies'
     template_data['movies'] = movies
+    template_data['search_term'] = search_term or ''
+    template_data['sort'] = sort
+    template_data['next_cursor'] = next_cursor
+    template_data['is_first_page'] = after is None
     return render(request, 'movies/index.html', {'template_data': template_data})
 
+def autocomplete(request):
+    """Search-as-you-type suggestions for ``?q=``, most popular first."""
+    try:
+        limit = int(request.GET.get('limit', 8))
+    except ValueError:
+        limit = 8
+    results = [{'id': movie_id, 'name': name, 'url': reverse('movies.show', args=[movie_id])}
+               for movie_id, name in suggest(request.GET.get('q', ''), limit)]
+    return JsonResponse({'results': results})
+
+def review_page(movie_id, after, size):
+    """One page of a movie's reviews, most liked first, and the next cursor.
+
+    Walks review_movie_likes_date_idx: the cursor is the (likes, date in
+    epoch microseconds, id) of the last review shown.
+    """
+    reviews = (Review.objects.filter(movie_id=movie_id).select_related('user')
+               .order_by('-likes', '-date', '-id'))
+    if after and len(after) == 3:
+        likes, micros, review_id = after
+        date = EPOCH + datetime.timedelta(microseconds=micros)
+        reviews = reviews.filter(
+            Q(likes__lt=likes)
+            | Q(likes=likes, date__lt=date)
+            | Q(likes=likes, date=date, id__lt=review_id))
+    reviews = list(reviews[:size + 1])
+
+    next_cursor = None
+    if len(reviews) > size:
+        reviews = reviews[:size]
+        last = reviews[-1]
+        micros = (last.date - EPOCH) // datetime.timedelta(microseconds=1)
+        next_cursor = encode_cursor((last.likes, micros, last.id))
+
+    pending = pending_likes([review.id for review in reviews])
+    for review in reviews:
+        review.likes += pending.get(review.id, 0)
+    return reviews, next_cursor
+
 def show(request, id):
     movie = Movie.objects.get(id=id)
-    reviews = Review.objects.filter(movie=movie).order_by('-likes', '-date')
+    reviews, next_cursor = review_page(movie.id, None, page_size(request, REVIEWS_PAGE_SIZE))
 
     thumbs_up_count = movie.get_thumbs_up_count()
     thumbs_down_count = movie.get_thumbs_down_count()
@@ -26,11 +117,22 @@ def show(request, id):
     template_data['title'] = movie.name
     template_data['movie'] = movie
     template_data['reviews'] = reviews
+    template_data['next_cursor'] = next_cursor
+    template_data['recommendations'] = recommended_movies(movie.id)
     template_data['thumbs_up_count'] = thumbs_up_count
     template_data['thumbs_down_count'] = thumbs_down_count
     template_data['user_vote'] = user_vote
     return render(request, 'movies/show.html', {'template_data': template_data})
 
+def reviews_fragment(request, id):
+    """The next page of reviews as rendered list items, for "load more"."""
+    movie = get_object_or_404(Movie.objects.only('id'), id=id)
+    reviews, next_cursor = review_page(movie.id, decode_cursor(request.GET.get('after')),
+                                       page_size(request, REVIEWS_PAGE_SIZE))
+    html = render_to_string('movies/review_list.html',
+                            {'movie': movie, 'reviews': reviews}, request=request)
+    return JsonResponse({'html': html, 'next': next_cursor})
+
 @login_required
 def create_review(request, id):
     if request.method == 'POST' and request.POST['comment'] != '':
@@ -58,7 +160,7 @@ def edit_review(request, id, review_id):
     elif request.method == 'POST' and request.POST['comment'] != '':
         review = Review.objects.get(id=review_id)
         review.comment = request.POST['comment']
-        review.save()
+        review.save(update_fields=['comment'])  # leave likes to movies.likes
         return redirect('movies.show', id=id)
     else:
         return redirect('movies.show', id=id)
@@ -70,16 +172,19 @@ def delete_review(request, id, review_id):
     return redirect('movies.show', id=id)
 
 
-def top_comments(request):
-    comments = Review.objects.order_by('-likes')[:10]  # top 10 by likes
-    return render(request, 'movies/top_comments.html', {'comments': comments})
+def top_comments(request, id=None):
+    movie = get_object_or_404(Movie.objects.only('id', 'name'), id=id) if id else None
+    template_data = {}
+    template_data['title'] = f'Top Comments - {movie.name}' if movie else 'Top Comments'
+    template_data['movie'] = movie
+    template_data['comments'] = top_reviews(movie.id if movie else None)
+    return render(request, 'movies/top_comments.html', {'template_data': template_data})
 
 @login_required
 def like_comment(request, comment_id):
-    review = get_object_or_404(Review, id=comment_id)
-    review.likes += 1
-    review.save()
-    return redirect('movies.show', id=review.movie.id)  # back to the movie page
+    review = get_object_or_404(Review.objects.only('id', 'movie_id'), id=comment_id)
+    like_review(request.user, review.id)
+    return redirect('movies.show', id=review.movie_id)  # back to the movie page
 
 @login_required
 def report_review(request, id, review_id):
@@ -89,16 +194,6 @@ def report_review(request, id, review_id):
 
 @login_required
 def vote_movie(request, id, vote_type):
-    movie = get_object_or_404(Movie, id=id)
-    existing_vote = MovieVote.objects.filter(user=request.user, movie=movie).first()
-
-    if existing_vote:
-        if existing_vote.vote_type == vote_type:
-            existing_vote.delete()
-        else:
-            existing_vote.vote_type = vote_type
-            existing_vote.save()
-    else:
-        MovieVote.objects.create(user=request.user, movie=movie, vote_type=vote_type)
-    
+    get_object_or_404(Movie.objects.only('id'), id=id)
+    toggle_vote(request.user, id, vote_type)
     return redirect('movies.show', id=id)
@@ -0,0 +1,68 @@
+"""Thumbs up/down voting with counters stored on Movie.
+
+``toggle_vote`` changes the MovieVote row with single conditional
+statements (delete, update or insert) and adjusts ``Movie.thumbs_up`` /
+``Movie.thumbs_down`` with F() expressions in the same transaction, so
+concurrent clicks never lose an update or trip the unique constraint.
+The movie's popularity score is refreshed in the same transaction.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q
+
+from .models import Movie, MovieVote
+from .popularity import refresh
+
+COUNTER_FIELDS = {'up': 'thumbs_up', 'down': 'thumbs_down'}
+
+
+def _adjust(movie_id, **deltas):
+    Movie.objects.filter(id=movie_id).update(
+        **{COUNTER_FIELDS[vote_type]: F(COUNTER_FIELDS[vote_type]) + delta
+           for vote_type, delta in deltas.items()})
+    refresh([movie_id])
+
+
+@transaction.atomic
+def toggle_vote(user, movie_id, vote_type):
+    """Apply a click on ``vote_type``; returns the user's vote afterwards.
+
+    Clicking the current vote removes it, clicking the other one switches
+    it, and clicking with no vote casts one.
+    """
+    other = 'down' if vote_type == 'up' else 'up'
+    votes = MovieVote.objects.filter(user=user, movie_id=movie_id)
+
+    if votes.filter(vote_type=vote_type).delete()[0]:
+        _adjust(movie_id, **{vote_type: -1})
+        return None
+    if votes.filter(vote_type=other).update(vote_type=vote_type):
+        _adjust(movie_id, **{vote_type: 1, other: -1})
+        return vote_type
+    try:
+        with transaction.atomic():
+            MovieVote.objects.create(user=user, movie_id=movie_id, vote_type=vote_type)
+    except IntegrityError:
+        # a concurrent click already recorded a vote; leave it as it is
+        return votes.values_list('vote_type', flat=True).first()
+    _adjust(movie_id, **{vote_type: 1})
+    return vote_type
+
+
+def reconcile_counts(movie_model=Movie, vote_model=MovieVote):
+    """Recount every movie's counters from the vote rows; returns how many
+    movies were corrected. Also used by the counters' data migration."""
+    actual = {
+        row['movie_id']: (row['up'], row['down'])
+        for row in vote_model.objects.values('movie_id').annotate(
+            up=Count('id', filter=Q(vote_type='up')),
+            down=Count('id', filter=Q(vote_type='down')),
+        )
+    }
+    fixed = []
+    for movie in movie_model.objects.only('id', 'thumbs_up', 'thumbs_down').iterator():
+        up, down = actual.get(movie.id, (0, 0))
+        if (movie.thumbs_up, movie.thumbs_down) != (up, down):
+            movie.thumbs_up, movie.thumbs_down = up, down
+            fixed.append(movie)
+    movie_model.objects.bulk_update(fixed, ['thumbs_up', 'thumbs_down'], batch_size=1000)
+    return len(fixed)
@@ -134,4 +134,70 @@ STATICFILES_DIRS = [
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-MEDIA_URL = '/media/'
\ No newline at end of file
+MEDIA_URL = '/media/'
+
+# Process-local cache; point this at a shared backend (Redis, Memcached)
+# when running several workers so the map APIs' data version is shared.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # buffered review likes (movies.likes); losing a key loses likes, so
+    # this cache must not cull
+    'review_likes': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'review-likes',
+        'OPTIONS': {'MAX_ENTRIES': 10 ** 9},
+    },
+}
+
+# Seconds a cached map API response is kept. Responses are keyed by a data
+# version that changes on every order, so this only bounds memory use.
+MAPVIEW_CACHE_TIMEOUT = 60 * 60
+
+# Where shopping carts live (cart.store): 'cookie' keeps the whole cart in
+# a signed cookie, 'cache' keeps it in CACHES under an id held in a cookie.
+CART_STORE = 'cookie'
+CART_TIMEOUT = 60 * 60 * 24 * 14
+
+# Buffer review like counts in the cache and write them in batches (see
+# movies.likes) held by the REVIEW_LIKES_CACHE alias. Needs a shared,
+# non-evicting cache when running several processes, and the
+# flush_review_likes command on a schedule to write out stragglers.
+REVIEW_LIKES_COALESCE = False
+REVIEW_LIKES_FLUSH_SIZE = 100
+REVIEW_LIKES_CACHE = 'review_likes'
+
+# Top-comments leaderboards (movies.leaderboard): entries per page, and how
+# long a cached list lives before it is rebuilt from the database.
+REVIEW_LEADERBOARD_SIZE = 10
+REVIEW_LEADERBOARD_TIMEOUT = 60 * 60
+
+# "Customers also bought" (movies.recommendations): neighbours kept per
+# movie, and how pairs are scored ('cosine' or 'lift').
+RECOMMENDATION_TOP_K = 10
+RECOMMENDATION_SCORING = 'cosine'
+
+# Catalog ?sort=top score (movies.popularity): share of the score given to
+# purchases in the last POPULARITY_WINDOW_DAYS, and the purchase count that
+# earns half of that share.
+POPULARITY_PURCHASE_WEIGHT = 0.3
+POPULARITY_PURCHASE_SCALE = 10
+POPULARITY_WINDOW_DAYS = 30
+
+# Seconds before a process rebuilds its search-as-you-type index even if no
+# Movie was saved, to pick up popularity changes (movies.autocomplete).
+AUTOCOMPLETE_MAX_AGE = 300
+
+# Where the map analytics read from: 'rollups' (the daily rollup tables)
+# or 'columnar' (an in-memory NumPy snapshot of every item, see
+# mapview.analytics; needs numpy).
+MAPVIEW_ANALYTICS_ENGINE = 'rollups'
+
+# Geocoder used to fill PurchaseLocation coordinates. The gazetteer works
+# offline; use 'mapview.geocoding.NominatimGeocoder' for street-level results
+# (filled by the geocode_locations worker, never on the request path).
+GEOCODER_BACKEND = 'mapview.geocoding.GazetteerGeocoder'
+# Requests per second allowed by the geocode_locations worker (Nominatim's
+# usage policy allows one).
+GEOCODER_RATE_LIMIT = 1.0